@@ -16,14 +16,22 @@ from .ndscript_api import (
     get_function_signature,
     validate_syntax,
     format_code,
-    get_performance_stats
+    get_performance_stats,
+    export_metrics,
+    serve_metrics,
+    run_ensemble
 )
 
-from .jupyter_integration import (
-    NDScriptMagics,
-    load_ipython_extension,
-    unload_ipython_extension
-)
+# تكامل Jupyter يستورد IPython، فيُحمَّل عند أول طلب فقط
+_JUPYTER_EXPORTS = ("NDScriptMagics", "load_ipython_extension", "unload_ipython_extension")
+
+
+def __getattr__(name):
+    if name in _JUPYTER_EXPORTS:
+        from . import jupyter_integration
+        return getattr(jupyter_integration, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 __version__ = "2.0.0"
 __author__ = "ND-Script Development Team"
@@ -46,6 +54,9 @@ __all__ = [
     "validate_syntax",
     "format_code",
     "get_performance_stats",
+    "export_metrics",
+    "serve_metrics",
+    "run_ensemble",
     
     # Jupyter integration
     "NDScriptMagics",
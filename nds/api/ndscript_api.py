@@ -16,7 +16,12 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from runtime.interpreter import NDScriptInterpreter
 from runtime.errors import NDScriptError as CoreNDScriptError
-from runtime.type_system import create_type_checker
+from runtime.metrics import registry
+from runtime.tracing import global_tracer
+
+# مقاييس الجلسات: عدادات ذرية مشتركة بين كل الجلسات في العملية
+_EXECUTIONS = registry.counter("session_executions", "Session executions by outcome")
+_EXECUTION_SECONDS = registry.histogram("session_execution_seconds", "Wall time of session executions")
 
 class NDScriptError(Exception):
     """خطأ ND-Script للواجهة العامة"""
@@ -49,9 +54,18 @@ class ExecutionResult:
 class NDScriptSession:
     """جلسة ND-Script للتنفيذ التفاعلي"""
     
-    def __init__(self, enable_parallel: bool = True, enable_bytecode: bool = True):
+    def __init__(self, enable_parallel: bool = True, enable_bytecode: bool = True,
+                 seed: Optional[int] = None, run_cache=None):
         self.interpreter = NDScriptInterpreter()
-        self.type_checker = create_type_checker()
+        self._type_checker = None
+        # بذرة مثبتة، وذاكرة نتائج التشغيل (True للمجلد الافتراضي)
+        self.seed = seed
+        if seed is not None:
+            self.interpreter.pinned_parameters["seed"] = seed
+        if run_cache is True:
+            from runtime.run_cache import RunCache
+            run_cache = RunCache()
+        self.run_cache = run_cache or None
         self.session_id = id(self)
         self.execution_history: List[Dict[str, Any]] = []
         
@@ -62,6 +76,8 @@ class NDScriptSession:
             self.interpreter.disable_bytecode()
         
         self.enable_parallel = enable_parallel
+        self.sampler = None
+        self.allocation_profiler = None
         
         # إحصائيات الجلسة
         self.stats = {
@@ -73,8 +89,20 @@ class NDScriptSession:
             "variables_created": 0
         }
     
-    def execute(self, code: str, filename: str = "<interactive>") -> ExecutionResult:
-        """تنفيذ كود ND-Script"""
+    @property
+    def type_checker(self):
+        """مدقق الأنواع، يُنشأ عند أول استخدام"""
+        if self._type_checker is None:
+            from runtime.type_system import create_type_checker
+            self._type_checker = create_type_checker()
+        return self._type_checker
+
+    def execute(self, code: str, filename: str = "<interactive>",
+                variables: Optional[Dict[str, Any]] = None) -> ExecutionResult:
+        """تنفيذ كود ND-Script
+
+        ``variables`` are defined in the session before the code runs.
+        """
         import time
         
         start_time = time.perf_counter()
@@ -83,14 +111,21 @@ class NDScriptSession:
             # فحص النحو أولاً
             syntax_errors = self.validate_syntax(code)
             if syntax_errors:
+                _EXECUTIONS.inc(status="syntax_error")
                 return ExecutionResult(
                     success=False,
                     error=f"Syntax errors: {'; '.join(syntax_errors)}",
                     execution_time=0.0
                 )
             
+            for name, value in (variables or {}).items():
+                self.interpreter.environment.define(name, value)
+
             # تنفيذ الكود
-            result = self.interpreter.interpret(code, filename)
+            if self.run_cache is not None:
+                result = self.run_cache.run(self.interpreter, code, filename)
+            else:
+                result = self.interpreter.interpret(code, filename)
             
             end_time = time.perf_counter()
             execution_time = end_time - start_time
@@ -99,6 +134,8 @@ class NDScriptSession:
             self.stats["executions"] += 1
             self.stats["successful_executions"] += 1
             self.stats["total_execution_time"] += execution_time
+            _EXECUTIONS.inc(status="success")
+            _EXECUTION_SECONDS.observe(execution_time, status="success")
             
             # حفظ في التاريخ
             self.execution_history.append({
@@ -123,6 +160,8 @@ class NDScriptSession:
             # تحديث الإحصائيات
             self.stats["executions"] += 1
             self.stats["failed_executions"] += 1
+            _EXECUTIONS.inc(status="error")
+            _EXECUTION_SECONDS.observe(execution_time, status="error")
             
             # حفظ في التاريخ
             self.execution_history.append({
@@ -139,12 +178,12 @@ class NDScriptSession:
                 execution_time=execution_time
             )
     
-    def execute_file(self, filepath: str) -> ExecutionResult:
+    def execute_file(self, filepath: str, variables: Optional[Dict[str, Any]] = None) -> ExecutionResult:
         """تنفيذ ملف ND-Script"""
         try:
             with open(filepath, 'r', encoding='utf-8') as f:
                 code = f.read()
-            return self.execute(code, filepath)
+            return self.execute(code, filepath, variables)
         except FileNotFoundError:
             return ExecutionResult(
                 success=False,
@@ -181,9 +220,91 @@ class NDScriptSession:
             }
         return functions
     
+    def on_step(self, callback, every: int = 1, downsample: int = 1):
+        """الاشتراك في خطوات التطور
+
+        ``callback(step, fields)`` runs inside ``evolve`` every ``every``
+        steps with read-only, zero-copy views of the fields (strided by
+        ``downsample``). Returns a subscription with ``cancel()``.
+        """
+        return self.interpreter.on_step(callback, every=every, downsample=downsample)
+
+    def start_sampling(self, interval: float = 0.005):
+        """بدء أخذ عينات من مكدسات الاستدعاء
+
+        Samples this session's script stacks in the background until
+        ``stop_sampling``. Returns the ``SamplingProfiler``; its
+        ``collapsed()`` text can be read at any time.
+        """
+        from runtime.sampling_profiler import SamplingProfiler
+
+        if self.sampler is None or not self.sampler.running:
+            self.sampler = SamplingProfiler(self.interpreter, interval=interval)
+            self.sampler.start()
+        return self.sampler
+
+    def stop_sampling(self) -> str:
+        """إيقاف أخذ العينات وإرجاع المكدسات المطوية"""
+        if self.sampler is None:
+            return ""
+        self.sampler.stop()
+        return self.sampler.collapsed()
+
+    def start_memory_profiling(self, nframes: int = 1):
+        """بدء نسب الذاكرة إلى أسطر النص
+
+        Starts ``tracemalloc`` and attributes retained and peak memory to
+        script lines and functions until ``stop_memory_profiling``. Take
+        ``memory_snapshot()`` twice and pass both to
+        ``profiler.compare`` to see what grew in between.
+        """
+        from runtime.allocation_profiler import AllocationProfiler
+
+        if self.allocation_profiler is None or not self.allocation_profiler.running:
+            self.allocation_profiler = AllocationProfiler(self.interpreter, nframes)
+            self.allocation_profiler.start()
+        return self.allocation_profiler
+
+    def memory_snapshot(self):
+        """لقطة الذاكرة الحالية للمقارنة"""
+        return self.start_memory_profiling().snapshot()
+
+    def stop_memory_profiling(self) -> Dict[str, Any]:
+        """إيقاف نسب الذاكرة وإرجاع الإحصائيات"""
+        if self.allocation_profiler is None:
+            return {}
+        stats = self.allocation_profiler.get_performance_stats()
+        self.allocation_profiler.stop()
+        return stats
+
+    def start_tracing(self):
+        """بدء تسجيل فترات المراحل (تحليل، تحويل، تجميع، تنفيذ، خطوات الكون)
+
+        The tracer is shared by the whole process, so spans from other
+        sessions running at the same time are recorded too.
+        """
+        global_tracer.start()
+        return global_tracer
+
+    def stop_tracing(self, path: Optional[str] = None) -> Dict[str, Any]:
+        """إيقاف التتبع؛ يكتب ملف Chrome trace إلى ``path`` إن أُعطي"""
+        global_tracer.stop()
+        if path is not None:
+            global_tracer.write(path)
+        return global_tracer.summary()
+
     def clear_session(self):
         """مسح الجلسة"""
+        subscriptions = [sub for sub in self.interpreter.step_subscriptions if sub.active]
+        if self.allocation_profiler is not None and self.allocation_profiler.running:
+            self.allocation_profiler.stop()
         self.interpreter = NDScriptInterpreter()
+        if self.seed is not None:
+            self.interpreter.pinned_parameters["seed"] = self.seed
+        if self.sampler is not None:
+            self.sampler.interpreter = self.interpreter
+        for subscription in subscriptions:
+            self.interpreter.add_step_subscription(subscription)
         self.execution_history.clear()
         self.stats = {
             "executions": 0,
@@ -230,14 +351,16 @@ class NDScript:
     @staticmethod
     def execute_code(code: str, **kwargs) -> ExecutionResult:
         """تنفيذ كود مباشر"""
+        variables = kwargs.pop("variables", None)
         session = NDScriptSession(**kwargs)
-        return session.execute(code)
+        return session.execute(code, variables=variables)
     
     @staticmethod
     def execute_file(filepath: str, **kwargs) -> ExecutionResult:
         """تنفيذ ملف"""
+        variables = kwargs.pop("variables", None)
         session = NDScriptSession(**kwargs)
-        return session.execute_file(filepath)
+        return session.execute_file(filepath, variables)
     
     @staticmethod
     def validate_syntax(code: str) -> List[str]:
@@ -325,6 +448,33 @@ def format_code(code: str) -> str:
     
     return '\n'.join(formatted_lines)
 
+def run_ensemble(code: str, grid: Union[Dict[str, List[Any]], List[Dict[str, Any]]],
+                 workers: Optional[int] = None, callback=None, batch: int = 1) -> List[Dict[str, Any]]:
+    """تشغيل النص على شبكة معاملات
+
+    ``grid`` maps ``set`` parameters (and ``seed``) to the values to sweep,
+    or lists the parameter points explicitly. The script is parsed once;
+    each member's summary row is passed to ``callback`` as it finishes.
+    ``batch`` members are evolved together as one batched universe.
+    Returns the rows in grid order.
+    """
+    from runtime.ensemble import EnsembleRunner
+    return EnsembleRunner(code, grid, workers=workers, batch=batch).run(callback)
+
+def export_metrics(path: Optional[str] = None) -> str:
+    """مقاييس العملية بصيغة OpenMetrics
+
+    Returns the text exposition of the process-wide metrics registry and,
+    given ``path``, also writes it there (JSON for ``.json`` files).
+    """
+    if path is not None:
+        registry.write(path)
+    return registry.to_openmetrics()
+
+def serve_metrics(port: int = 9464, host: str = "127.0.0.1"):
+    """خدمة المقاييس على http://host:port/metrics من خيط في الخلفية"""
+    return registry.serve(port, host)
+
 def get_performance_stats(session: NDScriptSession) -> Dict[str, Any]:
     """إحصائيات الأداء"""
     session_stats = session.get_session_stats()
@@ -338,6 +488,30 @@ def get_performance_stats(session: NDScriptSession) -> Dict[str, Any]:
         if hasattr(session.interpreter, 'get_parallel_stats'):
             parallel_stats = session.interpreter.get_parallel_stats()
             session_stats["parallel"] = parallel_stats
+
+        if hasattr(session.interpreter, 'get_checkpoint_stats'):
+            session_stats["checkpoints"] = session.interpreter.get_checkpoint_stats()
+
+        if hasattr(session.interpreter, 'get_render_stats'):
+            session_stats["rendering"] = session.interpreter.get_render_stats()
+
+        if hasattr(session.interpreter, 'profiler'):
+            session_stats["profiler"] = session.interpreter.profiler.get_performance_stats()
+
+        if session.sampler is not None:
+            session_stats["sampling"] = session.sampler.get_performance_stats()
+
+        if session.allocation_profiler is not None:
+            session_stats["memory"] = session.allocation_profiler.get_performance_stats()
+
+        if global_tracer.events:
+            session_stats["tracing"] = global_tracer.get_performance_stats()
+
+        if hasattr(session.interpreter, 'optimizer'):
+            session_stats["optimizer"] = session.interpreter.optimizer.get_performance_stats()
+
+        if session.run_cache is not None:
+            session_stats["run_cache"] = session.run_cache.get_performance_stats()
     except Exception as e:
         session_stats["stats_error"] = str(e)
 
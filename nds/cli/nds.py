@@ -5,32 +5,76 @@ Main entry point for executing ND-Script files and REPL
 """
 
 import argparse
+import atexit
 import sys
 import os
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional
 
 # Add parent directory to path for imports
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from runtime.interpreter import NDScriptInterpreter
 from runtime.errors import NDScriptError, ErrorReporter
+from runtime.tracing import global_tracer
 
 
-def run_file(filename: str, verbose: bool = False) -> int:
-    """Run an ND-Script file"""
+def run_file(filename: str, verbose: bool = False, profile: bool = False,
+             sample_profile: Optional[str] = None, memory_profile: bool = False,
+             trace: Optional[str] = None, seed: Optional[int] = None, run_cache=None) -> int:
+    """Run an ND-Script file.
+
+    ``profile`` prints an annotated line profile; ``sample_profile`` writes
+    sampled call stacks to that file in collapsed-stack format;
+    ``memory_profile`` prints the lines that allocate the most; ``trace``
+    writes phase spans to that file as a Chrome trace. ``seed`` pins the
+    universe seed; with a ``run_cache``, a run seen before is restored
+    instead of executed.
+    """
+    line_profiler = None
+    sampler = None
+    allocation_profiler = None
     try:
         if not os.path.exists(filename):
             print(f"Error: File '{filename}' not found", file=sys.stderr)
             return 1
+
+        if trace:
+            global_tracer.start()
         
-        interpreter = NDScriptInterpreter()
+        with global_tracer.span("interpreter_init"):
+            interpreter = NDScriptInterpreter()
+        if seed is not None:
+            interpreter.pinned_parameters["seed"] = seed
         
         if verbose:
             print(f"Executing ND-Script file: {filename}")
         
-        result = interpreter.interpret_file(filename)
+        if profile:
+            from runtime.line_profiler import LineProfiler
+            line_profiler = LineProfiler(interpreter)
+            line_profiler.start()
+        if sample_profile:
+            from runtime.sampling_profiler import SamplingProfiler
+            sampler = SamplingProfiler(interpreter)
+            sampler.start()
+        if memory_profile:
+            from runtime.allocation_profiler import AllocationProfiler
+            allocation_profiler = AllocationProfiler(interpreter)
+            allocation_profiler.start()
+        if run_cache is not None:
+            with open(filename, 'r', encoding='utf-8') as f:
+                result = run_cache.run(interpreter, f.read(), filename)
+        else:
+            result = interpreter.interpret_file(filename)
         
+        if run_cache is not None:
+            notice = run_cache.notice()
+            if notice:
+                hint = "; pin one with --seed N or set seed = N before evolving" if run_cache.last["reason"] == "unseeded universe" else ""
+                print(notice + hint, file=sys.stderr)
+            elif verbose:
+                print(f"Run cache: {run_cache.last['status']}")
         if verbose:
             print(f"Execution completed successfully")
             if result is not None:
@@ -56,14 +100,178 @@ def run_file(filename: str, verbose: bool = False) -> int:
             traceback.print_exc()
         return 1
 
+    finally:
+        if allocation_profiler is not None:
+            report = allocation_profiler.format_report()
+            allocation_profiler.stop()
+            print()
+            print(report)
+        if sampler is not None:
+            sampler.stop()
+            write_sample_profile(sampler, sample_profile)
+        if line_profiler is not None:
+            line_profiler.stop()
+            print_line_profile(line_profiler, filename)
+        if trace:
+            global_tracer.stop()
+            write_trace(global_tracer, trace)
+
+
+def print_line_profile(line_profiler, filename: str):
+    """Print the script annotated with per-line hits and times"""
+    try:
+        with open(filename, 'r', encoding='utf-8') as f:
+            source = f.read()
+    except OSError:
+        return
+    print()
+    print(line_profiler.format_listing(source, filename))
+
+
+def write_trace(tracer, path: str):
+    """Write the phase spans as a Chrome trace and print where the time went"""
+    try:
+        tracer.write(path)
+    except OSError as e:
+        print(f"Error: cannot write trace: {e}", file=sys.stderr)
+        return
+    print()
+    print(f"Trace: {len(tracer.events)} spans written to {path}")
+    print(tracer.format_summary())
 
-def run_repl(verbose: bool = False) -> int:
+
+def write_sample_profile(sampler, path: str):
+    """Write the sampled stacks for flamegraph tools"""
+    try:
+        sampler.write(path)
+    except OSError as e:
+        print(f"Error: cannot write sample profile: {e}", file=sys.stderr)
+        return
+    stats = sampler.get_performance_stats()
+    print(f"{stats['samples']} samples in {len(sampler.samples)} stacks written to {path} "
+          f"(sampling overhead {100 * stats['overhead']:.2f}%)", file=sys.stderr)
+
+
+def run_ensemble(filename: str, sweeps: List[str], jobs: Optional[int] = None,
+                 table: Optional[str] = None, verbose: bool = False, batch: int = 1) -> int:
+    """Run a script once per point of the --sweep grid"""
+    from runtime.ensemble import EnsembleRunner, ResultTable, parse_sweep
+
+    try:
+        grid = dict(parse_sweep(spec) for spec in sweeps)
+        with open(filename, 'r', encoding='utf-8') as f:
+            source = f.read()
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    runner = EnsembleRunner(source, grid, workers=jobs, filename=filename, batch=batch)
+    output = open(table, 'w', newline='', encoding='utf-8') if table else sys.stdout
+    try:
+        results = ResultTable(output, runner.columns)
+        for row in runner.iter_results():
+            results.write(row)
+            if table and verbose:
+                print(f"run {row['run']} done in {row['time']:.2f}s {row['error']}")
+    except NDScriptError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if table:
+            output.close()
+
+    stats = runner.get_performance_stats()
+    if verbose:
+        print(f"{stats['runs']} runs on {stats['workers']} workers in {stats['wall_time']:.2f}s "
+              f"(setup {stats['setup_time']:.2f}s)", file=sys.stderr)
+    return 1 if stats["failed"] else 0
+
+
+def run_batch(argv: List[str]) -> int:
+    """``nds run-batch``: many scripts on a pool of warm interpreters"""
+    from runtime.batch_runner import BatchRunner, find_scripts
+
+    parser = argparse.ArgumentParser(
+        prog="nds run-batch",
+        description="Run many ND-Script files, reusing one interpreter per worker process"
+    )
+    parser.add_argument('scripts', nargs='+', metavar='DIR|GLOB|FILE',
+                        help='Scripts to run; directories are searched recursively for .ndx files')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='Worker processes (default: number of CPUs)')
+    parser.add_argument('-o', '--output-dir', metavar='DIR',
+                        help='Write each script\'s output to DIR/<script>.out (stderr to .err)')
+    parser.add_argument('--summary', metavar='FILE',
+                        help='Write status and timing of every script to FILE as JSON')
+    parser.add_argument('--seed', type=int, metavar='N',
+                        help='Pin the universe seed of every script')
+    parser.add_argument('--run-cache', action='store_true',
+                        help='Restore seeded scripts seen before from the run cache instead of executing them')
+    parser.add_argument('--run-cache-size', type=int, default=1024, metavar='MB',
+                        help='Largest size of the run cache before least recently used runs are evicted')
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help='Print the error of each failed script')
+    args = parser.parse_args(argv)
+
+    scripts = find_scripts(args.scripts)
+    if not scripts:
+        print(f"Error: no scripts match {' '.join(args.scripts)}", file=sys.stderr)
+        return 1
+
+    run_cache = (None, args.run_cache_size * 1024 * 1024) if args.run_cache else None
+    runner = BatchRunner(scripts, workers=args.jobs, output_dir=args.output_dir, seed=args.seed,
+                         run_cache=run_cache)
+
+    def report(row):
+        cached = ""
+        if row['cache'] == "hit":
+            cached = " (cached)"
+        elif row['cache_reason']:
+            cached = f" (not cached: {row['cache_reason']})"
+        print(f"{row['status']:<8} {row['time']:>8.2f}s  {row['script']}{cached}")
+        if args.verbose and row['error']:
+            print(f"         {row['error']}")
+        sys.stdout.flush()
+
+    try:
+        rows = runner.run(report)
+    except OSError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    stats = runner.get_performance_stats()
+    cached = f", {stats['cache_hits']} from the run cache" if args.run_cache else ""
+    print(f"{stats['scripts']} scripts, {stats['failed']} failed{cached} on {stats['workers']} workers "
+          f"in {stats['wall_time']:.2f}s (script time {stats['run_time']:.2f}s)")
+    if any(row['cache_reason'] == "unseeded universe" for row in rows):
+        print("Unseeded scripts are not cached; pin a seed with --seed N", file=sys.stderr)
+    if args.summary:
+        import json
+        try:
+            with open(args.summary, 'w', encoding='utf-8') as f:
+                json.dump({"scripts": rows, "stats": stats}, f, indent=2)
+        except OSError as e:
+            print(f"Error: cannot write summary: {e}", file=sys.stderr)
+            return 1
+    return 1 if stats["failed"] else 0
+
+
+def run_repl(verbose: bool = False, memory_profile: bool = False) -> int:
     """Run interactive REPL"""
     print("ND-Script Interactive Shell")
     print("Type 'خروج' or 'exit' to quit, 'مساعدة' or 'help' for help")
     print()
     
     interpreter = NDScriptInterpreter()
+
+    # 'ذاكرة' / 'memory' يعرض نمو الذاكرة منذ آخر استدعاء
+    allocation_profiler = None
+    memory_baseline = None
+    if memory_profile:
+        from runtime.allocation_profiler import AllocationProfiler
+        allocation_profiler = AllocationProfiler(interpreter)
+        allocation_profiler.start()
+        memory_baseline = allocation_profiler.snapshot()
     
     while True:
         try:
@@ -90,6 +298,15 @@ def run_repl(verbose: bool = False) -> int:
             if line.strip() in ['مسح', 'clear']:
                 os.system('cls' if os.name == 'nt' else 'clear')
                 continue
+
+            if line.strip() in ['ذاكرة', 'memory']:
+                if allocation_profiler is None:
+                    print("Start the REPL with --memory-profile to track memory growth")
+                else:
+                    snapshot = allocation_profiler.snapshot()
+                    print_memory_growth(allocation_profiler.compare(memory_baseline, snapshot))
+                    memory_baseline = snapshot
+                continue
             
             # Execute the line
             try:
@@ -110,6 +327,18 @@ def run_repl(verbose: bool = False) -> int:
             continue
 
 
+def print_memory_growth(growth):
+    """Print what grew between two allocation snapshots"""
+    print(f"Traced memory: {growth['traced_growth'] / 1024:+.1f} KiB, "
+          f"blocks: {growth['blocks_growth']:+d}")
+    for row in growth["lines"]:
+        print(f"  {row['bytes'] / 1024:+10.1f} KiB {row['blocks']:+8d}  {row['line']} ({row['hits']} runs)")
+    for row in growth["functions"]:
+        print(f"  {row['bytes'] / 1024:+10.1f} KiB {row['blocks']:+8d}  {row['function']}() ({row['calls']} calls)")
+    for row in growth["allocators"]:
+        print(f"  {row['bytes'] / 1024:+10.1f} KiB {row['blocks']:+8d}  {row['location']}")
+
+
 def print_help():
     """Print help information"""
     help_text = """
@@ -137,6 +366,7 @@ Parameters:
 File Operations:
   حفظ "file.nds" / save "file.nds"  - Save universe state
   تحميل "file.nds" / load "file.nds" - Load universe state
+  تسجيل كل 5 "run.ndt" / record every 5 "run.ndt" - Record trajectory frames
 
 Variables:
   x = 10                         - Assign variable
@@ -148,6 +378,7 @@ Control Flow:
 
 REPL Commands:
   مساعدة / help                  - Show this help
+  ذاكرة / memory                 - Memory growth since the last call (--memory-profile)
   مسح / clear                    - Clear screen
   خروج / exit                   - Exit REPL
 """
@@ -156,6 +387,13 @@ REPL Commands:
 
 def main():
     """Main entry point"""
+    # أوامر فرعية لها معاملاتها الخاصة
+    if sys.argv[1:2] == ['bench']:
+        from tools.benchmark import main as run_bench
+        return run_bench(sys.argv[2:])
+    if sys.argv[1:2] == ['run-batch']:
+        return run_batch(sys.argv[2:])
+
     parser = argparse.ArgumentParser(
         description="ND-Script: Domain-Specific Language for Quantum Fractal Universe Simulation",
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -165,6 +403,17 @@ Examples:
   nds -i                      # Start interactive REPL
   nds -v script.ndx           # Run with verbose output
   nds --check script.ndx      # Check syntax only
+  nds --profile script.ndx    # Run, then print time per source line
+  nds --sample-profile out.folded script.ndx   # Sampled stacks for flamegraph.pl
+  nds --memory-profile script.ndx   # Peak and retained memory per source line
+  nds --trace run.json script.ndx   # Phase spans for chrome://tracing or Perfetto
+  nds --metrics run.prom script.ndx   # Interpreter metrics in OpenMetrics text at exit
+  nds -i --metrics-port 9464  # Serve metrics on http://127.0.0.1:9464/metrics
+  nds bench -o base.json      # Benchmark suite; later: nds bench --baseline base.json
+  nds run-batch scenarios/ -j 8 -o out/ --summary summary.json   # Many scripts, warm workers
+  nds --seed 7 --run-cache script.ndx   # Seeded run; identical reruns are restored from the cache
+  nds script.ndx --sweep gravity=0.1,0.5 --sweep seed=1..8 -j 4 --table runs.csv
+  nds script.ndx --sweep seed=1..64 --batch 16   # 16 universes per vectorized run
         """
     )
     
@@ -192,6 +441,91 @@ Examples:
         help='Check syntax only (do not execute)'
     )
     
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='Print hits, total and self time for every source line and function'
+    )
+
+    parser.add_argument(
+        '--sample-profile',
+        metavar='FILE',
+        help='Sample script call stacks and write them to FILE as collapsed stacks'
+    )
+
+    parser.add_argument(
+        '--memory-profile',
+        action='store_true',
+        help='Attribute allocated memory to source lines and functions (tracemalloc)'
+    )
+
+    parser.add_argument(
+        '--trace',
+        metavar='FILE',
+        help='Write parse, compile, execute and universe-step spans to FILE as a Chrome trace'
+    )
+
+    parser.add_argument(
+        '--metrics',
+        metavar='FILE',
+        help='Write interpreter metrics to FILE at exit (OpenMetrics text, or JSON for .json)'
+    )
+
+    parser.add_argument(
+        '--metrics-port',
+        type=int,
+        metavar='PORT',
+        help='Serve interpreter metrics on http://127.0.0.1:PORT/metrics while running'
+    )
+
+    parser.add_argument(
+        '--seed',
+        type=int,
+        metavar='N',
+        help='Pin the universe seed so that the run is reproducible'
+    )
+
+    parser.add_argument(
+        '--run-cache',
+        action='store_true',
+        help='Restore the results of a seeded run seen before instead of executing it'
+    )
+
+    parser.add_argument(
+        '--run-cache-size',
+        type=int,
+        default=1024,
+        metavar='MB',
+        help='Largest size of the run cache before least recently used runs are evicted'
+    )
+
+    parser.add_argument(
+        '--sweep',
+        action='append',
+        metavar='NAME=VALUES',
+        help='Run an ensemble over NAME=v1,v2,... or NAME=first..last (repeat for a grid)'
+    )
+
+    parser.add_argument(
+        '-j', '--jobs',
+        type=int,
+        default=None,
+        help='Ensemble members run at once (default: number of CPUs)'
+    )
+
+    parser.add_argument(
+        '--batch',
+        type=int,
+        default=1,
+        help='Evolve this many ensemble members together as one batched universe'
+    )
+
+    parser.add_argument(
+        '--table',
+        metavar='FILE',
+        help='Write the ensemble result table to FILE as CSV (default: stdout)'
+    )
+
     parser.add_argument(
         '--version',
         action='version',
@@ -199,10 +533,18 @@ Examples:
     )
     
     args = parser.parse_args()
+
+    if args.metrics or args.metrics_port:
+        from runtime.metrics import registry
+        if args.metrics_port:
+            registry.serve(args.metrics_port)
+        if args.metrics:
+            # عند الخروج، أياً كان مسار التنفيذ
+            atexit.register(registry.write, args.metrics)
     
     # Handle different modes
     if args.interactive or (not args.file and not args.check):
-        return run_repl(args.verbose)
+        return run_repl(args.verbose, args.memory_profile)
     
     if args.file:
         if args.check:
@@ -219,8 +561,15 @@ Examples:
             except Exception as e:
                 print(f"Syntax Error in {args.file}: {e}", file=sys.stderr)
                 return 1
+        elif args.sweep:
+            return run_ensemble(args.file, args.sweep, args.jobs, args.table, args.verbose, args.batch)
         else:
-            return run_file(args.file, args.verbose)
+            run_cache = None
+            if args.run_cache:
+                from runtime.run_cache import RunCache
+                run_cache = RunCache(max_bytes=args.run_cache_size * 1024 * 1024)
+            return run_file(args.file, args.verbose, args.profile, args.sample_profile,
+                            args.memory_profile, args.trace, args.seed, run_cache)
     
     parser.print_help()
     return 1
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+محلل تخصيص الذاكرة لـ ND-Script
+Allocation Profiler for ND-Script: memory attributed to source lines
+
+``AllocationProfiler`` hooks the same statement visitors and function
+executors as the line profiler, with ``tracemalloc`` running. Around each
+statement it reads the traced memory and ``sys.getallocatedblocks``.
+Three figures are recorded per line and per user function:
+
+* retained bytes and blocks: what the statement left allocated, minus
+  what the lines inside it left (a function keeps its whole body);
+* peak: the highest traced memory above the statement's start, including
+  temporaries that were freed before it finished. Python 3.8 has no
+  ``tracemalloc.reset_peak``; there the peak is the highest memory seen
+  at statement boundaries, so temporaries freed inside a statement are
+  missed.
+
+``snapshot`` and ``compare`` show the growth between two moments of a
+long-running session. For each script line the growth is in retained
+bytes; for the Python code that allocated, it is in traced bytes.
+
+Only the thread that started the profiler is attributed. Other threads,
+such as parallel-for workers, still count in the totals of the statement
+that is waiting for them.
+"""
+
+import sys
+import threading
+import tracemalloc
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .errors import NDScriptRuntimeError
+from .line_profiler import install_hooks, restore_hooks
+
+# Python 3.9+
+_reset_peak = getattr(tracemalloc, "reset_peak", None)
+
+
+@dataclass
+class AllocationSnapshot:
+    """Retained memory per script line and the ``tracemalloc`` snapshot, at one moment"""
+    lines: Dict[Any, List[int]]
+    functions: Dict[str, List[int]]
+    traces: tracemalloc.Snapshot
+    traced: int = 0
+    blocks: int = 0
+
+
+class _Frame:
+    __slots__ = ("key", "memory", "blocks", "peak", "child_memory", "child_blocks")
+
+    def __init__(self, key, memory: int, blocks: int):
+        self.key = key
+        self.memory = memory
+        self.blocks = blocks
+        self.peak = memory
+        self.child_memory = 0
+        self.child_blocks = 0
+
+
+def _location(key) -> str:
+    source, line = key
+    return f"{source or '<script>'}:{line}"
+
+
+def _to_dict(stats: List[int]) -> Dict[str, Any]:
+    hits, retained, blocks, peak = stats
+    return {"hits": hits, "retained_bytes": retained, "retained_blocks": blocks, "peak_bytes": peak}
+
+
+class AllocationProfiler:
+    """Bytes, blocks and peak memory per script line and per user function.
+
+    ``nframes`` is the traceback depth kept by ``tracemalloc`` for the
+    Python-level allocator report; deeper tracebacks cost more.
+    """
+
+    def __init__(self, interpreter, nframes: int = 1):
+        self.interpreter = interpreter
+        self.nframes = nframes
+        self.running = False
+        # key -> [hits, retained_bytes, retained_blocks, peak_bytes]
+        self.lines: Dict[Any, List[int]] = {}
+        self.functions: Dict[str, List[int]] = {}
+        self._stack: List[_Frame] = []
+        self._thread: Optional[int] = None
+        self._saved: Dict[str, Any] = {}
+        self._started_tracing = False
+
+    def _enter(self, key) -> _Frame:
+        memory, peak = tracemalloc.get_traced_memory()
+        if _reset_peak is None:
+            peak = memory  # بلا تصفير للذروة: الفروق عند حدود العبارات فقط
+        if self._stack:
+            parent = self._stack[-1]
+            parent.peak = max(parent.peak, peak)
+        if _reset_peak is not None:
+            # ذروة لكل عبارة: تصفير الذروة هنا، والأب يحتفظ بما رآه قبلها
+            _reset_peak()
+        frame = _Frame(key, memory, sys.getallocatedblocks())
+        self._stack.append(frame)
+        return frame
+
+    def _exit(self, table: Dict[Any, List[int]]):
+        memory, peak = tracemalloc.get_traced_memory()
+        if _reset_peak is None:
+            peak = memory
+        blocks = sys.getallocatedblocks()
+        frame = self._stack.pop()
+        frame.peak = max(frame.peak, peak)
+        retained = memory - frame.memory
+        retained_blocks = blocks - frame.blocks
+
+        is_line = table is self.lines
+        stats = table.get(frame.key)
+        if stats is None:
+            stats = table[frame.key] = [0, 0, 0, 0]
+        stats[0] += 1
+        # الأسطر: ما تبقى بعد طرح الأسطر الداخلية؛ الدوال: الجسم كله
+        stats[1] += retained - frame.child_memory if is_line else retained
+        stats[2] += retained_blocks - frame.child_blocks if is_line else retained_blocks
+        stats[3] = max(stats[3], frame.peak - frame.memory)
+
+        if self._stack:
+            parent = self._stack[-1]
+            parent.peak = max(parent.peak, frame.peak)
+            # السطر المستدعي لا يُحمَّل ما نُسب لأسطر جسم الدالة
+            parent.child_memory += retained if is_line else frame.child_memory
+            parent.child_blocks += retained_blocks if is_line else frame.child_blocks
+
+    def _wrap_statement(self, visit: Callable) -> Callable:
+        def profiled(node):
+            span = getattr(node, "span", None)
+            if span is None or threading.get_ident() != self._thread:
+                return visit(node)
+            key = (span.source, span.line)
+            stack = self._stack
+            if stack and stack[-1].key == key:
+                return visit(node)
+            self._enter(key)
+            try:
+                return visit(node)
+            finally:
+                self._exit(self.lines)
+        return profiled
+
+    def _wrap_function(self, execute: Callable) -> Callable:
+        def profiled(name, *args, **kwargs):
+            if threading.get_ident() != self._thread:
+                return execute(name, *args, **kwargs)
+            self._enter(name)
+            try:
+                return execute(name, *args, **kwargs)
+            finally:
+                self._exit(self.functions)
+        return profiled
+
+    def start(self):
+        """Start ``tracemalloc`` if needed and install the hooks"""
+        if self.running:
+            return
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.nframes)
+            self._started_tracing = True
+        self._thread = threading.get_ident()
+        self._saved = install_hooks(self.interpreter, self._wrap_statement, self._wrap_function)
+        self.running = True
+
+    def stop(self):
+        """Remove the hooks; stops ``tracemalloc`` only if ``start`` started it"""
+        if not self.running:
+            return
+        restore_hooks(self.interpreter, self._saved)
+        self._saved = {}
+        self._stack.clear()
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+        self.running = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.stop()
+
+    def snapshot(self) -> AllocationSnapshot:
+        """Current retained memory per line plus a ``tracemalloc`` snapshot"""
+        if not tracemalloc.is_tracing():
+            raise NDScriptRuntimeError("Allocation profiler is not running")
+        return AllocationSnapshot(
+            lines={key: list(stats) for key, stats in self.lines.items()},
+            functions={key: list(stats) for key, stats in self.functions.items()},
+            traces=tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, __file__),
+            )),
+            traced=tracemalloc.get_traced_memory()[0],
+            blocks=sys.getallocatedblocks(),
+        )
+
+    @staticmethod
+    def compare(old: AllocationSnapshot, new: AllocationSnapshot, limit: int = 10) -> Dict[str, Any]:
+        """Growth from ``old`` to ``new``: script lines, functions and Python allocators"""
+        def growth(before: Dict[Any, List[int]], after: Dict[Any, List[int]]):
+            rows = []
+            for key, stats in after.items():
+                previous = before.get(key, [0, 0, 0, 0])
+                delta = stats[1] - previous[1]
+                if delta:
+                    rows.append((key, delta, stats[2] - previous[2], stats[0] - previous[0]))
+            rows.sort(key=lambda row: row[1], reverse=True)
+            return rows[:limit]
+
+        return {
+            "traced_growth": new.traced - old.traced,
+            "blocks_growth": new.blocks - old.blocks,
+            "lines": [{"line": _location(key), "bytes": delta, "blocks": blocks, "hits": hits}
+                      for key, delta, blocks, hits in growth(old.lines, new.lines)],
+            "functions": [{"function": key, "bytes": delta, "blocks": blocks, "calls": hits}
+                          for key, delta, blocks, hits in growth(old.functions, new.functions)],
+            "allocators": [{"location": str(stat.traceback), "bytes": stat.size_diff, "blocks": stat.count_diff}
+                           for stat in new.traces.compare_to(old.traces, "lineno")[:limit]
+                           if stat.size_diff],
+        }
+
+    def top_lines(self, limit: int = 10, by: str = "peak_bytes") -> List[Tuple[str, Dict[str, Any]]]:
+        """Lines with the highest ``peak_bytes``, ``retained_bytes`` or ``retained_blocks``"""
+        rows = [(_location(key), _to_dict(stats)) for key, stats in self.lines.items()]
+        rows.sort(key=lambda row: row[1][by], reverse=True)
+        return rows[:limit]
+
+    def top_allocators(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """Python source lines holding the most traced memory now"""
+        if not tracemalloc.is_tracing():
+            return []
+        statistics = self.snapshot().traces.statistics("lineno")
+        return [{"location": str(stat.traceback), "bytes": stat.size, "blocks": stat.count}
+                for stat in statistics[:limit]]
+
+    def format_report(self, limit: int = 10) -> str:
+        """Top lines by peak and by retained memory, functions and allocators"""
+        output = []
+
+        def table(title: str, rows, label: str = "Line"):
+            header = f"{label:<28} {'Hits':>8} {'Peak KiB':>11} {'Retained KiB':>13} {'Blocks':>9}"
+            output.append(title)
+            output.append(header)
+            output.append("=" * len(header))
+            for location, stats in rows:
+                output.append(f"{location:<28} {stats['hits']:>8} {stats['peak_bytes'] / 1024:>11.1f} "
+                              f"{stats['retained_bytes'] / 1024:>13.1f} {stats['retained_blocks']:>9}")
+            output.append("")
+
+        table("Allocation profile: highest peak", self.top_lines(limit, "peak_bytes"))
+        table("Allocation profile: most retained", self.top_lines(limit, "retained_bytes"))
+        if self.functions:
+            rows = sorted(((name, _to_dict(stats)) for name, stats in self.functions.items()),
+                          key=lambda row: row[1]["peak_bytes"], reverse=True)
+            table("Allocation profile: functions", rows[:limit], "Function")
+        allocators = self.top_allocators(limit)
+        if allocators:
+            output.append("Largest Python allocators")
+            for allocator in allocators:
+                output.append(f"  {allocator['bytes'] / 1024:>11.1f} KiB {allocator['blocks']:>9}  {allocator['location']}")
+            output.append("")
+        return "\n".join(output)
+
+    def reset(self):
+        self.lines.clear()
+        self.functions.clear()
+
+    def get_performance_stats(self) -> Dict[str, Any]:
+        """إحصائيات الذاكرة لكل سطر ودالة"""
+        traced, peak = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (0, 0)
+        return {
+            "running": self.running,
+            "traced_bytes": traced,
+            "lines": {_location(key): _to_dict(stats) for key, stats in sorted(
+                self.lines.items(), key=lambda item: (item[0][0] or "", item[0][1]))},
+            "functions": {name: _to_dict(stats) for name, stats in self.functions.items()},
+        }
+
+
+def create_allocation_profiler(interpreter, nframes: int = 1) -> AllocationProfiler:
+    """إنشاء محلل تخصيص"""
+    return AllocationProfiler(interpreter, nframes)
@@ -5,11 +5,26 @@ Defines all AST node types for the ND-Script language
 
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
-from typing import Any, List, Optional, Union, Dict, Tuple
+from typing import Any, List, NamedTuple, Optional, Union, Dict, Tuple
+
+
+class SourceSpan(NamedTuple):
+    """Where a node was parsed from: 1-based lines and columns, end exclusive"""
+    line: int
+    column: int
+    end_line: int
+    end_column: int
+    source: Optional[str] = None  # None للنص الرئيسي، وإلا مسار الوحدة المستوردة
+
+    def __str__(self):
+        return f"{self.source or '<script>'}:{self.line}:{self.column}"
 
 
 class ASTNode(ABC):
     """Base class for all AST nodes"""
+
+    # يرفقه المحول بكل عقدة؛ ليس حقلاً في dataclass فلا يدخل في المقارنة
+    span: Optional[SourceSpan] = None
     
     @abstractmethod
     def accept(self, visitor):
@@ -86,6 +101,17 @@ class LoadCommand(ASTNode):
         return visitor.visit_load_command(self)
 
 
+@dataclass
+class RecordCommand(ASTNode):
+    """Record trajectory frames command"""
+    filename: Optional['Expression'] = None
+    every: Optional['Expression'] = None
+    stop: bool = False
+
+    def accept(self, visitor):
+        return visitor.visit_record_command(self)
+
+
 @dataclass
 class ExitCommand(ASTNode):
     """Exit program command"""
@@ -443,6 +469,10 @@ class ASTVisitor(ABC):
     def visit_load_command(self, node: LoadCommand):
         pass
     
+    @abstractmethod
+    def visit_record_command(self, node: RecordCommand):
+        pass
+
     @abstractmethod
     def visit_exit_command(self, node: ExitCommand):
         pass
@@ -7,11 +7,13 @@ AST Caching System for ND-Script
 import hashlib
 import pickle
 import functools
-from typing import Dict, Any, Optional, Tuple
+from typing import Dict, Any, List, Optional, Tuple
 from pathlib import Path
 import threading
 import time
 
+from .metrics import Sample, registry, sample
+
 class ASTCache:
     """نظام تخزين مؤقت متقدم للـ AST"""
     
@@ -138,6 +140,15 @@ class ASTCache:
                 "hit_rate": hit_rate,
                 "total_requests": total_requests
             }
+
+    def metric_samples(self) -> List[Sample]:
+        """عدادات التخزين المؤقت لسجل المقاييس"""
+        with self.lock:
+            return [
+                sample("ast_cache_hits_total", "counter", "AST cache hits", self.hit_count),
+                sample("ast_cache_misses_total", "counter", "AST cache misses", self.miss_count),
+                sample("ast_cache_entries", "gauge", "Entries in the AST cache", len(self.cache)),
+            ]
     
     def get_stats_report(self, language: str = "arabic") -> str:
         """تقرير إحصائيات التخزين المؤقت"""
@@ -216,6 +227,7 @@ class FunctionCallCache:
 
 # مثيلات عامة للتخزين المؤقت
 ast_cache = ASTCache(max_size=1000, ttl_seconds=3600)
+registry.register_collector(ast_cache.metric_samples)
 function_cache = FunctionCallCache(max_size=500)
 
 def cached_ast_parse(parser_func):
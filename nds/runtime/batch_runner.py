@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+مشغل الدفعات لـ ND-Script
+Batch Runner: many scripts over a pool of warm interpreters
+
+``nds script.ndx`` pays for Python start-up, the runtime imports and the
+grammar on every script. The batch runner starts ``workers`` processes
+once; each builds one interpreter and runs script after script on it,
+calling ``reset()`` in between so that every script starts from an empty
+environment and no universe. Each script's stdout and stderr are captured
+on their own, and a summary row (status, time, steps, error) streams back
+as each script finishes.
+
+With a run cache, each worker looks every script up in the shared
+on-disk cache first, so unchanged seeded scripts are not executed again.
+
+Every script runs with its own directory as the working directory, as
+if started there with ``nds``: its imports, loads and relative ``save``
+paths resolve next to the script, so scripts in different directories
+never write the same file.
+
+A script that kills its worker breaks the pool. The scripts that were in
+flight are then re-run one at a time on a fresh pool, so the crash is
+charged to the script that caused it and to no other.
+"""
+
+import concurrent.futures
+import contextlib
+import glob
+import io
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .errors import NDScriptError, ErrorReporter
+
+# أعمدة الملخص لكل نص
+SUMMARY_FIELDS = ("index", "script", "status", "time", "steps", "worker", "cache", "cache_reason", "error",
+                  "output")
+
+# المفسر الدافئ لعملية العامل، وبذرته وذاكرة التشغيل
+_interpreter = None
+_seed = None
+_run_cache = None
+
+
+def find_scripts(patterns: Iterable[str]) -> List[str]:
+    """Scripts named by ``patterns``: files, directories (searched recursively) or globs"""
+    scripts = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = sorted(str(path) for path in Path(pattern).rglob("*.ndx"))
+        elif os.path.isfile(pattern):
+            matches = [pattern]
+        else:
+            matches = sorted(path for path in glob.glob(pattern, recursive=True) if os.path.isfile(path))
+        scripts.extend(path for path in matches if path not in scripts)
+    return scripts
+
+
+def _warm_up():
+    """Load what every script needs; forked workers inherit it"""
+    from .interpreter import load_parser
+    from . import universe  # noqa: F401  (NumPy)
+
+    load_parser()
+
+
+def _init_worker(seed: Optional[int] = None, run_cache: Optional[Tuple[Optional[str], int]] = None):
+    global _interpreter, _seed, _run_cache
+    from .interpreter import NDScriptInterpreter
+
+    _warm_up()
+    _interpreter = NDScriptInterpreter()
+    _interpreter.fast_executor  # تحميل مترجم البايت-كود قبل أول نص
+    _seed = seed
+    if run_cache is not None:
+        from .run_cache import RunCache
+        _run_cache = RunCache(*run_cache)
+
+
+def _run_script(index: int, script: str) -> Dict[str, Any]:
+    """Run ``script`` on this worker's interpreter and reset it afterwards"""
+    if _interpreter is None:
+        _init_worker()
+    interpreter = _interpreter
+
+    stdout, stderr = io.StringIO(), io.StringIO()
+    row = {"index": index, "script": script, "status": "ok", "steps": 0, "worker": os.getpid(), "cache": "",
+           "cache_reason": "", "error": "", "output": ""}
+    start_time = time.perf_counter()
+    source = None
+    cwd = os.getcwd()
+    try:
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            try:
+                path = os.path.abspath(script)
+                # كل نص يعمل في مجلده، فلا تتصادم مسارات الحفظ النسبية لنصوص مجلدات مختلفة
+                os.chdir(os.path.dirname(path))
+                with open(path, 'r', encoding='utf-8') as f:
+                    source = f.read()
+                if _seed is not None:
+                    interpreter.pinned_parameters["seed"] = _seed
+                if _run_cache is not None:
+                    _run_cache.last = {}
+                    _run_cache.run(interpreter, source, script)
+                else:
+                    interpreter.interpret(source, script)
+            finally:
+                row["steps"] = getattr(interpreter.universe, "evolution_steps", 0)
+                if _run_cache is not None:
+                    row["cache"] = _run_cache.last.get("status", "")
+                    row["cache_reason"] = _run_cache.last.get("reason") or ""
+                interpreter.reset()
+                os.chdir(cwd)
+    except NDScriptError as e:
+        row["status"] = "error"
+        row["error"] = str(e).splitlines()[0] if str(e) else type(e).__name__
+        stderr.write((ErrorReporter(source, script).report_error(e) if source is not None else str(e)) + "\n")
+    except Exception as e:
+        row["status"] = "error"
+        row["error"] = f"{type(e).__name__}: {e}"
+        stderr.write(f"Unexpected error: {e}\n")
+    row["time"] = time.perf_counter() - start_time
+    row["stdout"] = stdout.getvalue()
+    row["stderr"] = stderr.getvalue()
+    return row
+
+
+def _crashed_row(index: int, script: str) -> Dict[str, Any]:
+    return {"index": index, "script": script, "status": "crashed", "time": 0.0, "steps": 0, "worker": None,
+            "cache": "", "cache_reason": "", "error": "worker exited unexpectedly", "output": "", "stdout": "", "stderr": ""}
+
+
+class BatchRunner:
+    """Runs a list of scripts on ``workers`` reused interpreter processes.
+
+    With ``output_dir`` each script's stdout is written to
+    ``<output_dir>/<script path>.out`` (and stderr to ``.err`` when not
+    empty) and the row's ``output`` names the file; otherwise the captured
+    text stays in the row under ``stdout`` and ``stderr``.
+    ``iter_results`` yields rows as scripts finish; ``run`` collects them
+    in script order. ``seed`` is pinned for every script, and
+    ``run_cache`` (``(directory, max_bytes)``, ``directory`` None for the
+    default) makes every worker consult a ``RunCache`` first.
+    """
+
+    def __init__(self, scripts: List[str], workers: Optional[int] = None, output_dir: Optional[str] = None,
+                 seed: Optional[int] = None, run_cache: Optional[Tuple[Optional[str], int]] = None):
+        self.scripts = list(scripts)
+        self.workers = max(1, int(workers or os.cpu_count() or 1))
+        self.output_dir = output_dir
+        self._worker_args = (seed, run_cache)
+        self.use_fork = "fork" in multiprocessing.get_all_start_methods()
+        self._base = os.path.commonpath([os.path.dirname(os.path.abspath(script)) for script in self.scripts]) \
+            if self.scripts else ""
+        self.stats = {
+            "scripts": 0,
+            "failed": 0,
+            "crashed": 0,
+            "cache_hits": 0,
+            "pool_restarts": 0,
+            "run_time": 0.0,
+            "wall_time": 0.0,
+        }
+
+    def iter_results(self) -> Iterator[Dict[str, Any]]:
+        """Yield summary rows in completion order"""
+        start_time = time.perf_counter()
+        try:
+            rows = self._iter_serial() if self.workers == 1 or len(self.scripts) <= 1 else self._iter_pool()
+            for row in rows:
+                self._store_output(row)
+                self.stats["scripts"] += 1
+                self.stats["run_time"] += row["time"]
+                if row["status"] != "ok":
+                    self.stats["failed"] += 1
+                if row["status"] == "crashed":
+                    self.stats["crashed"] += 1
+                if row["cache"] == "hit":
+                    self.stats["cache_hits"] += 1
+                yield row
+        finally:
+            self.stats["wall_time"] += time.perf_counter() - start_time
+
+    def _iter_serial(self) -> Iterator[Dict[str, Any]]:
+        # عامل واحد: هذه العملية نفسها
+        _init_worker(*self._worker_args)
+        for index, script in enumerate(self.scripts):
+            yield _run_script(index, script)
+
+    def _new_pool(self) -> concurrent.futures.ProcessPoolExecutor:
+        if self.use_fork:
+            # يرث العمال المحلل وNumPy من الأب بدل تحميلهما من جديد
+            _warm_up()
+            context = multiprocessing.get_context("fork")
+        else:
+            context = None
+        return concurrent.futures.ProcessPoolExecutor(max_workers=self.workers, mp_context=context,
+                                                      initializer=_init_worker, initargs=self._worker_args)
+
+    def _iter_pool(self) -> Iterator[Dict[str, Any]]:
+        waiting = deque(enumerate(self.scripts))
+        # نصوص كانت قيد التنفيذ عند انهيار عامل: تعاد واحداً واحداً
+        suspects: deque = deque()
+        while waiting or suspects:
+            pool = self._new_pool()
+            pending: Dict[concurrent.futures.Future, Tuple[int, str]] = {}
+            solo = False
+            try:
+                while True:
+                    solo = bool(suspects) or (solo and bool(pending))
+                    queue, limit = (suspects, 1) if solo else (waiting, 2 * self.workers)
+                    while queue and len(pending) < limit:
+                        index, script = queue.popleft()
+                        pending[pool.submit(_run_script, index, script)] = (index, script)
+                    if not pending:
+                        return
+
+                    done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                    broken = False
+                    for future in done:
+                        try:
+                            row = future.result()
+                        except BrokenProcessPool:
+                            broken = True
+                            continue
+                        del pending[future]
+                        yield row
+                    if broken:
+                        break
+            finally:
+                # cancel_futures يتطلب بايثون 3.9
+                for future in pending:
+                    future.cancel()
+                pool.shutdown(wait=True)
+
+            self.stats["pool_restarts"] += 1
+            lost = sorted(pending.values())
+            if solo:
+                # وحده كان يعمل: هو سبب الانهيار
+                yield _crashed_row(*lost[0])
+            else:
+                suspects.extend(lost)
+
+    def _store_output(self, row: Dict[str, Any]):
+        if self.output_dir is None:
+            return
+        relative = os.path.relpath(os.path.abspath(row["script"]), self._base)
+        path = os.path.join(self.output_dir, relative + ".out")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(row.pop("stdout"))
+        stderr = row.pop("stderr")
+        if stderr:
+            with open(os.path.join(self.output_dir, relative + ".err"), 'w', encoding='utf-8') as f:
+                f.write(stderr)
+        row["output"] = path
+
+    def run(self, callback: Optional[Callable[[Dict[str, Any]], Any]] = None) -> List[Dict[str, Any]]:
+        """Run every script; ``callback`` sees each row as it arrives"""
+        rows = []
+        for row in self.iter_results():
+            if callback is not None:
+                callback(row)
+            rows.append(row)
+        rows.sort(key=lambda row: row["index"])
+        return rows
+
+    def get_performance_stats(self) -> Dict[str, Any]:
+        """إحصائيات الدفعة"""
+        scripts = self.stats["scripts"]
+        return {
+            **self.stats,
+            "workers": self.workers,
+            "fork": self.use_fork,
+            "avg_run_time": self.stats["run_time"] / scripts if scripts else 0.0,
+        }
+
+
+def create_batch_runner(scripts: List[str], workers: Optional[int] = None, output_dir: Optional[str] = None,
+                        seed: Optional[int] = None,
+                        run_cache: Optional[Tuple[Optional[str], int]] = None) -> BatchRunner:
+    """إنشاء مشغل دفعات"""
+    return BatchRunner(scripts, workers=workers, output_dir=output_dir, seed=seed, run_cache=run_cache)
@@ -7,9 +7,12 @@ Bytecode Compiler for ND-Script - Converts AST to Python bytecode
 import ast
 import types
 import functools
+import threading
 import time
 from typing import Dict, Any, Optional, List
 from .ast import *
+from .metrics import Sample, sample
+from .tracing import global_tracer
 
 class BytecodeCompiler:
     """مُجمّع يحول AST إلى كود Python قابل للتنفيذ المباشر"""
@@ -23,6 +26,7 @@ class BytecodeCompiler:
             "cache_misses": 0,
             "compilations": 0
         }
+        self._stats_lock = threading.Lock()
     
     def compile_to_python_ast(self, node: ASTNode) -> ast.AST:
         """تحويل عقدة ND-Script AST إلى Python AST"""
@@ -401,21 +405,29 @@ class BytecodeCompiler:
         # فحص التخزين المؤقت
         cache_key = hash(source_code)
         if cache_key in self.compiled_cache:
-            self.compile_stats["cache_hits"] += 1
-            return self.compiled_cache[cache_key]
+            with self._stats_lock:
+                self.compile_stats["cache_hits"] += 1
+            with global_tracer.span("compile", cache_hit=True):
+                return self.compiled_cache[cache_key]
         
-        self.compile_stats["cache_misses"] += 1
-        self.compile_stats["compilations"] += 1
+        with self._stats_lock:
+            self.compile_stats["cache_misses"] += 1
+            self.compile_stats["compilations"] += 1
         
         try:
-            # تحويل إلى Python AST
-            python_ast = self.compile_to_python_ast(node)
-            
-            # إصلاح AST
-            ast.fix_missing_locations(python_ast)
-            
-            # تجميع إلى بايت-كود
-            bytecode = compile(python_ast, '<ndscript>', 'exec')
+            with global_tracer.span("compile", cache_hit=False) as span:
+                # تحويل إلى Python AST
+                python_ast = self.compile_to_python_ast(node)
+
+                # إصلاح AST
+                ast.fix_missing_locations(python_ast)
+                if span.recording:
+                    span.set("python_nodes", sum(1 for _ in ast.walk(python_ast)))
+
+                # تجميع إلى بايت-كود
+                bytecode = compile(python_ast, '<ndscript>', 'exec')
+                if span.recording:
+                    span.set("bytecode_bytes", len(bytecode.co_code))
             
             # حفظ في التخزين المؤقت
             self.compiled_cache[cache_key] = bytecode
@@ -482,7 +494,8 @@ class BytecodeCompiler:
             for name, value in globals_dict.items():
                 if (not name.startswith('__') and
                     name not in excluded_names and
-                    not callable(value)):
+                    not callable(value) and
+                    not isinstance(value, types.ModuleType)):  # وحدات مساعدة للتنفيذ، لا متغيرات
                     self.interpreter.environment.set(name, value)
 
             # تحديث الدوال المعرفة
@@ -566,6 +579,16 @@ class BytecodeCompiler:
             "hit_rate": hit_rate,
             "cache_size": len(self.compiled_cache)
         }
+
+    def metric_samples(self) -> List[Sample]:
+        """عدادات التجميع لسجل المقاييس"""
+        stats = self.compile_stats
+        return [
+            sample("bytecode_cache_hits_total", "counter", "Bytecode cache hits", stats["cache_hits"]),
+            sample("bytecode_cache_misses_total", "counter", "Bytecode cache misses", stats["cache_misses"]),
+            sample("bytecode_compilations_total", "counter", "Scripts compiled to bytecode", stats["compilations"]),
+            sample("bytecode_cache_entries", "gauge", "Compiled scripts in the cache", len(self.compiled_cache)),
+        ]
     
     def clear_cache(self):
         """مسح التخزين المؤقت"""
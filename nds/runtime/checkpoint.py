@@ -0,0 +1,406 @@
+#!/usr/bin/env python3
+"""
+صيغة نقاط الحفظ الثنائية لـ ND-Script
+Binary Checkpoint Format for ND-Script save/load
+
+A checkpoint file is a chain of records. Each record is laid out as::
+
+    prefix   magic(8) version(u32) flags(u32) header_len(u64) data_offset(u64)
+    header   UTF-8 JSON: metadata, variables, the section table and record info
+    padding  up to SECTION_ALIGNMENT
+    sections raw C-ordered array bytes, each aligned to SECTION_ALIGNMENT
+
+Section offsets in the header are relative to ``data_offset``, and
+``data_offset`` is relative to the start of the record, so the header can
+be written in a single pass.
+
+The first record is a full *base*. Saving to the same file again appends a
+*delta* record holding only the fixed-size blocks of each field whose hash
+changed since the previous record; reading resolves the chain onto the
+memory-mapped base. Version 1 files are a single base record.
+
+When a delta would be too large or the chain too long, the file is
+rewritten as a fresh base instead, so it never holds more than one full
+copy of the state. That drops the earlier ``name.nds@N`` versions;
+``compact_checkpoint`` does the same on request.
+
+Sections may be zlib-compressed (``"compression": "zlib"`` in the section
+table); those are decompressed on read instead of memory-mapped.
+"""
+
+import hashlib
+import json
+import os
+import struct
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .errors import NDScriptIOError
+
+CHECKPOINT_MAGIC = b"NDSCKPT\x00"
+CHECKPOINT_VERSION = 2
+SECTION_ALIGNMENT = 64
+
+# حجم الكتلة لنقاط الحفظ التفاضلية
+DELTA_BLOCK_SIZE = 1 << 18
+MAX_CHAIN_LENGTH = 32
+REBASE_FRACTION = 0.5
+
+FLAG_DELTA = 0x1
+
+_PREFIX = struct.Struct("<8sIIQQ")
+
+
+def _align(offset: int) -> int:
+    return (offset + SECTION_ALIGNMENT - 1) // SECTION_ALIGNMENT * SECTION_ALIGNMENT
+
+
+def is_checkpoint(path: str) -> bool:
+    """Check whether ``path`` starts with the binary checkpoint magic"""
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(CHECKPOINT_MAGIC)) == CHECKPOINT_MAGIC
+    except OSError:
+        return False
+
+
+def hash_blocks(array: np.ndarray, block_size: int = DELTA_BLOCK_SIZE) -> np.ndarray:
+    """64-bit BLAKE2b hash of every ``block_size`` bytes of ``array``"""
+    data = memoryview(np.ascontiguousarray(array)).cast('B')
+    count = -(-len(data) // block_size)
+    hashes = np.empty(count, dtype='<u8')
+    for index in range(count):
+        digest = hashlib.blake2b(data[index * block_size:(index + 1) * block_size], digest_size=8)
+        hashes[index] = int.from_bytes(digest.digest(), 'little')
+    return hashes
+
+
+def _fsync_directory(path: str):
+    """Persist a rename of ``path`` by syncing its directory"""
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _write_record(f, start: int, metadata: Dict[str, Any], record: Dict[str, Any],
+                  sections: List[Tuple[str, str, np.ndarray]], flags: int = 0,
+                  compression: int = 0) -> int:
+    """Write one record at ``start``; returns the offset just past it"""
+    table = []
+    payloads = []
+    offset = 0
+    for name, role, array in sections:
+        payload = memoryview(array).cast('B')
+        entry = {
+            "name": name,
+            "role": role,
+            "dtype": array.dtype.str,
+            "shape": list(array.shape),
+            "offset": offset,
+        }
+        if compression and array.nbytes:
+            payload = zlib.compress(payload, compression)
+            entry["compression"] = "zlib"
+        entry["nbytes"] = len(payload)
+        table.append(entry)
+        payloads.append(payload)
+        offset = _align(offset + len(payload))
+
+    # The header carries the record size, which depends on the header length
+    record["size"] = 0
+    while True:
+        header = json.dumps({"metadata": metadata, "sections": table, "record": record},
+                            ensure_ascii=False).encode('utf-8')
+        data_offset = _align(_PREFIX.size + len(header))
+        if record["size"] == data_offset + offset:
+            break
+        record["size"] = data_offset + offset
+
+    f.seek(start)
+    f.write(_PREFIX.pack(CHECKPOINT_MAGIC, CHECKPOINT_VERSION, flags, len(header), data_offset))
+    f.write(header)
+    for entry, payload in zip(table, payloads):
+        if entry["nbytes"] == 0:
+            continue
+        f.seek(start + data_offset + entry["offset"])
+        f.write(payload)
+    # Padding last: a record is only complete once the file reaches its end
+    f.truncate(start + record["size"])
+    return start + record["size"]
+
+
+def write_checkpoint(path: str, metadata: Dict[str, Any], arrays: Dict[str, np.ndarray],
+                     versions: Optional[Dict[str, Any]] = None,
+                     block_size: int = DELTA_BLOCK_SIZE,
+                     compression: int = 0, fsync: bool = False) -> int:
+    """Write a base checkpoint of ``metadata`` and ``arrays``; returns bytes written.
+
+    The file is written next to its destination and renamed into place, so a
+    crash mid-write never leaves a truncated checkpoint behind. ``versions``
+    are opaque per-field tokens that let a later delta skip hashing fields
+    that have not changed. ``compression`` is a zlib level (0 = off), and
+    ``fsync`` makes the file and the rename durable before returning.
+    """
+    sections = []
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        sections.append((name, "data", array))
+        sections.append((name, "hashes", hash_blocks(array, block_size)))
+    record = {"kind": "base", "index": 0, "block_size": block_size, "versions": versions or {}}
+
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            size = _write_record(f, 0, metadata, record, sections, compression=compression)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        if fsync:
+            _fsync_directory(path)
+    except OSError as e:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise NDScriptIOError(str(e), path)
+
+    return size
+
+
+def append_checkpoint(path: str, metadata: Dict[str, Any], arrays: Dict[str, np.ndarray],
+                      versions: Optional[Dict[str, Any]] = None,
+                      max_chain_length: int = MAX_CHAIN_LENGTH,
+                      compression: int = 0, fsync: bool = False) -> int:
+    """Append a delta of ``arrays`` to the checkpoint chain at ``path``.
+
+    Only blocks whose hash differs from the previous record are written.
+    The file is rewritten as a fresh base instead when there is no usable
+    chain, the field layout changed, more than ``REBASE_FRACTION`` of the
+    data changed, or the chain already holds ``max_chain_length`` deltas,
+    which keeps reads and the file size bounded; the earlier versions are
+    dropped then. Returns bytes written.
+    """
+    records = _read_records(path) if is_checkpoint(path) else []
+    chain = records[_base_index(records):] if records else []
+    last = chain[-1] if chain else None
+
+    # ``chain`` holds the base plus its deltas
+    if last is None or len(chain) > max_chain_length or not _same_layout(last, arrays):
+        return write_checkpoint(path, metadata, arrays, versions,
+                                compression=compression, fsync=fsync)
+
+    info = last["header"]["record"]
+    block_size = info["block_size"]
+    previous_versions = info.get("versions", {})
+    changes = []
+    changed_bytes = total_bytes = 0
+    for name, array in arrays.items():
+        previous = _load_section(path, last, name, "hashes", mmap=False)
+        token = (versions or {}).get(name)
+        if token is not None and previous_versions.get(name) == token:
+            hashes = previous
+            changed = np.empty(0, dtype='<i8')
+        else:
+            hashes = hash_blocks(array, block_size)
+            changed = np.flatnonzero(hashes != previous).astype('<i8')
+        changes.append((name, array, hashes, changed))
+        changed_bytes += len(changed) * block_size
+        total_bytes += array.nbytes
+
+    # A delta touching most blocks costs as much as a base but grows the chain
+    if changed_bytes > REBASE_FRACTION * total_bytes:
+        return write_checkpoint(path, metadata, arrays, versions, block_size,
+                                compression=compression, fsync=fsync)
+
+    sections = []
+    for name, array, hashes, changed in changes:
+        flat = memoryview(np.ascontiguousarray(array)).cast('B')
+        if len(changed):
+            blocks = np.concatenate([
+                np.frombuffer(flat[index * block_size:(index + 1) * block_size], dtype=np.uint8)
+                for index in changed
+            ])
+        else:
+            blocks = np.empty(0, dtype=np.uint8)
+        sections.append((name, "blocks", changed))
+        sections.append((name, "delta", blocks))
+        sections.append((name, "hashes", hashes))
+
+    record = {"kind": "delta", "index": info["index"] + 1,
+              "block_size": block_size, "versions": versions or {}}
+    start = _align(last["offset"] + info["size"])
+    try:
+        with open(path, 'r+b') as f:
+            end = _write_record(f, start, metadata, record, sections,
+                                flags=FLAG_DELTA, compression=compression)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+    except OSError as e:
+        raise NDScriptIOError(str(e), path)
+
+    return end - start
+
+
+def _same_layout(last: Dict[str, Any], arrays: Dict[str, np.ndarray]) -> bool:
+    """Whether ``arrays`` can be expressed as a delta on top of ``last``"""
+    if "block_size" not in last["header"].get("record", {}):
+        return False  # version 1 base: no block hashes to compare against
+    current = {name: (array.dtype.str, list(array.shape)) for name, array in arrays.items()}
+    return last["layout"] == current
+
+
+def _read_records(path: str) -> List[Dict[str, Any]]:
+    """Headers of every complete record in ``path``"""
+    records = []
+    try:
+        with open(path, 'rb') as f:
+            file_size = os.fstat(f.fileno()).st_size
+            offset = 0
+            layout = {}
+            while offset + _PREFIX.size <= file_size:
+                f.seek(offset)
+                magic, version, _flags, header_len, data_offset = _PREFIX.unpack(f.read(_PREFIX.size))
+                if magic != CHECKPOINT_MAGIC:
+                    if offset == 0:
+                        raise NDScriptIOError("not an ND-Script checkpoint", path)
+                    break
+                if version > CHECKPOINT_VERSION:
+                    raise NDScriptIOError(f"unsupported checkpoint version {version}", path)
+                header = json.loads(f.read(header_len).decode('utf-8'))
+                size = header.get("record", {}).get("size", file_size - offset)
+                if offset + size > file_size:
+                    break  # interrupted append
+                if header.get("record", {}).get("kind", "base") == "base":
+                    layout = {}  # قاعدة جديدة: قد يتغير شكل الحقول
+                for section in header["sections"]:
+                    if section.get("role", "data") == "data":
+                        layout[section["name"]] = (section["dtype"], section["shape"])
+                records.append({
+                    "offset": offset,
+                    "data_offset": offset + data_offset,
+                    "header": header,
+                    "layout": dict(layout),
+                })
+                offset = _align(offset + size)
+    except OSError as e:
+        raise NDScriptIOError(str(e), path)
+
+    if not records:
+        raise NDScriptIOError("truncated checkpoint", path)
+    return records
+
+
+def _base_index(records: List[Dict[str, Any]]) -> int:
+    """Index of the base record the last record chains back to"""
+    for index in range(len(records) - 1, -1, -1):
+        if records[index]["header"].get("record", {}).get("kind", "base") == "base":
+            return index
+    return 0
+
+
+def _load_section(path: str, record: Dict[str, Any], name: str, role: str,
+                  mmap: bool) -> Optional[np.ndarray]:
+    """One section of ``record``, memory-mapped copy-on-write or read"""
+    for section in record["header"]["sections"]:
+        if section["name"] == name and section.get("role", "data") == role:
+            break
+    else:
+        return None
+
+    dtype = np.dtype(section["dtype"])
+    shape = tuple(section["shape"])
+    offset = record["data_offset"] + section["offset"]
+    if section["nbytes"] == 0:
+        return np.empty(shape, dtype=dtype)
+    if section.get("compression") == "zlib":
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            raw = zlib.decompress(f.read(section["nbytes"]))
+        return np.frombuffer(bytearray(raw), dtype=dtype).reshape(shape)
+    if mmap:
+        return np.memmap(path, dtype=dtype, mode='c', offset=offset, shape=shape)
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        return np.fromfile(f, dtype=dtype, count=int(np.prod(shape))).reshape(shape)
+
+
+def read_checkpoint(path: str, mmap: bool = True,
+                    version: Optional[int] = None) -> Tuple[Dict[str, Any], Dict[str, np.ndarray]]:
+    """Read a checkpoint; array sections are memory-mapped copy-on-write.
+
+    With ``mmap=True`` nothing but the headers is read up front: pages are
+    faulted in as the arrays are touched, and writes stay private to the
+    process instead of reaching the file. Deltas are applied onto the
+    mapped base, so only the changed blocks are copied.
+
+    ``version`` selects a record of the chain (0 is the first, negative
+    values count from the latest); the default is the latest.
+    """
+    records = _read_records(path)
+    if version is not None:
+        if version < 0:
+            version += len(records)
+        if not 0 <= version < len(records):
+            raise NDScriptIOError(f"checkpoint has no version {version} ({len(records)} saved)", path)
+        records = records[:version + 1]
+
+    base_index = _base_index(records)
+    base = records[base_index]
+    arrays = {}
+    for section in base["header"]["sections"]:
+        if section.get("role", "data") == "data":
+            arrays[section["name"]] = _load_section(path, base, section["name"], "data", mmap)
+
+    for record in records[base_index + 1:]:
+        block_size = record["header"]["record"]["block_size"]
+        for name, target in arrays.items():
+            blocks = _load_section(path, record, name, "blocks", mmap=False)
+            if blocks is None or not len(blocks):
+                continue
+            data = _load_section(path, record, name, "delta", mmap)
+            flat = target.reshape(-1).view(np.uint8)
+            position = 0
+            for index in blocks:
+                start = int(index) * block_size
+                end = min(start + block_size, flat.size)
+                flat[start:end] = data[position:position + end - start]
+                position += end - start
+
+    return records[-1]["header"]["metadata"], arrays
+
+
+def checkpoint_chain(path: str) -> List[Dict[str, Any]]:
+    """Summary of every record in the checkpoint chain at ``path``"""
+    chain = []
+    for record in _read_records(path):
+        info = record["header"].get("record", {})
+        sections = record["header"]["sections"]
+        chain.append({
+            "index": len(chain),
+            "kind": info.get("kind", "base"),
+            "bytes": info.get("size", 0),
+            "changed_blocks": sum(s["shape"][0] for s in sections if s.get("role") == "blocks"),
+            "timestamp": record["header"]["metadata"].get("timestamp"),
+        })
+    return chain
+
+
+def compact_checkpoint(path: str, version: Optional[int] = None) -> int:
+    """Rewrite the chain at ``path`` as a single base; returns bytes written.
+
+    Every other saved version is discarded, so ``path@N`` addresses other
+    than ``@0`` stop resolving.
+    """
+    records = _read_records(path)
+    versions = records[-1 if version is None else version]["header"].get("record", {}).get("versions")
+    metadata, arrays = read_checkpoint(path, mmap=False, version=version)
+    return write_checkpoint(path, metadata, arrays, versions)
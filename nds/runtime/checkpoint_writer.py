@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+كاتب نقاط الحفظ في الخلفية لـ ND-Script
+Background Checkpoint Writer for ND-Script save
+"""
+
+import concurrent.futures
+import os
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from .checkpoint import MAX_CHAIN_LENGTH, append_checkpoint
+from .errors import NDScriptIOError
+
+# سياسات المزامنة مع القرص
+FSYNC_POLICIES = ("always", "barrier", "never")
+
+
+class PendingSave(concurrent.futures.Future):
+    """A queued save: ``done()`` once written, ``result()`` waits and
+    returns the bytes written or raises the write error"""
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+
+    def __str__(self) -> str:
+        return self.path
+
+
+class CheckpointWriter:
+    """Single writer thread draining a bounded queue of checkpoint snapshots.
+
+    Jobs are written in submission order, so repeated saves to one file
+    still form a valid delta chain. ``submit`` blocks while ``max_pending``
+    snapshots are queued, which bounds the memory held by snapshots.
+    Write errors are kept and raised by the next ``flush``, and by the next
+    ``submit`` or ``check`` for the same file.
+    """
+
+    def __init__(self, max_pending: int = 2, fsync: str = "barrier", compression: int = 0):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"fsync policy must be one of {FSYNC_POLICIES}, got {fsync!r}")
+        self.max_pending = max_pending
+        self.fsync = fsync
+        self.compression = compression
+        self.stats = {
+            "saves": 0,
+            "bytes_written": 0,
+            "write_time": 0.0,
+            "backpressure_time": 0.0,
+            "flushes": 0,
+            "errors": 0,
+        }
+
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_pending)
+        self._errors: List[NDScriptIOError] = []
+        self._failed: Dict[str, NDScriptIOError] = {}
+        self._unsynced = set()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def submit(self, path: str, metadata: Dict[str, Any], arrays: Dict[str, Any],
+               versions: Optional[Dict[str, Any]] = None,
+               max_chain_length: int = MAX_CHAIN_LENGTH) -> PendingSave:
+        """Queue a snapshot for writing; blocks while the queue is full.
+
+        Raises the error of an earlier failed write to ``path`` instead of
+        queuing, since the new save would extend a broken chain.
+        """
+        self.check(path)
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="nds-checkpoint-writer", daemon=True)
+            self._thread.start()
+
+        status = PendingSave(path)
+        start_time = time.perf_counter()
+        self._queue.put((status, metadata, arrays, versions, max_chain_length))
+        self.stats["backpressure_time"] += time.perf_counter() - start_time
+        return status
+
+    def check(self, path: str):
+        """Raise the error of a failed earlier write to ``path``, once"""
+        with self._lock:
+            error = self._failed.pop(path, None)
+            if error is not None:
+                self._errors.remove(error)
+        if error is not None:
+            raise error
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                self._write(*job)
+            finally:
+                self._queue.task_done()
+
+    def _write(self, status, metadata, arrays, versions, max_chain_length):
+        path = status.path
+        start_time = time.perf_counter()
+        try:
+            written = append_checkpoint(path, metadata, arrays, versions,
+                                        max_chain_length=max_chain_length,
+                                        compression=self.compression,
+                                        fsync=self.fsync == "always")
+        except Exception as e:
+            error = e if isinstance(e, NDScriptIOError) else NDScriptIOError(str(e), path)
+            with self._lock:
+                self._errors.append(error)
+                self._failed[path] = error
+                self.stats["errors"] += 1
+            status.set_exception(error)
+            return
+
+        with self._lock:
+            if self.fsync == "barrier":
+                self._unsynced.add(path)
+            self.stats["saves"] += 1
+            self.stats["bytes_written"] += written
+            self.stats["write_time"] += time.perf_counter() - start_time
+        status.set_result(written)
+
+    def flush(self):
+        """Wait for every queued snapshot; raises the first write error"""
+        if self._thread is not None:
+            self._queue.join()
+
+        with self._lock:
+            unsynced, self._unsynced = self._unsynced, set()
+            errors, self._errors = self._errors, []
+            self._failed.clear()
+            self.stats["flushes"] += 1
+
+        for path in unsynced:
+            try:
+                fd = os.open(path, os.O_RDONLY)
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+            except OSError:
+                pass  # replaced or removed since it was written
+
+        if errors:
+            raise errors[0]
+
+    def pending(self) -> int:
+        """Number of snapshots not yet written"""
+        return self._queue.unfinished_tasks
+
+    def close(self):
+        """Flush and stop the writer thread"""
+        try:
+            self.flush()
+        finally:
+            if self._thread is not None and self._thread.is_alive():
+                self._queue.put(None)
+                self._thread.join()
+            self._thread = None
+
+    def get_performance_stats(self) -> Dict[str, Any]:
+        """إحصائيات الكاتب"""
+        saves = self.stats["saves"]
+        return {
+            **self.stats,
+            "pending": self.pending(),
+            "max_pending": self.max_pending,
+            "fsync": self.fsync,
+            "compression": self.compression,
+            "avg_write_time": self.stats["write_time"] / saves if saves else 0.0,
+        }
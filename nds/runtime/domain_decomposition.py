@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+تقسيم المجال متعدد العمليات لـ ND-Script
+Domain-Decomposed Multi-Process Evolution over Shared Memory
+"""
+
+import multiprocessing
+import time
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .errors import NDScriptUniverseError
+from .universe import (
+    NoiseField, QuantumFractalUniverse, combine_reductions, field_reductions, new_seed, step_kernel,
+)
+
+
+def split_rows(size: int, workers: int) -> List[Tuple[int, int]]:
+    """Split ``size`` grid rows into ``workers`` contiguous slabs"""
+    base, extra = divmod(size, workers)
+    bounds = []
+    start = 0
+    for rank in range(workers):
+        end = start + base + (1 if rank < extra else 0)
+        bounds.append((start, end))
+        start = end
+    return bounds
+
+
+def _slab_worker(rank: int, shm_names: Tuple[str, str], size: int,
+                 bounds: Tuple[int, int], seed: int,
+                 barrier, commands, results):
+    """Worker loop: evolve one slab, exchanging halos once per step"""
+    buffers = [shared_memory.SharedMemory(name=name) for name in shm_names]
+    fields = [np.ndarray((size, size), dtype=np.float64, buffer=shm.buf) for shm in buffers]
+    start, end = bounds
+    padded = np.empty((end - start + 2, size))
+    # ضجيج كل صف يعتمد على (البذرة، الخطوة، الصف) فقط، لا على عدد العمال
+    noise_field = NoiseField(seed, size)
+    noise = np.empty((end - start, size))
+
+    try:
+        while True:
+            command = commands.get()
+            if command is None:
+                break
+            first_step, steps, source, parameters, reduce = command
+            irregular = parameters["irregularity"] > 0
+            try:
+                for step in range(first_step, first_step + steps):
+                    current = fields[source]
+                    # تبادل الهالة: صف واحد من كل جار (دوري)
+                    padded[1:-1] = current[start:end]
+                    padded[0] = current[start - 1]
+                    padded[-1] = current[end % size]
+                    if irregular:
+                        noise_field.fill(step, noise, start, end)
+                    step_kernel(padded, fields[1 - source][start:end], parameters,
+                                noise if irregular else None)
+                    barrier.wait()
+                    source = 1 - source
+                # After the last barrier every slab is final and stays untouched
+                reductions = None
+                if reduce:
+                    final = fields[source]
+                    reductions = field_reductions(final[start:end], final[end % size])
+                results.put((rank, None, reductions))
+            except Exception as e:
+                barrier.abort()
+                results.put((rank, f"{type(e).__name__}: {e}", None))
+    finally:
+        del fields
+        for shm in buffers:
+            shm.close()
+
+
+class SlabDecomposition:
+    """Universe grid split into row slabs evolved by persistent worker processes"""
+
+    def __init__(self, size: int, workers: int, seed: Optional[int] = None):
+        if workers < 2:
+            raise NDScriptUniverseError("Domain decomposition needs at least 2 workers")
+        self.size = size
+        self.workers = min(workers, size)
+        self.bounds = split_rows(size, self.workers)
+        self.seed = new_seed() if seed is None else seed
+        self.stats = {
+            "runs": 0,
+            "steps": 0,
+            "total_time": 0.0,
+        }
+
+        nbytes = size * size * np.dtype(np.float64).itemsize
+        self._buffers = [shared_memory.SharedMemory(create=True, size=nbytes) for _ in range(2)]
+        self._fields = [np.ndarray((size, size), dtype=np.float64, buffer=shm.buf)
+                        for shm in self._buffers]
+        self._source = 0
+        self.reductions: Optional[Dict[str, float]] = None
+
+        context = multiprocessing.get_context()
+        self._barrier = context.Barrier(self.workers)
+        self._results = context.Queue()
+        self._commands = []
+        self._processes = []
+        shm_names = tuple(shm.name for shm in self._buffers)
+        for rank in range(self.workers):
+            commands = context.Queue()
+            process = context.Process(
+                target=_slab_worker,
+                args=(rank, shm_names, size, self.bounds[rank], self.seed,
+                      self._barrier, commands, self._results),
+                daemon=True,
+            )
+            process.start()
+            self._commands.append(commands)
+            self._processes.append(process)
+
+    @property
+    def field(self) -> np.ndarray:
+        """Shared-memory view of the current field"""
+        return self._fields[self._source]
+
+    def load(self, density: np.ndarray) -> np.ndarray:
+        """Copy ``density`` into shared memory and return the live view"""
+        self._source = 0
+        np.copyto(self._fields[0], density)
+        return self._fields[0]
+
+    def run(self, steps: int, parameters: Dict[str, float], reduce: bool = False,
+            first_step: int = 0) -> np.ndarray:
+        """Evolve all slabs ``steps`` times and return the current field view.
+
+        ``first_step`` is the global index of the first step, which selects
+        the noise, so results match a serial run of the same seed.
+
+        With ``reduce`` each worker also reduces its slab of the result, and
+        the combined ``field_reductions`` are left in ``self.reductions``.
+        """
+        if self._processes is None:
+            raise NDScriptUniverseError("Domain decomposition already closed")
+
+        start_time = time.perf_counter()
+        command = (first_step, steps, self._source, dict(parameters), reduce)
+        for queue in self._commands:
+            queue.put(command)
+
+        errors = []
+        parts = []
+        for _ in range(self.workers):
+            rank, error, reductions = self._results.get()
+            if error:
+                errors.append(f"slab {rank}: {error}")
+            elif reductions is not None:
+                parts.append(reductions)
+        self.reductions = combine_reductions(parts) if reduce and not errors else None
+
+        if errors:
+            self._barrier.reset()
+            raise NDScriptUniverseError("Domain-decomposed evolve failed: " + "; ".join(errors))
+
+        self._source = (self._source + steps) % 2
+        self.stats["runs"] += 1
+        self.stats["steps"] += steps
+        self.stats["total_time"] += time.perf_counter() - start_time
+        return self._fields[self._source]
+
+    def close(self):
+        """Stop the workers and release the shared memory"""
+        if self._processes is None:
+            return
+        for queue in self._commands:
+            queue.put(None)
+        for process in self._processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        self._processes = None
+        self._fields = []
+        for shm in self._buffers:
+            shm.close()
+            shm.unlink()
+        self._buffers = []
+
+    def get_performance_stats(self) -> Dict[str, Any]:
+        """إحصائيات التقسيم"""
+        steps = self.stats["steps"]
+        return {
+            **self.stats,
+            "workers": self.workers,
+            "size": self.size,
+            "avg_step_time": self.stats["total_time"] / steps if steps else 0.0,
+            "slabs": list(self.bounds),
+        }
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+def benchmark_strong_scaling(size: int = 1024, steps: int = 20,
+                             max_workers: Optional[int] = None,
+                             iterations: int = 3, seed: int = 0) -> Dict[str, Any]:
+    """قياس التوسع القوي: نفس الكون من عامل واحد إلى N عامل"""
+    if max_workers is None:
+        max_workers = multiprocessing.cpu_count() or 1
+
+    worker_counts = []
+    workers = 1
+    while workers < max_workers:
+        worker_counts.append(workers)
+        workers *= 2
+    worker_counts.append(max_workers)
+
+    universe = QuantumFractalUniverse()
+    results = []
+    baseline = None
+    for workers in worker_counts:
+        universe.set_parameter("workers", workers)
+        universe.initialize(size=size, seed=seed)
+        universe.evolve(1)  # إحماء العمال
+
+        times = []
+        for _ in range(iterations):
+            start_time = time.perf_counter()
+            universe.evolve(steps)
+            times.append(time.perf_counter() - start_time)
+
+        avg_time = sum(times) / len(times)
+        if baseline is None:
+            baseline = avg_time
+        speedup = baseline / avg_time if avg_time > 0 else 0
+        results.append({
+            "workers": workers,
+            "avg_time": avg_time,
+            "step_time": avg_time / steps,
+            "speedup": speedup,
+            "efficiency": speedup / workers * 100,
+        })
+
+    universe.close()
+    return {
+        "size": size,
+        "steps": steps,
+        "iterations": iterations,
+        "cpu_count": multiprocessing.cpu_count(),
+        "results": results,
+    }
@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+"""
+مشغل المجموعات لـ ND-Script
+Ensemble Runner: parameter sweeps of one script across processes
+
+The script is parsed once and its prologue (everything up to and including
+the first top-level ``init``) is run once in the parent. Every member of
+the sweep is then a forked child that starts from that state through
+copy-on-write memory, pins its grid values and runs the rest of the
+script. Summaries stream back as members finish.
+"""
+
+import contextlib
+import csv
+import itertools
+import multiprocessing
+import os
+import queue
+import sys
+import time
+import concurrent.futures
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .ast import InitCommand, Program
+from .errors import NDScriptSyntaxError
+
+# أعمدة الملخص بعد معاملات الشبكة
+SUMMARY_FIELDS = ("seed", "steps", "total_mass", "energy", "mean", "std", "min", "max", "time", "error")
+
+# معاملات تحدد الحقل الابتدائي: تتطلب إعادة التهيئة بدل ضبط المعامل
+INITIAL_STATE_PARAMETERS = ("seed", "mass")
+
+
+def _parse_value(text: str) -> Any:
+    text = text.strip()
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+
+def parse_sweep(spec: str) -> Tuple[str, List[Any]]:
+    """Parse ``name=v1,v2,...`` or an integer range ``name=first..last``"""
+    name, sep, values = spec.partition("=")
+    if not sep or not name.strip() or not values.strip():
+        raise ValueError(f"Sweep must look like name=v1,v2 or name=first..last, got {spec!r}")
+    if ".." in values:
+        first, _, last = values.partition("..")
+        return name.strip(), list(range(int(first), int(last) + 1))
+    return name.strip(), [_parse_value(value) for value in values.split(",") if value.strip()]
+
+
+def parameter_grid(grid: Dict[str, Iterable[Any]]) -> List[Dict[str, Any]]:
+    """Cartesian product of ``{name: values}`` as a list of parameter dicts"""
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(list(grid[name]) for name in names))]
+
+
+def split_prologue(program: Program) -> Tuple[Program, Program]:
+    """Split at the first top-level ``init``: the prologue is shared by every member"""
+    for index, statement in enumerate(program.statements):
+        if isinstance(statement, InitCommand):
+            return Program(program.statements[:index + 1]), Program(program.statements[index + 1:])
+    return Program([]), program
+
+
+def apply_parameters(interpreter, point: Dict[str, Any], index: int = 0):
+    """Pin ``point`` on ``interpreter`` so the script's own ``set`` lines keep it.
+
+    Without a swept ``seed``, member ``index`` draws from the ``index``-th
+    stream spawned from the shared universe's seed.
+    """
+    from .universe import derive_seed
+
+    point = dict(point)
+    if "seed" in point:
+        point["seed"] = int(point["seed"])
+    interpreter.pinned_parameters = point
+
+    universe = interpreter.universe
+    if universe is None:
+        return  # يطبق عند أول init
+    seed = getattr(universe, "seed", None)
+    if any(name in point for name in INITIAL_STATE_PARAMETERS):
+        if "seed" not in point and seed is not None:
+            point = {"seed": derive_seed(seed, index), **point}
+        universe.initialize(size=universe.size, **point)
+    else:
+        if seed is not None and hasattr(universe, "reseed"):
+            universe.reseed(derive_seed(seed, index))
+        for name, value in point.items():
+            universe.set_parameter(name, value)
+
+
+def apply_batch(interpreter, points: List[Dict[str, Any]], indices: Optional[List[int]] = None):
+    """Stack one universe per point and pin the per-member parameter vectors"""
+    from .universe import BatchedUniverse, derive_seed
+
+    vectors = {name: [point[name] for point in points] for name in points[0]}
+    if "seed" in vectors:
+        vectors["seed"] = [int(seed) for seed in vectors["seed"]]
+    interpreter.batch = len(points)
+    interpreter.pinned_parameters = vectors
+
+    template = interpreter.universe
+    if template is None:
+        return  # يطبق عند أول init
+    # نفس تيارات الأعضاء كما في التشغيل غير المدفوع
+    indices = list(range(len(points))) if indices is None else indices
+    seeds = vectors.get("seed")
+    if seeds is None and "mass" in vectors and getattr(template, "seed", None) is not None:
+        seeds = [derive_seed(template.seed, index) for index in indices]
+    parameters = {name: values for name, values in vectors.items() if name != "seed"}
+    interpreter.universe = BatchedUniverse.from_universe(template, len(points), seeds=seeds,
+                                                         streams=indices, **parameters)
+    if hasattr(template, "close"):
+        template.close()
+
+
+def summarize_members(universe, group: List[Tuple[int, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """One summary row per member of ``group``; a batch is split per member"""
+    if len(group) == 1 and not hasattr(universe, "batch"):
+        index, point = group[0]
+        return [{"run": index, **point, **summarize(universe)}]
+
+    seeds = getattr(universe, "seeds", [None] * len(group))
+
+    statistics = universe.get_batch_statistics() if universe is not None else {}
+    rows = []
+    for member, (index, point) in enumerate(group):
+        row = {"run": index, **point, "seed": seeds[member],
+               "steps": getattr(universe, "evolution_steps", 0)}
+        row.update({name: float(values[member]) for name, values in statistics.items() if name in SUMMARY_FIELDS})
+        rows.append(row)
+    return rows
+
+
+def _failed_rows(group, error: str, elapsed: float = 0.0) -> List[Dict[str, Any]]:
+    return [{"run": index, **point, "time": elapsed, "error": error} for index, point in group]
+
+
+def summarize(universe) -> Dict[str, Any]:
+    """Summary row of a finished member"""
+    if universe is None:
+        return {"steps": 0}
+    row = {"seed": getattr(universe, "seed", None), "steps": getattr(universe, "evolution_steps", 0)}
+    if hasattr(universe, "get_statistics"):
+        statistics = universe.get_statistics()
+        row.update({name: statistics[name] for name in SUMMARY_FIELDS if name in statistics})
+    return row
+
+
+def _close_universe(interpreter):
+    # تحرير عمال التقسيم والذاكرة المشتركة قبل خروج العضو
+    universe = interpreter.universe
+    if universe is not None and hasattr(universe, "close"):
+        try:
+            universe.close()
+        except Exception:
+            pass
+
+
+def _apply_group(interpreter, group):
+    points = [point for _, point in group]
+    if len(points) > 1:
+        apply_batch(interpreter, points, [index for index, _ in group])
+    else:
+        apply_parameters(interpreter, points[0], group[0][0])
+
+
+def _finish_rows(interpreter, group, start_time: float, error: Optional[str]) -> List[Dict[str, Any]]:
+    # زمن الدفعة يوزع على أعضائها
+    elapsed = (time.perf_counter() - start_time) / len(group)
+    if error is not None:
+        return _failed_rows(group, error, elapsed)
+    rows = summarize_members(interpreter.universe, group)
+    for row in rows:
+        row["time"] = elapsed
+        row["error"] = ""
+    return rows
+
+
+def _run_member(interpreter, program: Program, group: List[Tuple[int, Dict[str, Any]]],
+                universe_workers: int, results):
+    """Body of a forked member: the parent's state arrives copy-on-write"""
+    start_time = time.perf_counter()
+    error = None
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            if universe_workers > 1 and len(group) == 1:
+                # عمال التقسيم خاصة بكل عضو، لا تُورث من الأب
+                interpreter.universe.set_parameter("workers", universe_workers)
+            _apply_group(interpreter, group)
+            program.accept(interpreter)
+            interpreter.flush_checkpoints()
+        rows = _finish_rows(interpreter, group, start_time, None)
+    except Exception as e:
+        rows = _finish_rows(interpreter, group, start_time, str(e) or type(e).__name__)
+    finally:
+        _close_universe(interpreter)
+    results.put(rows)
+
+
+def _run_source(source: str, group: List[Tuple[int, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """Member without fork: a fresh interpreter runs the whole script"""
+    from .interpreter import NDScriptInterpreter
+
+    start_time = time.perf_counter()
+    interpreter = NDScriptInterpreter(silent_mode=True)
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            interpreter.use_bytecode = False  # set يمر عبر المفسر ليحترم القيم المثبتة
+            _apply_group(interpreter, group)
+            interpreter.interpret(source)
+        return _finish_rows(interpreter, group, start_time, None)
+    except Exception as e:
+        return _finish_rows(interpreter, group, start_time, str(e) or type(e).__name__)
+    finally:
+        _close_universe(interpreter)
+
+
+class EnsembleRunner:
+    """Runs one script over a list (or grid) of parameter points.
+
+    At most ``workers`` processes run at once. With ``batch`` > 1 each
+    process evolves ``batch`` points together as one ``BatchedUniverse``.
+    ``iter_results`` yields each point's summary row as soon as its process
+    finishes; ``run`` collects them in grid order.
+    """
+
+    def __init__(self, source: str, grid, workers: Optional[int] = None,
+                 filename: str = "<ensemble>", batch: int = 1):
+        self.source = source
+        self.filename = filename
+        self.points = list(grid) if isinstance(grid, (list, tuple)) else parameter_grid(grid)
+        self.workers = max(1, int(workers or os.cpu_count() or 1))
+        self.batch = max(1, int(batch))
+        self.use_fork = "fork" in multiprocessing.get_all_start_methods()
+        self.stats = {
+            "runs": 0,
+            "failed": 0,
+            "setup_time": 0.0,
+            "run_time": 0.0,
+            "wall_time": 0.0,
+        }
+
+    def _groups(self) -> Iterator[List[Tuple[int, Dict[str, Any]]]]:
+        members = list(enumerate(self.points))
+        for start in range(0, len(members), self.batch):
+            yield members[start:start + self.batch]
+
+    @property
+    def columns(self) -> List[str]:
+        names = []
+        for point in self.points:
+            names.extend(name for name in point if name not in names)
+        return ["run"] + names + [name for name in SUMMARY_FIELDS if name not in names]
+
+    def _prepare(self):
+        """Parse once and run the shared prologue in this process"""
+        from .interpreter import NDScriptInterpreter
+
+        interpreter = NDScriptInterpreter(silent_mode=True)
+        try:
+            program = interpreter._cached_parse_and_transform(self.source)
+        except Exception as e:
+            raise NDScriptSyntaxError(f"Syntax error in {self.filename}: {e}")
+
+        prologue, rest = split_prologue(program)
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            prologue.accept(interpreter)
+
+            # A forked member must not share the parent's slab workers
+            universe_workers = getattr(interpreter.universe, "workers", 1)
+            if universe_workers > 1:
+                interpreter.universe.set_parameter("workers", 1)
+        return interpreter, rest, universe_workers
+
+    def iter_results(self) -> Iterator[Dict[str, Any]]:
+        """Yield summary rows in completion order"""
+        start_time = time.perf_counter()
+        try:
+            if self.use_fork:
+                rows = self._iter_forked()
+            else:
+                rows = self._iter_pool()
+            for row in rows:
+                self.stats["runs"] += 1
+                self.stats["run_time"] += row.get("time", 0.0)
+                if row.get("error"):
+                    self.stats["failed"] += 1
+                yield row
+        finally:
+            self.stats["wall_time"] += time.perf_counter() - start_time
+
+    def _iter_forked(self) -> Iterator[Dict[str, Any]]:
+        setup_start = time.perf_counter()
+        interpreter, program, universe_workers = self._prepare()
+        self.stats["setup_time"] += time.perf_counter() - setup_start
+
+        try:
+            yield from self._fork_members(interpreter, program, universe_workers)
+        finally:
+            _close_universe(interpreter)
+
+    def _fork_members(self, interpreter, program, universe_workers) -> Iterator[Dict[str, Any]]:
+        context = multiprocessing.get_context("fork")
+        results = context.Queue()
+        groups = self._groups()
+        running: Dict[int, Tuple[Any, List]] = {}
+        sys.stdout.flush()
+
+        while True:
+            # عدد محدود من العمليات في آن واحد
+            while len(running) < self.workers:
+                group = next(groups, None)
+                if group is None:
+                    break
+                first = group[0][0]
+                process = context.Process(target=_run_member, name=f"nds-ensemble-{first}",
+                                          args=(interpreter, program, group, universe_workers, results))
+                process.start()
+                running[first] = (process, group)
+            if not running:
+                return
+
+            try:
+                rows = results.get(timeout=0.1)
+            except queue.Empty:
+                # عضو انتهى دون نتيجة (قُتل أو انهار)
+                for first, (process, group) in list(running.items()):
+                    if not process.is_alive() and process.exitcode:
+                        process.join()
+                        del running[first]
+                        yield from _failed_rows(group, f"member exited with code {process.exitcode}")
+                continue
+
+            running.pop(rows[0]["run"])[0].join()
+            yield from rows
+
+    def _iter_pool(self) -> Iterator[Dict[str, Any]]:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=self.workers) as pool:
+            pending = {}
+            groups = self._groups()
+            while True:
+                while len(pending) < 2 * self.workers:
+                    group = next(groups, None)
+                    if group is None:
+                        break
+                    pending[pool.submit(_run_source, self.source, group)] = group
+                if not pending:
+                    return
+
+                done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    group = pending.pop(future)
+                    try:
+                        yield from future.result()
+                    except Exception as e:
+                        yield from _failed_rows(group, str(e))
+
+    def run(self, callback: Optional[Callable[[Dict[str, Any]], Any]] = None) -> List[Dict[str, Any]]:
+        """Run every member; ``callback`` sees each row as it arrives"""
+        rows = []
+        for row in self.iter_results():
+            if callback is not None:
+                callback(row)
+            rows.append(row)
+        rows.sort(key=lambda row: row["run"])
+        return rows
+
+    def get_performance_stats(self) -> Dict[str, Any]:
+        """إحصائيات المجموعة"""
+        runs = self.stats["runs"]
+        return {
+            **self.stats,
+            "members": len(self.points),
+            "workers": self.workers,
+            "batch": self.batch,
+            "fork": self.use_fork,
+            "avg_run_time": self.stats["run_time"] / runs if runs else 0.0,
+        }
+
+
+class ResultTable:
+    """CSV writer that appends ensemble rows as they stream in"""
+
+    def __init__(self, stream, columns: List[str]):
+        self.stream = stream
+        self.columns = columns
+        self._writer = csv.DictWriter(stream, fieldnames=columns, extrasaction="ignore")
+        self._writer.writeheader()
+        self.stream.flush()
+
+    def write(self, row: Dict[str, Any]):
+        self._writer.writerow({name: self._format(row.get(name, "")) for name in self.columns})
+        self.stream.flush()
+
+    @staticmethod
+    def _format(value):
+        if isinstance(value, float):
+            return f"{value:.6g}"
+        return value
+
+
+def create_ensemble_runner(source: str, grid, workers: Optional[int] = None,
+                           filename: str = "<ensemble>", batch: int = 1) -> EnsembleRunner:
+    """إنشاء مشغل مجموعات"""
+    return EnsembleRunner(source, grid, workers=workers, filename=filename, batch=batch)
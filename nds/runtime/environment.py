@@ -5,6 +5,8 @@ Handles variable scoping and storage
 
 from typing import Any, Dict, Optional, List
 
+from .metrics import AtomicCounter, Sample, sample
+
 
 class Environment:
     """Environment for variable storage and scoping - Performance Optimized"""
@@ -16,8 +18,13 @@ class Environment:
         self.variables: Dict[str, Any] = {}
         # تخزين مؤقت للمتغيرات المستخدمة بكثرة
         self._var_cache: Dict[str, Any] = {}
-        self._cache_hits = 0
-        self._cache_misses = 0
+        # عدادات ذرية يتشاركها النطاق الفرعي مع أبيه: البيئة العامة تحصي كل البحث
+        if parent is not None:
+            self._cache_hits = parent._cache_hits
+            self._cache_misses = parent._cache_misses
+        else:
+            self._cache_hits = AtomicCounter()
+            self._cache_misses = AtomicCounter()
         # متغيرات مسطحة للوصول السريع
         self._flattened_vars: Optional[Dict[str, Any]] = None
     
@@ -29,7 +36,7 @@ class Environment:
         """Get variable value with caching optimization"""
         # فحص التخزين المؤقت أولاً
         if name in self._var_cache:
-            self._cache_hits += 1
+            self._cache_hits.increment()
             return self._var_cache[name]
 
         # البحث في النطاق الحالي
@@ -37,7 +44,7 @@ class Environment:
             value = self.variables[name]
             # إضافة إلى التخزين المؤقت
             self._var_cache[name] = value
-            self._cache_misses += 1
+            self._cache_misses.increment()
             return value
 
         # البحث في النطاقات الأب
@@ -125,23 +132,33 @@ class Environment:
 
     def get_cache_stats(self) -> Dict[str, int]:
         """إحصائيات التخزين المؤقت"""
-        total = self._cache_hits + self._cache_misses
-        hit_rate = (self._cache_hits / total * 100) if total > 0 else 0
+        hits, misses = self._cache_hits.value, self._cache_misses.value
+        total = hits + misses
+        hit_rate = (hits / total * 100) if total > 0 else 0
 
         return {
-            "cache_hits": self._cache_hits,
-            "cache_misses": self._cache_misses,
+            "cache_hits": hits,
+            "cache_misses": misses,
             "hit_rate": hit_rate,
             "cache_size": len(self._var_cache)
         }
+
+    def metric_samples(self) -> List[Sample]:
+        """عدادات التخزين المؤقت لسجل المقاييس"""
+        return [
+            sample("environment_cache_hits_total", "counter", "Variable lookup cache hits", self._cache_hits.value),
+            sample("environment_cache_misses_total", "counter", "Variable lookup cache misses", self._cache_misses.value),
+        ]
     
     def clear(self) -> None:
         """Clear all variables in current scope"""
         self.variables.clear()
         self._var_cache.clear()
         self._flattened_vars = None
-        self._cache_hits = 0
-        self._cache_misses = 0
+        # العدادات للشجرة كلها: يصفرها الجذر في المكان، فتراه النطاقات الفرعية
+        if self.parent is None:
+            self._cache_hits.reset()
+            self._cache_misses.reset()
     
     def __str__(self) -> str:
         """String representation of environment"""
@@ -7,6 +7,7 @@ import os
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Set
 from .errors import NDScriptError, NDScriptRuntimeError
+from .tracing import global_tracer
 
 
 class ImportedModule:
@@ -40,28 +41,34 @@ class ImportResolver:
     
     def resolve_import(self, filename: str, current_file: Optional[str] = None) -> ImportedModule:
         """Resolve and import an ND-Script file"""
-        # Resolve the full path
-        full_path = self._resolve_file_path(filename, current_file)
-        
-        # Check for circular imports
-        if full_path in self.import_stack:
-            cycle = ' -> '.join(self.import_stack + [full_path])
-            raise NDScriptRuntimeError(f"Circular import detected: {cycle}")
-        
-        # Return cached module if already imported
-        if full_path in self.imported_modules:
-            return self.imported_modules[full_path]
-        
-        # Load and parse the file
-        try:
-            self.import_stack.append(full_path)
-            module = self._load_module(full_path)
-            self.imported_modules[full_path] = module
-            return module
-        
-        finally:
+        with global_tracer.span("import", category="import", module=filename) as span:
+            # Resolve the full path
+            full_path = self._resolve_file_path(filename, current_file)
+            span.set("path", full_path)
+
+            # Check for circular imports
             if full_path in self.import_stack:
-                self.import_stack.remove(full_path)
+                cycle = ' -> '.join(self.import_stack + [full_path])
+                raise NDScriptRuntimeError(f"Circular import detected: {cycle}")
+
+            # Return cached module if already imported
+            if full_path in self.imported_modules:
+                span.set("cache_hit", True)
+                return self.imported_modules[full_path]
+            span.set("cache_hit", False)
+
+            # Load and parse the file
+            try:
+                self.import_stack.append(full_path)
+                module = self._load_module(full_path)
+                self.imported_modules[full_path] = module
+                span.set("bytes", len(module.content))
+                span.set("functions", len(module.functions))
+                return module
+
+            finally:
+                if full_path in self.import_stack:
+                    self.import_stack.remove(full_path)
     
     def _resolve_file_path(self, filename: str, current_file: Optional[str] = None) -> str:
         """Resolve the full path of an import file"""
@@ -111,8 +118,15 @@ class ImportResolver:
         if self.interpreter:
             try:
                 # Parse the content
-                parse_tree = self.interpreter.parser.parse(content)
-                ast = self.interpreter.transformer.transform(parse_tree)
+                with global_tracer.span("parse", bytes=len(content)):
+                    parse_tree = self.interpreter.parser.parse(content)
+                transformer = self.interpreter.transformer
+                transformer.source_name = filepath
+                try:
+                    with global_tracer.span("transform"):
+                        ast = transformer.transform(parse_tree)
+                finally:
+                    transformer.source_name = None
                 module.ast = ast
                 
                 # Extract functions, variables, and macros
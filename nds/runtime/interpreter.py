@@ -3,8 +3,11 @@ ND-Script Interpreter
 Main interpreter for executing ND-Script programs
 """
 
+import heapq
+import math
 import os
 import sys
+import threading
 import time
 from typing import Any, Dict, List, Optional, Union
 from pathlib import Path
@@ -18,9 +21,11 @@ from .environment import Environment
 from .errors import NDScriptError, NDScriptRuntimeError, NDScriptSyntaxError
 from .control_flow_exceptions import BreakException, ContinueException, ReturnException, DebugBreakException
 from .performance_profiler import global_profiler, profile_operation
+from .metrics import registry, sample
+from .tracing import global_tracer
+from .line_profiler import LineProfiler
 from .ast_cache import cached_ast_parse, ast_cache, function_cache
-from .bytecode_compiler import create_fast_executor
-from .parallel_processor import create_parallel_processor, create_thread_safe_universe
+from .optimizer import EvolveFusionPass
 
 # Import the existing quantum fractal universe
 sys.path.append(str(Path(__file__).parent.parent.parent))
@@ -40,9 +45,61 @@ except ImportError:
             print(f"Setting {param} = {value}")
 
 
+# إعدادات العرض: تخص المفسر لا الكون
+RENDER_PARAMETERS = ("frames", "resolution", "frame_skip")
+
+GRAMMAR_PATH = Path(__file__).parent.parent / "grammar" / "nds.lark"
+
+
+def cache_directory() -> Optional[Path]:
+    """Per-user cache directory: ``$NDS_CACHE_DIR``, else ``$XDG_CACHE_HOME/nds`` or ``~/.cache/nds``.
+
+    ``NDS_CACHE_DIR=""`` disables on-disk caches; None is returned when the
+    directory cannot be created.
+    """
+    directory = os.environ.get("NDS_CACHE_DIR")
+    if directory is None:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+        directory = os.path.join(base, "nds")
+    if not directory:
+        return None
+    try:
+        os.makedirs(directory, exist_ok=True)
+    except OSError:
+        return None
+    return Path(directory)
+
+
+@lru_cache(maxsize=None)
+def load_parser() -> Lark:
+    """The LALR parser shared by every interpreter in the process.
+
+    Building the parse tables takes most of an interpreter's start-up, so
+    Lark caches them in ``cache_directory()``; the cache is keyed by the
+    grammar, the options and the Lark version, and rebuilt when any changes.
+    """
+    with open(GRAMMAR_PATH, 'r', encoding='utf-8') as f:
+        grammar = f.read()
+    directory = cache_directory()
+    cache = str(directory / "grammar.lark-cache") if directory is not None else False
+    return Lark(grammar, parser='lalr', propagate_positions=True, cache=cache)
+
+
 class NDScriptTransformer(Transformer):
     """Transforms parse tree to AST"""
 
+    # مصدر المواقع المرفقة: None للنص الرئيسي، مسار الملف للوحدات المستوردة
+    source_name: Optional[str] = None
+
+    def _call_userfunc(self, tree, new_children=None):
+        node = super()._call_userfunc(tree, new_children)
+        # القواعد الداخلية تُحوَّل أولاً، فتبقى أدق المواقع عند تمرير العقدة للأعلى
+        if isinstance(node, ASTNode) and node.span is None and not tree.meta.empty:
+            meta = tree.meta
+            node.span = SourceSpan(meta.line, meta.column, meta.end_line, meta.end_column,
+                                   self.source_name)
+        return node
+
     def start(self, statements):
         # Filter out None values (comments, etc.)
         valid_statements = [s for s in statements if s is not None]
@@ -55,9 +112,10 @@ class NDScriptTransformer(Transformer):
         return args[0] if args else None
 
     def init_command(self, args):
-        # args[0] is the init keyword, args[1] might be parameters
-        if len(args) > 1 and isinstance(args[1], dict):
-            return InitCommand(**args[1])
+        # The keyword is filtered out by the grammar; args may hold the parameters
+        for arg in args:
+            if isinstance(arg, dict):
+                return InitCommand(**arg)
         return InitCommand()
 
     def init_params(self, args):
@@ -74,15 +132,17 @@ class NDScriptTransformer(Transformer):
         return {}
 
     def evolve_command(self, args):
-        # args[0] is evolve keyword, args[1] might be expression
-        if len(args) > 1:
-            return EvolveCommand(steps=args[1])  # Keep as expression
+        # The keyword is filtered out by the grammar; args[0] might be expression
+        if args:
+            return EvolveCommand(steps=args[0])  # Keep as expression
         return EvolveCommand(steps=Number(1))  # Default to 1
 
     def show_command(self, args):
-        # args[0] is show keyword, args[1] is target
-        if len(args) > 1:
-            target = str(args[1])
+        # The keyword is filtered out by the grammar; args[0] is the target
+        if args:
+            if hasattr(args[0], 'accept'):
+                return ShowCommand(target=args[0])  # Evaluated at run time
+            target = str(args[0])
             target_map = {
                 "كثافة": "density", "density": "density",
                 "طاقة": "energy", "energy": "energy",
@@ -95,19 +155,27 @@ class NDScriptTransformer(Transformer):
         return ShowCommand(target="state")
 
     def show_target(self, args):
+        if args and hasattr(args[0], 'accept'):
+            return args[0]
         return str(args[0]) if args else "state"
 
     def set_command(self, args):
-        # args: [set_keyword, parameter, "=", value]
-        if len(args) >= 4:
-            parameter = str(args[1])
-            value = args[3]
+        # args: [parameter, value] (the keyword and "=" are filtered out)
+        if len(args) >= 2:
+            parameter = str(args[0])
+            value = args[1]
             param_map = {
                 "عدم_انتظام": "irregularity",
                 "عتبة_انهيار": "collapse_threshold",
                 "جاذبية": "gravity",
                 "كتلة": "mass",
-                "طاقة_كمية": "quantum_energy"
+                "طاقة_كمية": "quantum_energy",
+                "مراقبة": "observe",
+                "دفعة": "batch",
+                "أحداث_انهيار": "collapse_events",
+                "إطارات": "frames",
+                "دقة": "resolution",
+                "تخطي_إطارات": "frame_skip"
             }
             return SetCommand(
                 parameter=param_map.get(parameter, parameter),
@@ -132,6 +200,15 @@ class NDScriptTransformer(Transformer):
             return LoadCommand(filename=filename_expr)
         return LoadCommand(filename="default.nds")
 
+    def record_command(self, args):
+        # args: [filename] or [interval, filename]
+        if len(args) >= 2:
+            return RecordCommand(filename=args[1], every=args[0])
+        return RecordCommand(filename=args[0])
+
+    def record_stop(self, args):
+        return RecordCommand(stop=True)
+
     def exit_command(self, args):
         return ExitCommand()
 
@@ -433,18 +510,20 @@ class NDScriptTransformer(Transformer):
 
     def while_statement(self, args):
         """Transform while statement"""
-        if len(args) >= 4:
-            condition = args[1]  # condition between parentheses
-            body = args[3] if isinstance(args[3], list) else [args[3]]
+        # args: [condition, body] (keyword, parentheses and ":" are filtered out)
+        if len(args) >= 2:
+            condition = args[0]
+            body = args[1] if isinstance(args[1], list) else [args[1]]
             return WhileStatement(condition=condition, body=body)
         return None
 
     def for_statement(self, args):
         """Transform for statement"""
-        if len(args) >= 6:
-            variable = str(args[1])
-            range_expr = args[3]
-            body = args[5] if isinstance(args[5], list) else [args[5]]
+        # args: [variable, range_expr, body] (keywords and ":" are filtered out)
+        if len(args) >= 3:
+            variable = str(args[0])
+            range_expr = args[1]
+            body = args[2] if isinstance(args[2], list) else [args[2]]
 
             # Extract range expressions
             if hasattr(range_expr, 'start') and hasattr(range_expr, 'end'):
@@ -465,6 +544,19 @@ class NDScriptTransformer(Transformer):
             )
         return None
 
+    def parallel_for_statement(self, args):
+        """Transform parallel for statement"""
+        loop = self.for_statement(args)
+        if loop is None:
+            return None
+        return ParallelForStatement(
+            variable=loop.variable,
+            start_expr=loop.start_expr,
+            end_expr=loop.end_expr,
+            step_expr=loop.step_expr,
+            body=loop.body
+        )
+
     def break_statement(self, args):
         """Transform break statement"""
         return BreakStatement()
@@ -483,14 +575,14 @@ class NDScriptTransformer(Transformer):
     def debug_statement(self, args):
         """Transform debug statement"""
         message = None
-        if len(args) > 1:
-            message = str(args[1]).strip('"\'')
+        if args:
+            message = str(args[0]).strip('"\'')
         return DebugStatement(message=message)
 
     def profile_block(self, args):
         """Transform profile block"""
-        if len(args) >= 2:
-            body = args[1] if isinstance(args[1], list) else [args[1]]
+        if args:
+            body = args[0] if isinstance(args[0], list) else [args[0]]
             return ProfileBlock(body=body)
         return ProfileBlock(body=[])
 
@@ -527,10 +619,10 @@ class NDScriptInterpreter(ASTVisitor):
     def __init__(self, silent_mode: bool = False):
         from .environment import GlobalEnvironment
         from .scope_manager import ScopeManager, FunctionRegistry
-        from .macro_processor import MacroProcessor
-        from .import_resolver import ImportResolver
 
         self.environment = GlobalEnvironment()
+        # تيار التكرار الجاري في كل خيط من خيوط parallel for
+        self._iteration = threading.local()
         self.universe = None
         self.running = True
         self.silent_mode = silent_mode  # Performance optimization
@@ -541,26 +633,148 @@ class NDScriptInterpreter(ASTVisitor):
         # Advanced features
         self.scope_manager = ScopeManager(self.environment)
         self.function_registry = FunctionRegistry()
-        self.macro_processor = MacroProcessor()
-        self.import_resolver = ImportResolver(self)
-
-        # Load grammar
-        grammar_path = Path(__file__).parent.parent / "grammar" / "nds.lark"
-        with open(grammar_path, 'r', encoding='utf-8') as f:
-            grammar = f.read()
-
-        self.parser = Lark(grammar, parser='lalr')
+        # الأنظمة الثقيلة تُنشأ عند أول استخدام (انظر الخصائص أدناه)
+        self._macro_processor = None
+        self._import_resolver = None
+        self._fast_executor = None
+        self._parallel_processor = None
+
+        # Load grammar: one parser per process, tables cached on disk
+        self.parser = load_parser()
         # استخدام المحول العادي مع التحسينات
         self.transformer = NDScriptTransformer()
 
-        # إنشاء منفذ سريع مع البايت-كود
-        self.fast_executor = create_fast_executor(self)
+        # منفذ سريع مع البايت-كود
         self.use_bytecode = True  # تفعيل البايت-كود مع fallback محسن
+        self._execution_mode = "bytecode"
+
+        # دمج أوامر التطور المتتالية وحلقات evolve 1
+        self.optimizer = EvolveFusionPass()
+        self.optimize_ast = True
 
-        # إنشاء معالج متوازي
-        self.parallel_processor = create_parallel_processor()
         self.thread_safe_universe = None
+
+        # عدد نقاط الحفظ التفاضلية قبل إعادة كتابة قاعدة كاملة (0 = دائماً كاملة)
+        self.checkpoint_chain_length = 32
+        # حفظ غير متزامن: لقطة رخيصة يكتبها خيط في الخلفية
+        self.async_checkpoints = True
+        self.checkpoint_writer = None
+
+        # اشتراكات on_step، تنتقل إلى كل كون جديد
+        self.step_subscriptions = []
+
+        # معاملات مثبتة (مشغل المجموعات): أوامر set لا تغيرها
+        self.pinned_parameters = {}
+        # عدد الأكوان المكدسة (set batch=N)
+        self.batch = 1
+
+        # أحداث الانهيار: collapses() و next_collapse() في النصوص
+        self._define_event_functions()
+
+        # عرض الإطارات خارج الشاشة (show plot / show density)
+        self.frame_directory = "frames"
+        self.frame_resolution = 512
+        self.frame_skip = False
+        self.renderer = None
+
+        # مؤقتات العمليات (interpret / execute ...) المشتركة بين المفسرات
+        self.profiler = global_profiler
+        # عدادات المترجم والبيئة والمعالج المتوازي تُقرأ عند تصدير المقاييس فقط
+        registry.register_collector(self.metric_samples)
+
+    @property
+    def macro_processor(self):
+        """معالج الماكرو، يُنشأ عند أول ماكرو"""
+        if self._macro_processor is None:
+            from .macro_processor import MacroProcessor
+            self._macro_processor = MacroProcessor()
+        return self._macro_processor
+
+    @property
+    def import_resolver(self):
+        """محلل الاستيراد، يُنشأ عند أول استيراد"""
+        if self._import_resolver is None:
+            from .import_resolver import ImportResolver
+            self._import_resolver = ImportResolver(self)
+        return self._import_resolver
+
+    @property
+    def fast_executor(self):
+        """منفذ البايت-كود، يُنشأ عند أول نص بسيط"""
+        if self._fast_executor is None:
+            from .bytecode_compiler import create_fast_executor
+            self._fast_executor = create_fast_executor(self)
+            self._fast_executor.set_execution_mode(self._execution_mode)
+        return self._fast_executor
+
+    @property
+    def universe(self):
+        """الكون الحالي؛ داخل تكرار parallel for نسخة التكرار الخاصة من آخر لقطة"""
+        stream = getattr(self._iteration, 'stream', None)
+        if stream is None:
+            return self._universe
+        return self.thread_safe_universe.create_local_copy(stream)
+
+    @universe.setter
+    def universe(self, universe):
+        self._universe = universe
+
+    @property
+    def parallel_processor(self):
+        """المعالج المتوازي، يُنشأ عند أول حلقة متوازية"""
+        if self._parallel_processor is None:
+            from .parallel_processor import create_parallel_processor
+            self._parallel_processor = create_parallel_processor()
+        return self._parallel_processor
     
+    def _define_event_functions(self):
+        for name, function in (("collapses", self.pending_collapses), ("انهيارات", self.pending_collapses),
+                               ("next_collapse", self.next_collapse), ("انهيار_تالي", self.next_collapse)):
+            self.environment.define(name, function)
+
+    def reset(self):
+        """Forget what the last script left behind, as if freshly constructed.
+
+        Variables, functions, macros, imported modules, the universe and the
+        frame settings are dropped. The parser, the parse cache, compiled
+        bytecode and the subsystems already created are kept warm, so the
+        batch runner pays start-up once per worker instead of once per script.
+        """
+        from .environment import GlobalEnvironment
+        from .scope_manager import ScopeManager, FunctionRegistry
+
+        self.flush_checkpoints()
+        self.flush_frames()
+        if self.universe is not None and hasattr(self.universe, 'close'):
+            try:
+                self.universe.close()
+            except Exception:
+                pass
+        if self.renderer is not None:
+            self.renderer.close()
+            self.renderer = None
+
+        self.environment = GlobalEnvironment()
+        self.scope_manager = ScopeManager(self.environment)
+        self.function_registry = FunctionRegistry()
+        self.functions = {}
+        self._define_event_functions()
+        if self._macro_processor is not None:
+            self._macro_processor.clear_macros()
+        if self._import_resolver is not None:
+            # يعاد قراءة الملفات المستوردة: قد يكون النص السابق غيّرها
+            self._import_resolver.clear_cache()
+
+        self.universe = None
+        self.thread_safe_universe = None
+        self.running = True
+        self.step_subscriptions = []
+        self.pinned_parameters = {}
+        self.batch = 1
+        self.frame_directory = "frames"
+        self.frame_resolution = 512
+        self.frame_skip = False
+
     def interpret_file(self, filename: str) -> Any:
         """Interpret an ND-Script file"""
         try:
@@ -575,69 +789,88 @@ class NDScriptInterpreter(ASTVisitor):
     @lru_cache(maxsize=128)
     def _cached_parse_and_transform(self, source: str) -> Any:
         """Cached parsing and transformation"""
-        # Preprocess macros
-        preprocessed_source = self.macro_processor.preprocess(source)
+        return self._parse_and_transform(source)
 
-        # Parse and transform
-        parse_tree = self.parser.parse(preprocessed_source)
-        ast = self.transformer.transform(parse_tree)
+    def _parse_and_transform(self, source: str) -> Any:
+        """Macro expansion, parsing, transformation and optimization, each in its own span"""
+        # Preprocess macros (none are registered before the processor exists)
+        with global_tracer.span("macro", bytes=len(source)) as span:
+            macros = self._macro_processor
+            preprocessed_source = macros.preprocess(source) if macros is not None else source
+            span.set("output_bytes", len(preprocessed_source))
 
+        # Parse and transform
+        with global_tracer.span("parse", bytes=len(preprocessed_source)) as span:
+            parse_tree = self.parser.parse(preprocessed_source)
+            if span.recording:
+                span.set("tree_nodes", sum(1 for _ in parse_tree.iter_subtrees()))
+        with global_tracer.span("transform") as span:
+            ast = self.transformer.transform(parse_tree)
+            if span.recording:
+                span.set("statements", len(getattr(ast, "statements", ())))
+
+        if self.optimize_ast:
+            with global_tracer.span("optimize"):
+                ast = self.optimizer.run(ast)
         return ast
 
     def _is_simple_operation(self, source: str) -> bool:
         """Check if operation is simple enough for bytecode execution"""
         # Avoid bytecode for complex operations that might fail
-        complex_keywords = ['إذا', 'if', 'دالة', 'function', 'طالما', 'while', 'كرر', 'for']
+        complex_keywords = ['إذا', 'if', 'دالة', 'function', 'طالما', 'while', 'كرر', 'for', 'تسجيل', 'record']
         return not any(keyword in source for keyword in complex_keywords)
 
     def interpret(self, source: str, filename: str = "<string>") -> Any:
         """Interpret ND-Script source code with enhanced caching"""
         global_profiler.start_operation("interpret")
-        try:
-            # Use enhanced caching for parse and transform
+        with global_tracer.span("interpret", filename=filename, bytes=len(source)) as span:
             try:
-                ast = self._cached_parse_and_transform(source)
-            except Exception:
-                # Fallback to non-cached version for dynamic content
-                preprocessed_source = self.macro_processor.preprocess(source)
-                parse_tree = self.parser.parse(preprocessed_source)
-                ast = self.transformer.transform(parse_tree)
-
-            global_profiler.start_operation("execute")
-
-            # استخدام البايت-كود للتنفيذ السريع (للعمليات البسيطة فقط)
-            if self.use_bytecode and self._is_simple_operation(source):
+                # Use enhanced caching for parse and transform
+                hits = self._cached_parse_and_transform.cache_info().hits if span.recording else 0
                 try:
-                    result = self.fast_executor.execute(ast, source)
-                    # إذا كانت النتيجة None، استخدم الطريقة التقليدية
-                    if result is None:
+                    ast = self._cached_parse_and_transform(source)
+                except Exception:
+                    # Fallback to non-cached version for dynamic content
+                    ast = self._parse_and_transform(source)
+                if span.recording:
+                    span.set("cache_hit", self._cached_parse_and_transform.cache_info().hits > hits)
+
+                bytecode = self.use_bytecode and self._is_simple_operation(source)
+                with global_profiler.operation("execute"), \
+                        global_tracer.span("execute", mode="bytecode" if bytecode else "visitor"):
+                    # استخدام البايت-كود للتنفيذ السريع (للعمليات البسيطة فقط)
+                    if bytecode:
+                        try:
+                            result = self.fast_executor.execute(ast, source)
+                            # إذا كانت النتيجة None، استخدم الطريقة التقليدية
+                            if result is None:
+                                result = ast.accept(self)
+                        except Exception as e:
+                            # إعادة رفع أخطاء NDScript المهمة
+                            if "Runtime Error" in str(e) or "NDScriptRuntimeError" in str(type(e)):
+                                raise e
+                            # fallback للطريقة التقليدية للأخطاء الأخرى
+                            if not self.silent_mode:
+                                print(f"Bytecode execution failed, using traditional: {e}")
+                            result = ast.accept(self)
+                    else:
                         result = ast.accept(self)
-                except Exception as e:
-                    # إعادة رفع أخطاء NDScript المهمة
-                    if "Runtime Error" in str(e) or "NDScriptRuntimeError" in str(type(e)):
-                        raise e
-                    # fallback للطريقة التقليدية للأخطاء الأخرى
-                    if not self.silent_mode:
-                        print(f"Bytecode execution failed, using traditional: {e}")
-                    result = ast.accept(self)
-            else:
-                result = ast.accept(self)
-
-            global_profiler.end_operation("execute")
 
-            return result
-        except LarkError as e:
-            raise NDScriptSyntaxError(f"Syntax error in {filename}: {e}")
-        except Exception as e:
-            # Add call stack trace for better error reporting
-            if self.scope_manager.is_in_function():
-                trace = self.scope_manager.get_call_stack_trace()
-                error_msg = f"Runtime error in {filename}: {e}\nCall stack:\n" + "\n".join(trace)
-            else:
-                error_msg = f"Runtime error in {filename}: {e}"
-            raise NDScriptRuntimeError(error_msg)
-        finally:
-            global_profiler.end_operation("interpret")
+                return result
+            except LarkError as e:
+                raise NDScriptSyntaxError(f"Syntax error in {filename}: {e}")
+            except Exception as e:
+                # Add call stack trace for better error reporting
+                if self.scope_manager.is_in_function():
+                    trace = self.scope_manager.get_call_stack_trace()
+                    error_msg = f"Runtime error in {filename}: {e}\nCall stack:\n" + "\n".join(trace)
+                else:
+                    error_msg = f"Runtime error in {filename}: {e}"
+                raise NDScriptRuntimeError(error_msg)
+            finally:
+                self.flush_checkpoints()
+                self.flush_frames()
+                global_profiler.end_operation("interpret")
     
     def visit_program(self, node: Program):
         """Execute program"""
@@ -676,6 +909,13 @@ class NDScriptInterpreter(ASTVisitor):
         else:
             steps = 1
 
+        return self._evolve_universe(steps)
+
+    def _evolve_universe(self, steps):
+        """Evolve the universe by ``steps``"""
+        if not self.universe:
+            raise NDScriptRuntimeError("Universe not initialized. Use 'تهيئة' or 'init' first.")
+
         # Use the appropriate method based on universe type
         if hasattr(self.universe, 'run_simulation'):
             result = self.universe.run_simulation(steps)
@@ -703,9 +943,19 @@ class NDScriptInterpreter(ASTVisitor):
             print("Warning: Universe not initialized. Some information may be limited.")
             # Don't raise error, just show what we can
 
+        # الإحصائيات مخزنة في الكون: O(1) ما لم يتغير الحقل
+        statistics = {}
+        if target in ["density", "كثافة", "energy", "طاقة", "stats", "إحصائيات", "statistics"] \
+                and hasattr(self.universe, 'get_statistics'):
+            statistics = self.universe.get_statistics()
+
         if target in ["density", "كثافة"]:
             if self.universe:
                 print("Displaying density visualization...")
+                if statistics:
+                    print(f"  Density: mean={statistics['mean']:.6f} std={statistics['std']:.6f} "
+                          f"min={statistics['min']:.6f} max={statistics['max']:.6f}")
+                self._render_frame("density", annotate=False)
                 return "density_displayed"
             else:
                 print("No universe to display density for")
@@ -713,6 +963,8 @@ class NDScriptInterpreter(ASTVisitor):
         elif target in ["energy", "طاقة"]:
             if self.universe:
                 print("Displaying energy analysis...")
+                if statistics:
+                    print(f"  Total energy: {statistics['energy']:.6f}")
                 return "energy_displayed"
             else:
                 print("No universe to display energy for")
@@ -726,6 +978,11 @@ class NDScriptInterpreter(ASTVisitor):
                 print(f"  State: {getattr(self.universe, 'state', 'active')}")
                 if hasattr(self.universe, 'parameters'):
                     print(f"  Parameters: {self.universe.parameters}")
+                if statistics:
+                    print(f"  Total mass: {statistics['total_mass']:.6f}")
+                    print(f"  Energy: {statistics['energy']:.6f}")
+                    print(f"  Density mean/variance: {statistics['mean']:.6f} / {statistics['variance']:.6f}")
+                    print(f"  Density min/max: {statistics['min']:.6f} / {statistics['max']:.6f}")
             else:
                 print("No universe initialized")
             print(f"  Variables: {len(self.environment.get_all_variables())}")
@@ -733,109 +990,164 @@ class NDScriptInterpreter(ASTVisitor):
             return "stats_displayed"
         elif target in ["plot", "رسم"]:
             print("Generating plot...")
+            if self.universe:
+                self._render_frame("plot", annotate=True)
             return "plot_generated"
         elif target in ["analysis", "تحليل"]:
             print("Performing analysis...")
+            observers = getattr(self.universe, 'standard_observers', None)
+            if observers:
+                self._show_observer_analysis(observers)
+            path = getattr(self.universe, 'recording_path', None)
+            if path:
+                self._show_trajectory_analysis(path)
             return "analysis_performed"
         else:
             # Handle string literals or expressions
             print(f"Displaying: {target}")
             return target
     
+    def _show_observer_analysis(self, observers: Dict[str, Any]):
+        """Summarize the statistics gathered while evolving"""
+        statistics = observers["statistics"].results()
+        if statistics["observations"]:
+            means = statistics["mean"]
+            print(f"  Observed {statistics['observations']} steps "
+                  f"(last {len(means)} kept): mean density {means.mean():.6f}, "
+                  f"drift {means[-1] - means[0]:+.6f}")
+            print(f"  Mean per-cell temporal std: {statistics['mean_temporal_std']:.6f}")
+
+        histogram = observers["histogram"].results()
+        if histogram["observations"]:
+            edges = histogram["edges"]
+            peak = int(histogram["cumulative"].argmax())
+            print(f"  Most frequent density: {edges[peak]:.3f} .. {edges[peak + 1]:.3f}")
+
+        spectrum = observers["spectrum"].results()
+        if spectrum["observations"]:
+            last = spectrum["spectra"][-1]
+            peak = int(last[1:].argmax()) + 1 if len(last) > 1 else 0
+            print(f"  Power spectrum peak at wavenumber {peak} ({spectrum['observations']} spectra)")
+
+    def _show_trajectory_analysis(self, path: str):
+        """Summarize a recorded trajectory frame by frame, without loading it whole"""
+        from .trajectory import open_trajectory
+
+        trajectory = open_trajectory(path)
+        rows = trajectory.summary("density")
+        if not rows:
+            print(f"  Trajectory {path}: no frames")
+            return
+        print(f"  Trajectory {path}: {len(rows)} frames, steps {rows[0]['step']}..{rows[-1]['step']}")
+        print(f"  Mass: {rows[0]['total']:.6f} -> {rows[-1]['total']:.6f}")
+        print(f"  Density range: {min(r['min'] for r in rows):.6f} .. {max(r['max'] for r in rows):.6f}")
+
     def visit_set_command(self, node: SetCommand):
         """Set universe parameter"""
         if not self.universe:
             raise NDScriptRuntimeError("Universe not initialized.")
         
         value = node.value.accept(self)
+        if node.parameter in self.pinned_parameters:
+            # قيمة مثبتة من مشغل المجموعات تتقدم على ضبط النص
+            value = self.pinned_parameters[node.parameter]
+            print(f"Set {node.parameter} = {value} (pinned)")
+            return value
+        if node.parameter == "batch":
+            return self._set_batch(int(value))
+        if node.parameter in RENDER_PARAMETERS:
+            return self._set_render_option(node.parameter, value)
         self.universe.set_parameter(node.parameter, value)
         print(f"Set {node.parameter} = {value}")
         return value
     
+    def _set_batch(self, batch: int) -> int:
+        """Switch to ``batch`` stacked universes (1 returns to a single universe)"""
+        from .universe import BatchedUniverse
+
+        batch = max(1, batch)
+        template = self.universe
+        if isinstance(template, BatchedUniverse):
+            template = template.member(0)
+        if batch > 1:
+            universe = BatchedUniverse.from_universe(template, batch)
+            if hasattr(template, 'close'):
+                template.close()
+        else:
+            universe = template
+        self.universe = universe
+        self.batch = batch
+        print(f"Set batch = {batch}")
+        return batch
+
+    def _match_batch(self, state: Dict[str, Any]):
+        """Replace the universe when a loaded state is (or is not) a batch"""
+        from .universe import BatchedUniverse, QuantumFractalUniverse
+
+        batch = int(state.get("batch", 1)) if isinstance(state, dict) else 1
+        if batch == getattr(self.universe, 'batch', 1):
+            return
+        if hasattr(self.universe, 'close'):
+            self.universe.close()
+        self.universe = BatchedUniverse(batch) if batch > 1 else QuantumFractalUniverse()
+        self.batch = batch
+
     def visit_save_command(self, node: SaveCommand):
         """Save universe state"""
-        import time
+        return self.save_universe(self._resolve_filename(node.filename))
 
-        # Extract filename properly
-        if hasattr(node.filename, 'accept'):
-            filename = node.filename.accept(self)
-        else:
-            filename = node.filename
+    def visit_load_command(self, node: LoadCommand):
+        """Load universe state"""
+        return self.load_universe(self._resolve_filename(node.filename))
+
+    def _resolve_filename(self, filename: Any) -> str:
+        """Evaluate a save/load filename expression to a clean string"""
+        if hasattr(filename, 'accept'):
+            filename = filename.accept(self)
 
         # Convert to string and clean up
         if hasattr(filename, 'value'):
             filename = filename.value
-        filename = str(filename).strip('"\'')
+        return str(filename).strip('"\'')
 
-        # Create save data even if universe is not initialized
-        save_data = {
+    def _collect_save_data(self) -> Dict[str, Any]:
+        """Metadata and variables stored alongside the universe state"""
+        variables = {
+            name: value for name, value in self.environment.get_all_variables().items()
+            if value is None or isinstance(value, (bool, int, float, str))
+        }
+        return {
             "universe_initialized": self.universe is not None,
             "timestamp": time.time(),
-            "variables": self.environment.get_all_variables(),
+            "variables": variables,
             "functions": list(self.functions.keys()),
-            "macros": list(self.macro_processor.macros.keys()) if hasattr(self.macro_processor, 'macros') else []
+            "macros": list(self._macro_processor.macros.keys()) if self._macro_processor is not None else []
         }
 
-        # Add universe state if available
-        if self.universe and hasattr(self.universe, 'get_state'):
-            save_data["universe_state"] = self.universe.get_state()
-
-        try:
-            # Save as JSON file
-            import json
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(save_data, f, indent=2, ensure_ascii=False)
-
-            print(f"State saved to {filename}")
-            return filename
-        except Exception as e:
-            print(f"Error saving state: {e}")
+    def visit_record_command(self, node: RecordCommand):
+        """Start or stop recording trajectory frames"""
+        if not self.universe:
+            raise NDScriptRuntimeError("Universe not initialized.")
+        if not hasattr(self.universe, 'record'):
+            print("Trajectory recording needs the NumPy universe")
             return None
-    
-    def visit_load_command(self, node: LoadCommand):
-        """Load universe state"""
-        # Extract filename properly
-        if hasattr(node.filename, 'accept'):
-            filename = node.filename.accept(self)
-        else:
-            filename = node.filename
-
-        # Convert to string and clean up
-        if hasattr(filename, 'value'):
-            filename = filename.value
-        filename = str(filename).strip('"\'')
-
-        try:
-            import json
-            with open(filename, 'r', encoding='utf-8') as f:
-                save_data = json.load(f)
-
-            # Restore variables
-            if "variables" in save_data:
-                for var_name, var_value in save_data["variables"].items():
-                    self.environment.set(var_name, var_value)
 
-            # Initialize universe if it was saved
-            if save_data.get("universe_initialized", False):
-                if not self.universe:
-                    self.init_universe()
+        if node.stop:
+            frames = self.universe.stop_recording()
+            print(f"Recording stopped ({frames} frames)")
+            return frames
 
-                # Restore universe state if available
-                if "universe_state" in save_data and hasattr(self.universe, 'set_state'):
-                    self.universe.set_state(save_data["universe_state"])
+        filename = self._resolve_filename(node.filename)
+        every = int(node.every.accept(self)) if node.every is not None else 1
+        self.universe.record(filename, every=every)
+        print(f"Recording to {filename} every {every} step(s)")
+        return filename
 
-            print(f"State loaded from {filename}")
-            return filename
-        except FileNotFoundError:
-            print(f"Error: File {filename} not found")
-            return None
-        except Exception as e:
-            print(f"Error loading state: {e}")
-            return None
-    
     def visit_exit_command(self, node: ExitCommand):
         """Exit the interpreter"""
         self.running = False
+        self.flush_checkpoints()
+        self.flush_frames()
         print("Exiting ND-Script interpreter...")
         return None
     
@@ -965,7 +1277,7 @@ class NDScriptInterpreter(ASTVisitor):
             return self._execute_user_function(node.name, args)
 
         # Check for macros (treat as functions for now)
-        if self.macro_processor.has_macro(node.name):
+        if self._macro_processor is not None and self._macro_processor.has_macro(node.name):
             return self._execute_macro(node.name, args)
 
         # Check for built-in functions
@@ -1003,7 +1315,8 @@ class NDScriptInterpreter(ASTVisitor):
                 # Exit function scope
                 return self.scope_manager.exit_function(result)
             except ReturnException as e:
-                return e.value
+                # إرجاع مبكر: يجب إخراج إطار الاستدعاء أيضاً
+                return self.scope_manager.exit_function(e.value)
             finally:
                 # Restore environment
                 self.environment = old_env
@@ -1266,7 +1579,7 @@ class NDScriptInterpreter(ASTVisitor):
             iteration_count = 0
             max_iterations = 10000  # Prevent infinite loops
 
-            while iteration_count < max_iterations:
+            while iteration_count < max_iterations and self.running:
                 # Evaluate condition
                 condition_result = self._evaluate_condition(node.condition)
                 if not condition_result:
@@ -1310,6 +1623,12 @@ class NDScriptInterpreter(ASTVisitor):
             if step_val == 0:
                 raise NDScriptRuntimeError("For loop step cannot be zero")
 
+            plan = getattr(node, 'fusion', None) if self.optimize_ast else None
+            if plan is not None:
+                fused, result = self._execute_fused_loop(node, plan, range(start_val, end_val, step_val))
+                if fused:
+                    return result
+
             result = None
 
             # Execute loop
@@ -1338,6 +1657,103 @@ class NDScriptInterpreter(ASTVisitor):
         except Exception as e:
             raise NDScriptRuntimeError(f"Error in for loop: {e}")
 
+    def _execute_fused_loop(self, node: 'ForStatement', plan, values: range):
+        """Run a loop planned by EvolveFusionPass; returns ``(fused, result)``.
+
+        Consecutive ``evolve`` commands are batched into one call and only
+        flushed before an ``if`` block that fires, so the universe sees the
+        same step counts at the same points as the plain loop.
+        """
+        count = len(values)
+        if not count:
+            return True, None
+
+        # خطوات كل أمر تطور ثابتة داخل الحلقة: تُقيّم مرة واحدة
+        offsets = []      # خطوات التطور قبل كل عنصر داخل التكرار
+        blocks = []       # (الموضع، الجملة، النوع، المعامل)
+        per_iteration = 0
+        for kind, stmt, modulus in plan.items:
+            if kind == "evolve":
+                steps = stmt.steps.accept(self) if stmt.steps is not None else 1
+                if not isinstance(steps, (int, float)) or not float(steps).is_integer() or steps < 0:
+                    return False, None
+                per_iteration += int(steps)
+            else:
+                blocks.append((len(offsets), stmt, kind, modulus))
+                offsets.append(per_iteration)
+
+        # شروط i % K: الإطلاق يتكرر كل K / gcd(step, K) تكراراً
+        patterns = {}
+        for index, stmt, kind, modulus in blocks:
+            if kind != "periodic":
+                continue
+            modulus = modulus.accept(self)
+            if not isinstance(modulus, (int, float)) or not modulus or not float(modulus).is_integer():
+                return False, None
+            modulus = abs(int(modulus))
+            period = min(count, modulus // math.gcd(abs(values.step), modulus))
+            fires = []
+            for j in range(period):
+                self.environment.set(node.variable, values[j])
+                if self._evaluate_condition(stmt.condition):
+                    fires.append(j)
+            patterns[index] = (period, fires)
+
+        if len(patterns) == len(blocks):
+            # كل الشروط دورية: نمر على الإطلاقات فقط
+            streams = [((base + j, index) for base in range(0, count, period) for j in fires if base + j < count)
+                       for index, (period, fires) in patterns.items()]
+            events = heapq.merge(*streams)
+        else:
+            events = ((j, index) for j in range(count) for index in range(len(blocks)))
+
+        self.optimizer.stats["fused_loops"] += 1
+        self.optimizer.stats["fused_iterations"] += count
+
+        result = None
+        done = 0          # الخطوات المنفذة فعلاً
+        skipped = 0       # خطوات ألغتها continue
+        skip_iteration = -1
+        for j, index in events:
+            if j == skip_iteration:
+                continue
+            _, stmt, kind, _ = blocks[index]
+            if kind == "pure":
+                self.environment.set(node.variable, values[j])
+                if not self._evaluate_condition(stmt.condition):
+                    continue
+            else:
+                period, fires = patterns[index]
+                if len(patterns) != len(blocks) and j % period not in fires:
+                    continue
+
+            target = j * per_iteration + offsets[index] - skipped
+            if target > done:
+                result = self._evolve_universe(target - done)
+                self.optimizer.stats["evolve_calls"] += 1
+                done = target
+
+            self.environment.set(node.variable, values[j])
+            try:
+                result = self._execute_block(stmt.then_block)
+            except BreakException:
+                return True, result
+            except ContinueException:
+                skipped += per_iteration - offsets[index]
+                skip_iteration = j
+            except Exception as e:
+                raise NDScriptRuntimeError(f"Error in if statement: {e}")
+
+            if not self.running:
+                return True, result
+
+        target = count * per_iteration - skipped
+        if target > done:
+            result = self._evolve_universe(target - done)
+            self.optimizer.stats["evolve_calls"] += 1
+        self.environment.set(node.variable, values[-1])
+        return True, result
+
     def visit_break_statement(self, node: 'BreakStatement'):
         """Execute break statement"""
         raise BreakException()
@@ -1406,9 +1822,11 @@ class NDScriptInterpreter(ASTVisitor):
         print("📊 Starting performance profiling...")
         start_time = time.time()
         start_memory = self._get_memory_usage()
+        line_profiler = LineProfiler(self)
 
         try:
-            result = self._execute_block(node.body)
+            with line_profiler:
+                result = self._execute_block(node.body)
 
             end_time = time.time()
             end_memory = self._get_memory_usage()
@@ -1420,6 +1838,13 @@ class NDScriptInterpreter(ASTVisitor):
             print(f"   ⏱️  Execution time: {duration:.4f} seconds")
             print(f"   🧠 Memory usage: {memory_delta:.2f} MB")
             print(f"   📈 Performance: {'Good' if duration < 1.0 else 'Needs optimization'}")
+            hottest = line_profiler.hottest(5)
+            if hottest:
+                print(f"   🔥 Hottest lines:")
+                for (source, line), stats in hottest:
+                    location = f"{source}:{line}" if source else f"line {line}"
+                    print(f"      {location}: {stats['hits']} hits, {stats['self_ms']:.3f} ms self, "
+                          f"{stats['total_ms']:.3f} ms total")
 
             return result
 
@@ -1496,15 +1921,27 @@ class NDScriptInterpreter(ASTVisitor):
             process = psutil.Process()
             return process.memory_info().rss / 1024 / 1024
         except ImportError:
-            return 0.0  # psutil not available
+            # بدون psutil: ذاكرة Python المتتبعة إن كان tracemalloc يعمل (nds --memory-profile)
+            import tracemalloc
+            if tracemalloc.is_tracing():
+                return tracemalloc.get_traced_memory()[0] / 1024 / 1024
+            return 0.0
 
     # طرق مساعدة للبايت-كود
     def init_universe(self, size: int = 100, **kwargs):
         """تهيئة الكون - طريقة مساعدة للبايت-كود"""
         try:
             from .universe import QuantumFractalUniverse
-            self.universe = QuantumFractalUniverse()
-            self.universe.initialize(size=size, **kwargs)
+            if self.universe is not None and hasattr(self.universe, 'close'):
+                self.universe.close()
+            if self.batch > 1:
+                self.universe = self._init_batch(size, **kwargs)
+            else:
+                self.universe = QuantumFractalUniverse()
+                self.universe.initialize(size=size, **{**self.pinned_parameters, **kwargs})
+                self.step_subscriptions = [sub for sub in self.step_subscriptions if sub.active]
+                for subscription in self.step_subscriptions:
+                    self.universe.add_observer(subscription)
             print(f"Universe initialized with size={size}, parameters: {kwargs}")
             return self.universe
         except ImportError:
@@ -1546,8 +1983,24 @@ class NDScriptInterpreter(ASTVisitor):
             print(f"Mock universe initialized with size={size}, parameters={kwargs}")
             return self.universe
 
+    def _init_batch(self, size: int, **kwargs):
+        """تهيئة دفعة من الأكوان، مع القيم المثبتة لكل عضو"""
+        from .universe import BatchedUniverse, derive_seed
+
+        parameters = {**self.pinned_parameters, **kwargs}
+        seeds = parameters.pop("seed", None)
+        if seeds is not None and not isinstance(seeds, (list, tuple)):
+            seeds = [derive_seed(int(seeds), member) for member in range(self.batch)]
+        return BatchedUniverse(self.batch).initialize(size=size, seeds=seeds, **parameters)
+
     def set_parameter(self, parameter: str, value: Any):
         """ضبط معامل - طريقة مساعدة للبايت-كود"""
+        if parameter in self.pinned_parameters:
+            return self.pinned_parameters[parameter]
+        if parameter == "batch" and self.universe:
+            return self._set_batch(int(value))
+        if parameter in RENDER_PARAMETERS:
+            return self._set_render_option(parameter, value)
         if self.universe:
             self.universe.set_parameter(parameter, value)
         print(f"Parameter {parameter} set to {value}")
@@ -1578,38 +2031,278 @@ class NDScriptInterpreter(ASTVisitor):
             return None
 
     def save_universe(self, filename: str = "default.nds"):
-        """حفظ الكون - طريقة مساعدة للبايت-كود"""
-        if self.universe:
-            # محاكاة حفظ الكون
-            print(f"Universe saved to {filename}")
+        """حفظ الكون - binary checkpoint, or JSON export for *.json.
+
+        Returns the filename once written, or with asynchronous checkpoints a
+        ``PendingSave`` (its ``str`` is the filename) whose ``result()`` waits
+        for the write; None when the save failed, including when an earlier
+        queued save to the same file failed.
+        """
+        save_data = self._collect_save_data()
+
+        try:
+            from .checkpoint import append_checkpoint
+        except ImportError:  # NumPy not available
+            append_checkpoint = None
+
+        try:
+            if self.checkpoint_writer is not None:
+                # فشل حفظ سابق لنفس الملف يظهر هنا بدل أن يضيع
+                self.checkpoint_writer.check(filename)
+
+            if append_checkpoint is None or filename.endswith('.json'):
+                if self.universe and hasattr(self.universe, 'get_state'):
+                    save_data["universe_state"] = self.universe.get_state()
+
+                import json
+                with open(filename, 'w', encoding='utf-8') as f:
+                    json.dump(save_data, f, indent=2, ensure_ascii=False)
+            else:
+                fields = {}
+                versions = None
+                asynchronous = self.async_checkpoints
+                if self.universe and hasattr(self.universe, 'get_fields'):
+                    save_data["universe_state"] = self.universe.get_metadata()
+                    versions = self.universe.get_field_versions()
+                    if asynchronous and hasattr(self.universe, 'snapshot_fields'):
+                        fields = self.universe.snapshot_fields()
+                    else:
+                        fields = self.universe.get_fields()
+                        asynchronous = False
+                elif self.universe and hasattr(self.universe, 'get_state'):
+                    save_data["universe_state"] = self.universe.get_state()
+
+                # حفظ متكرر لنفس الملف يضيف الكتل المتغيرة فقط
+                if asynchronous:
+                    status = self._get_checkpoint_writer().submit(
+                        filename, save_data, fields, versions,
+                        max_chain_length=self.checkpoint_chain_length)
+                    print(f"State save queued to {filename}")
+                    return status
+                append_checkpoint(filename, save_data, fields, versions,
+                                  max_chain_length=self.checkpoint_chain_length)
+
+            print(f"State saved to {filename}")
             return filename
-        else:
-            print("No universe to save")
+        except Exception as e:
+            print(f"Error saving state: {e}")
             return None
 
     def load_universe(self, filename: str = "default.nds"):
-        """تحميل الكون - طريقة مساعدة للبايت-كود"""
-        # محاكاة تحميل الكون
-        print(f"Universe loaded from {filename}")
-        return filename
+        """تحميل الكون - binary checkpoints are memory-mapped, JSON is parsed.
+
+        ``name.nds@N`` loads the N-th save of a checkpoint chain (``@-1`` is
+        the latest).
+        """
+        try:
+            from .checkpoint import is_checkpoint, read_checkpoint
+        except ImportError:  # NumPy not available
+            is_checkpoint = None
+
+        # حاجز: انتظار نقاط الحفظ المعلقة قبل القراءة
+        self.flush_checkpoints()
+
+        version = None
+        if not os.path.exists(filename) and '@' in filename:
+            path, _, suffix = filename.rpartition('@')
+            if suffix.lstrip('-').isdigit():
+                filename, version = path, int(suffix)
+
+        try:
+            fields = None
+            if is_checkpoint is not None and is_checkpoint(filename):
+                save_data, fields = read_checkpoint(filename, version=version)
+            else:
+                import json
+                with open(filename, 'r', encoding='utf-8') as f:
+                    save_data = json.load(f)
+
+            # Restore variables
+            if "variables" in save_data:
+                for var_name, var_value in save_data["variables"].items():
+                    self.environment.set(var_name, var_value)
+
+            # Initialize universe if it was saved
+            if save_data.get("universe_initialized", False):
+                if not self.universe:
+                    self.init_universe()
+
+                # Restore universe state if available
+                if "universe_state" in save_data:
+                    self._match_batch(save_data["universe_state"])
+                if "universe_state" in save_data and hasattr(self.universe, 'set_state'):
+                    if fields is not None:
+                        self.universe.set_state(save_data["universe_state"], fields)
+                    else:
+                        self.universe.set_state(save_data["universe_state"])
+
+            print(f"State loaded from {filename}")
+            return filename
+        except FileNotFoundError:
+            print(f"Error: File {filename} not found")
+            return None
+        except Exception as e:
+            print(f"Error loading state: {e}")
+            return None
+
+    def on_step(self, callback, every: int = 1, downsample: int = 1):
+        """Subscribe ``callback(step, fields)`` to evolve steps of this and
+        every later universe; returns the subscription"""
+        from .observers import StepSubscription
+        return self.add_step_subscription(StepSubscription(callback, every, downsample))
+
+    def pending_collapses(self) -> int:
+        """Number of queued collapse events (``set collapse_events=N`` enables them)"""
+        detector = getattr(self.universe, 'collapse_detector', None)
+        return detector.pending() if detector is not None else 0
+
+    def next_collapse(self) -> int:
+        """Pop the oldest collapse event into ``collapse_*`` variables.
+
+        Sets ``collapse_step``, ``collapse_cells``, ``collapse_new_cells``,
+        ``collapse_mass``, ``collapse_peak``, ``collapse_row`` and
+        ``collapse_col``, and returns the region's cell count (0 when the
+        queue is empty).
+        """
+        detector = getattr(self.universe, 'collapse_detector', None)
+        event = detector.pop() if detector is not None else None
+        if event is None:
+            return 0
+        for name, value in event.to_dict().items():
+            self.environment.set(f"collapse_{name}", value)
+        return event.cells
+
+    def add_step_subscription(self, subscription):
+        """Attach an existing subscription to the current and future universes"""
+        self.step_subscriptions.append(subscription)
+        if self.universe is not None and hasattr(self.universe, 'add_observer'):
+            self.universe.add_observer(subscription)
+        return subscription
+
+    def _get_checkpoint_writer(self):
+        """Background writer, started on the first asynchronous save"""
+        if self.checkpoint_writer is None:
+            from .checkpoint_writer import CheckpointWriter
+            self.checkpoint_writer = CheckpointWriter()
+        return self.checkpoint_writer
+
+    def flush_checkpoints(self) -> bool:
+        """Wait until every queued save is on disk; reports failed saves"""
+        if self.checkpoint_writer is None:
+            return True
+        try:
+            self.checkpoint_writer.flush()
+            return True
+        except NDScriptError as e:
+            print(f"Error saving state: {e}")
+            return False
+
+    def _get_renderer(self):
+        """Frame renderer, started on the first rendered frame"""
+        if self.renderer is None:
+            from .rendering import FrameRenderer
+            self.renderer = FrameRenderer(self.frame_directory, resolution=self.frame_resolution,
+                                          skip_when_busy=self.frame_skip)
+        return self.renderer
+
+    def _render_frame(self, name: str, annotate: bool):
+        """Queue the density field as the next frame of the ``name`` sequence"""
+        field = getattr(self.universe, 'density', None)
+        if field is None:
+            print("  No field to render")
+            return None
+        steps = getattr(self.universe, 'evolution_steps', 0)
+        path = self._get_renderer().render(field, name, title=f"{name} - step {steps}", annotate=annotate)
+        if path is None:
+            print("  Frame skipped (renderer busy)")
+        else:
+            print(f"  Frame: {path}")
+        return path
+
+    def _set_render_option(self, parameter: str, value: Any):
+        """frames (directory), resolution and frame_skip apply to following frames"""
+        if parameter == "frames":
+            value = str(getattr(value, 'value', value)).strip('"\'')
+            if value != self.frame_directory:
+                # تسلسل جديد في مجلد جديد
+                self.flush_frames()
+                if self.renderer is not None:
+                    self.renderer.close()
+                    self.renderer = None
+            self.frame_directory = value
+        elif parameter == "resolution":
+            value = max(1, int(value))
+            self.frame_resolution = value
+        else:
+            value = bool(value)
+            self.frame_skip = value
+        if self.renderer is not None:
+            self.renderer.resolution = self.frame_resolution
+            self.renderer.skip_when_busy = self.frame_skip
+        print(f"Set {parameter} = {value}")
+        return value
+
+    def flush_frames(self) -> bool:
+        """Wait until every queued frame is written; reports failed frames"""
+        if self.renderer is None:
+            return True
+        try:
+            self.renderer.flush()
+            return True
+        except NDScriptError as e:
+            print(f"Error rendering frame: {e}")
+            return False
+
+    def get_render_stats(self):
+        """إحصائيات عارض الإطارات"""
+        if self.renderer is None:
+            return {}
+        return self.renderer.get_performance_stats()
+
+    def get_checkpoint_stats(self):
+        """إحصائيات كاتب نقاط الحفظ"""
+        if self.checkpoint_writer is None:
+            return {}
+        return self.checkpoint_writer.get_performance_stats()
 
     def enable_bytecode(self):
         """تفعيل البايت-كود"""
         self.use_bytecode = True
-        self.fast_executor.set_execution_mode("bytecode")
+        self._execution_mode = "bytecode"
+        if self._fast_executor is not None:
+            self._fast_executor.set_execution_mode("bytecode")
 
     def disable_bytecode(self):
         """تعطيل البايت-كود"""
         self.use_bytecode = False
-        self.fast_executor.set_execution_mode("traditional")
+        self._execution_mode = "traditional"
+        if self._fast_executor is not None:
+            self._fast_executor.set_execution_mode("traditional")
 
     def get_bytecode_stats(self):
         """إحصائيات البايت-كود"""
         return self.fast_executor.get_performance_stats()
 
+    def metric_samples(self):
+        """عدادات هذا المفسر لسجل المقاييس"""
+        samples = self.scope_manager.global_environment.metric_samples()
+        # الأنظمة التي لم تُنشأ بعد ليس لها ما تبلغ عنه
+        if self._fast_executor is not None:
+            samples += self._fast_executor.compiler.metric_samples()
+        if self._parallel_processor is not None:
+            samples += self._parallel_processor.metric_samples()
+        return samples
+
     @profile_operation("visit_parallel_for_statement")
     def visit_parallel_for_statement(self, node: 'ParallelForStatement'):
-        """Execute parallel for loop with concurrent execution"""
+        """Execute parallel for loop with concurrent execution.
+
+        Inside the body ``universe`` is the iteration's own copy of the
+        snapshot published when the loop started, drawing noise from the
+        stream of its iteration index, so reads never race with writers and
+        results do not depend on which thread ran which iteration. The
+        shared universe is left unchanged.
+        """
         try:
             # تقييم تعبيرات النطاق
             start_val = node.start_expr.accept(self) if hasattr(node.start_expr, 'accept') else node.start_expr
@@ -1624,9 +2317,14 @@ class NDScriptInterpreter(ASTVisitor):
             if step_val == 0:
                 raise NDScriptRuntimeError("Parallel for loop step cannot be zero")
 
-            # إنشاء غلاف آمن للكون إذا لم يكن موجوداً
-            if self.universe and not self.thread_safe_universe:
-                self.thread_safe_universe = create_thread_safe_universe(self.universe)
+            # إنشاء غلاف آمن للكون، ونشر لقطة من حالته الحالية للقراء
+            universe = self._universe
+            if universe:
+                if self.thread_safe_universe is None or self.thread_safe_universe.universe is not universe:
+                    from .parallel_processor import create_thread_safe_universe
+                    self.thread_safe_universe = create_thread_safe_universe(universe)
+                else:
+                    self.thread_safe_universe.publish()
 
             # تعريف دالة تنفيذ جسم الحلقة
             def execute_iteration(iteration_value):
@@ -1638,14 +2336,19 @@ class NDScriptInterpreter(ASTVisitor):
                     # حفظ البيئة الحالية
                     original_env = self.environment
                     self.environment = local_env
+                    # الجسم يقرأ ويطور نسخة من اللقطة المنشورة، بتيار ضجيج رقم التكرار
+                    if universe:
+                        self._iteration.stream = (iteration_value - start_val) // step_val
 
-                    # تنفيذ جسم الحلقة
-                    result = None
-                    for stmt in node.body:
-                        result = stmt.accept(self)
-
-                    # استعادة البيئة الأصلية
-                    self.environment = original_env
+                    try:
+                        # تنفيذ جسم الحلقة
+                        result = None
+                        for stmt in node.body:
+                            result = stmt.accept(self)
+                    finally:
+                        # استعادة البيئة الأصلية
+                        self.environment = original_env
+                        self._iteration.stream = None
 
                     return result
 
@@ -1683,4 +2386,23 @@ class NDScriptInterpreter(ASTVisitor):
             start, end, step, test_function, iterations
         )
 
+    def benchmark_domain_decomposition(self, size: int = 1024, steps: int = 20,
+                                       max_workers: Optional[int] = None, iterations: int = 3):
+        """قياس التوسع القوي لتطور الكون من عامل واحد إلى N عامل"""
+        from .domain_decomposition import benchmark_strong_scaling
+        return benchmark_strong_scaling(size, steps, max_workers, iterations)
+
+
+
+
+def _parse_cache_samples():
+    # ذاكرة lru_cache مشتركة بين كل المفسرات، فتُسجَّل مرة واحدة
+    info = NDScriptInterpreter._cached_parse_and_transform.cache_info()
+    return [
+        sample("parse_cache_hits_total", "counter", "Parse and transform cache hits", info.hits),
+        sample("parse_cache_misses_total", "counter", "Parse and transform cache misses", info.misses),
+        sample("parse_cache_entries", "gauge", "Parsed scripts in the cache", info.currsize),
+    ]
+
 
+registry.register_collector(_parse_cache_samples)
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+محلل الأسطر لـ ND-Script
+Line Profiler for ND-Script: hits, total and self time per source line
+
+``LineProfiler`` wraps the statement visitors of one interpreter. Every
+statement with a source span opens a frame for its line. A statement on
+the line that is already open (``if (x): { y = 1 }``) is part of that
+frame. Self time excludes the lines run inside a frame, such as a loop
+body or a called function's body. Total time counts only the outermost
+frame of a line, so recursion is not counted twice. User functions are
+timed the same way.
+
+Simple scripts that the interpreter would run as bytecode go through the
+visitor while profiling, so every line is seen.
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# زوار العبارات: كل ما ينفَّذ كسطر مستقل في النص
+STATEMENT_VISITORS = (
+    "visit_init_command", "visit_evolve_command", "visit_show_command", "visit_set_command",
+    "visit_save_command", "visit_load_command", "visit_record_command", "visit_exit_command",
+    "visit_assignment", "visit_if_statement", "visit_for_loop", "visit_while_loop",
+    "visit_for_statement", "visit_while_statement", "visit_parallel_for_statement",
+    "visit_function_call", "visit_function_def", "visit_macro_def", "visit_import_statement",
+    "visit_namespace_import", "visit_selective_import", "visit_break_statement",
+    "visit_continue_statement", "visit_return_statement", "visit_debug_statement",
+    "visit_profile_block",
+)
+
+# منفذو الدوال: الاسم هو المعامل الأول
+FUNCTION_EXECUTORS = ("_execute_user_function", "_execute_legacy_function", "_execute_macro")
+
+_MISSING = object()
+
+
+def install_hooks(interpreter, wrap_statement: Callable, wrap_function: Callable) -> Dict[str, Any]:
+    """Wrap the interpreter's statement visitors and function executors.
+
+    The wrappers are instance attributes, so only this interpreter is
+    affected. Returns what ``restore_hooks`` needs to undo it.
+    """
+    saved = {}
+    for name in STATEMENT_VISITORS + FUNCTION_EXECUTORS:
+        method = getattr(interpreter, name, None)
+        if method is None:
+            continue
+        saved[name] = interpreter.__dict__.get(name, _MISSING)
+        wrap = wrap_function if name in FUNCTION_EXECUTORS else wrap_statement
+        setattr(interpreter, name, wrap(method))
+    # النصوص البسيطة تمر عبر الزائر لا البايت-كود، فترى الخطافات كل سطر
+    saved["use_bytecode"] = interpreter.__dict__.get("use_bytecode", _MISSING)
+    if saved["use_bytecode"] is not _MISSING:
+        interpreter.use_bytecode = False
+    return saved
+
+
+def restore_hooks(interpreter, saved: Dict[str, Any]):
+    """Undo ``install_hooks``; nested installs must be undone in reverse order"""
+    for name, previous in saved.items():
+        if previous is _MISSING:
+            interpreter.__dict__.pop(name, None)
+        else:
+            setattr(interpreter, name, previous)
+
+
+class _Timings:
+    """Open frames and ``key -> [hits, total_ns, self_ns]`` of one thread"""
+
+    __slots__ = ("stack", "active", "stats")
+
+    def __init__(self):
+        # [key, start_ns, children_ns] لكل إطار مفتوح
+        self.stack: List[list] = []
+        self.active: Dict[Any, int] = {}
+        self.stats: Dict[Any, List[int]] = {}
+
+    def enter(self, key):
+        self.active[key] = self.active.get(key, 0) + 1
+        self.stack.append([key, time.perf_counter_ns(), 0])
+
+    def exit(self):
+        end_ns = time.perf_counter_ns()
+        key, start_ns, children_ns = self.stack.pop()
+        elapsed = end_ns - start_ns
+        stats = self.stats.get(key)
+        if stats is None:
+            stats = self.stats[key] = [0, 0, 0]
+        stats[0] += 1
+        stats[2] += elapsed - children_ns
+        depth = self.active[key] - 1
+        self.active[key] = depth
+        if not depth:
+            stats[1] += elapsed
+        if self.stack:
+            self.stack[-1][2] += elapsed
+
+
+def _to_dict(stats: List[int]) -> Dict[str, Any]:
+    hits, total_ns, self_ns = stats
+    return {"hits": hits, "total_ms": total_ns / 1e6, "self_ms": self_ns / 1e6}
+
+
+def _merge(target: Dict[Any, List[int]], source: Dict[Any, List[int]]):
+    for key, stats in list(source.items()):
+        merged = target.setdefault(key, [0, 0, 0])
+        for index in range(3):
+            merged[index] += stats[index]
+
+
+class LineProfiler:
+    """Per-line and per-function timing of one interpreter.
+
+    ``start``/``stop`` may be nested (a ``profile:`` block inside
+    ``nds --profile``) as long as they are stopped in reverse order.
+    """
+
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+        self.running = False
+        self._local = threading.local()
+        self._threads: List[Tuple[_Timings, _Timings]] = []
+        self._lock = threading.Lock()
+        self._saved: Dict[str, Any] = {}
+
+    def _timings(self) -> Tuple[_Timings, _Timings]:
+        timings = getattr(self._local, "timings", None)
+        if timings is None:
+            timings = self._local.timings = (_Timings(), _Timings())
+            with self._lock:
+                self._threads.append(timings)
+        return timings
+
+    def _wrap_statement(self, visit: Callable) -> Callable:
+        def profiled(node):
+            span = getattr(node, "span", None)
+            if span is None:
+                return visit(node)
+            lines = self._timings()[0]
+            key = (span.source, span.line)
+            if lines.stack and lines.stack[-1][0] == key:
+                return visit(node)
+            lines.enter(key)
+            try:
+                return visit(node)
+            finally:
+                lines.exit()
+        return profiled
+
+    def _wrap_function(self, execute: Callable) -> Callable:
+        def profiled(name, *args, **kwargs):
+            functions = self._timings()[1]
+            functions.enter(name)
+            try:
+                return execute(name, *args, **kwargs)
+            finally:
+                functions.exit()
+        return profiled
+
+    def start(self):
+        """Install the timers on the interpreter"""
+        if self.running:
+            return
+        self._saved = install_hooks(self.interpreter, self._wrap_statement, self._wrap_function)
+        self.running = True
+
+    def stop(self):
+        """Restore the interpreter's own methods; statistics are kept"""
+        if not self.running:
+            return
+        restore_hooks(self.interpreter, self._saved)
+        self._saved = {}
+        self.running = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.stop()
+
+    def _collect(self) -> Tuple[Dict[Any, List[int]], Dict[Any, List[int]]]:
+        lines, functions = {}, {}
+        with self._lock:
+            threads = list(self._threads)
+        for thread_lines, thread_functions in threads:
+            _merge(lines, thread_lines.stats)
+            _merge(functions, thread_functions.stats)
+        return lines, functions
+
+    def get_line_stats(self) -> Dict[Tuple[Optional[str], int], Dict[str, Any]]:
+        """``(source, line) -> {hits, total_ms, self_ms}``; source None is the main script"""
+        return {key: _to_dict(stats) for key, stats in sorted(self._collect()[0].items(), key=_line_order)}
+
+    def get_function_stats(self) -> Dict[str, Dict[str, Any]]:
+        """``name -> {hits, total_ms, self_ms}`` for user functions and macros"""
+        functions = self._collect()[1]
+        return {name: _to_dict(stats)
+                for name, stats in sorted(functions.items(), key=lambda item: item[1][2], reverse=True)}
+
+    def hottest(self, count: int = 5) -> List[Tuple[Tuple[Optional[str], int], Dict[str, Any]]]:
+        """The ``count`` lines with the most self time"""
+        lines = sorted(self._collect()[0].items(), key=lambda item: item[1][2], reverse=True)
+        return [(key, _to_dict(stats)) for key, stats in lines[:count]]
+
+    def format_listing(self, source: str, filename: Optional[str] = None) -> str:
+        """The script annotated with hits and times, then other sources and functions"""
+        lines, functions = self._collect()
+        total_self = sum(stats[2] for stats in lines.values()) or 1
+        header = f"{'Line':>6} {'Hits':>9} {'Total ms':>11} {'Self ms':>11} {'Self %':>7}  Source"
+        output = []
+
+        def listing(title: str, text: str, name: Optional[str]):
+            output.append(f"Line profile: {title}")
+            output.append(header)
+            output.append("=" * len(header))
+            for number, line in enumerate(text.splitlines(), 1):
+                stats = lines.get((name, number))
+                if stats is None:
+                    output.append(f"{number:>6} {'':>9} {'':>11} {'':>11} {'':>7}  {line}")
+                else:
+                    hits, total_ns, self_ns = stats
+                    output.append(f"{number:>6} {hits:>9} {total_ns / 1e6:>11.3f} {self_ns / 1e6:>11.3f} "
+                                  f"{100.0 * self_ns / total_self:>6.1f}%  {line}")
+            output.append("")
+
+        listing(filename or "<script>", source, None)
+        for name in sorted({key[0] for key in lines if key[0] is not None}):
+            try:
+                with open(name, "r", encoding="utf-8") as f:
+                    listing(name, f.read(), name)
+            except OSError:
+                continue
+
+        if functions:
+            output.append(f"{'Function':<24} {'Calls':>9} {'Total ms':>11} {'Self ms':>11}")
+            for name, stats in sorted(functions.items(), key=lambda item: item[1][2], reverse=True):
+                hits, total_ns, self_ns = stats
+                output.append(f"{name:<24} {hits:>9} {total_ns / 1e6:>11.3f} {self_ns / 1e6:>11.3f}")
+            output.append("")
+        return "\n".join(output)
+
+    def reset(self):
+        with self._lock:
+            for thread_lines, thread_functions in self._threads:
+                thread_lines.stats.clear()
+                thread_functions.stats.clear()
+
+    def get_performance_stats(self) -> Dict[str, Any]:
+        """إحصائيات الأسطر والدوال"""
+        return {
+            "lines": {f"{source or '<script>'}:{line}": stats
+                      for (source, line), stats in self.get_line_stats().items()},
+            "functions": self.get_function_stats(),
+        }
+
+
+def _line_order(item) -> Tuple[str, int]:
+    (source, line), _ = item
+    return (source or "", line)
+
+
+def create_line_profiler(interpreter) -> LineProfiler:
+    """إنشاء محلل أسطر لمفسر"""
+    return LineProfiler(interpreter)
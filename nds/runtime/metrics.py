@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+سجل المقاييس لـ ND-Script
+Metrics Registry for ND-Script: counters, gauges and latency histograms
+
+One process-wide ``registry`` holds two kinds of metrics:
+
+* metrics it owns (``counter``, ``gauge``, ``histogram``), updated under a
+  per-metric lock, so concurrent sessions never lose an increment;
+* collectors: callbacks that subsystems register to report the counters
+  they already keep (AST cache, bytecode compiler, environment cache,
+  parallel processor). Collectors run only when the registry is read, so
+  hot paths pay nothing. Bound methods are held weakly, and a collector
+  is unregistered as soon as its object is collected.
+
+Subsystems count with ``AtomicCounter`` where the counter sits on a hot
+path (variable lookups) and under a lock elsewhere, so threads of a
+parallel-for loop never lose an increment.
+
+Samples with the same name and labels from several collectors (two
+interpreters, say) are summed. The registry is exported as OpenMetrics
+text or JSON, to a file or from a local HTTP endpoint.
+"""
+
+import itertools
+import json
+import math
+import os
+import threading
+import weakref
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+OPENMETRICS_CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+# حدود مدرجات زمن الاستجابة بالثواني
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Sample(NamedTuple):
+    """One value reported by a collector; ``kind`` is ``counter`` or ``gauge``"""
+    name: str
+    kind: str
+    help: str
+    value: float
+    labels: Tuple[Tuple[str, str], ...] = ()
+
+
+def sample(name: str, kind: str, help: str, value: float, **labels) -> Sample:
+    return Sample(name, kind, help, float(value), tuple(sorted((key, str(label)) for key, label in labels.items())))
+
+
+def _family_name(name: str, kind: str) -> str:
+    # عائلة العداد بلا _total؛ اللاحقة تضاف عند التصدير
+    return name[:-len("_total")] if kind == "counter" and name.endswith("_total") else name
+
+
+def _label_key(labels: Dict[str, Any]) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+class Counter:
+    """Monotonic counter, optionally per label set"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str = ""):
+        self.name = _family_name(name, self.kind)
+        self.help = help
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        if amount < 0:
+            raise ValueError("Counters only increase")
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(labels), 0.0)
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            return [Sample(self.name, self.kind, self.help, value, key) for key, value in self._values.items()]
+
+
+class Gauge(Counter):
+    """Value that goes up and down"""
+
+    kind = "gauge"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[_label_key(labels)] = float(value)
+
+
+class Histogram:
+    """Cumulative latency histogram with fixed bucket bounds"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str = "", buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        # label key -> [counts per bucket (+Inf last), sum]
+        self._values: Dict[Tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        index = len(self.buckets)
+        for position, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = position
+                break
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    def snapshot(self) -> Dict[Tuple, Tuple[List[int], float]]:
+        """Cumulative bucket counts and sum per label set"""
+        with self._lock:
+            values = {key: (list(counts), total) for key, (counts, total) in self._values.items()}
+        result = {}
+        for key, (counts, total) in values.items():
+            cumulative, running = [], 0
+            for count in counts:
+                running += count
+                cumulative.append(running)
+            result[key] = (cumulative, total)
+        return result
+
+
+class AtomicCounter:
+    """Integer counter shared between threads.
+
+    ``increment`` is ``next`` on an ``itertools.count``, a single C call
+    that is atomic under the GIL and costs about as much as ``+= 1``.
+    ``value`` reads the count without advancing it, and ``reset`` swaps in
+    a fresh count, so every scope holding this counter sees the reset.
+    """
+
+    __slots__ = ("_count",)
+
+    def __init__(self, value: int = 0):
+        self._count = itertools.count(value)
+
+    def increment(self):
+        next(self._count)
+
+    def reset(self):
+        self._count = itertools.count()
+
+    @property
+    def value(self) -> int:
+        # repr هو count(N): قراءة بلا استهلاك رقم
+        return int(repr(self._count)[6:-1])
+
+    def __copy__(self) -> 'AtomicCounter':
+        return AtomicCounter(self.value)
+
+    def __deepcopy__(self, memo) -> 'AtomicCounter':
+        return AtomicCounter(self.value)
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if math.isnan(value):
+        return "NaN"
+    return repr(int(value)) if float(value).is_integer() and abs(value) < 1e15 else repr(float(value))
+
+
+def _format_labels(labels: Iterable[Tuple[str, str]]) -> str:
+    labels = list(labels)
+    if not labels:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + "}"
+
+
+class MetricsRegistry:
+    """Owned metrics plus collectors, exported as OpenMetrics or JSON"""
+
+    def __init__(self, prefix: str = "nds"):
+        self.prefix = prefix
+        self._metrics: Dict[str, Any] = {}
+        self._collectors: List[Callable[[], Optional[Callable]]] = []
+        # قابل لإعادة الدخول: استدعاء إزالة المجمع قد يقع والقفل محجوز
+        self._lock = threading.RLock()
+        self._server = None
+
+    def _metric(self, cls, name: str, help: str, **kwargs):
+        name = _family_name(f"{self.prefix}_{name}", cls.kind)
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} is already a {metric.kind}")
+            return metric
+
+    def counter(self, name: str, help: str = "") -> Counter:
+        """The counter ``<prefix>_<name>``, created on first use"""
+        return self._metric(Counter, name, help)
+
+    def gauge(self, name: str, help: str = "") -> Gauge:
+        return self._metric(Gauge, name, help)
+
+    def histogram(self, name: str, help: str = "", buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._metric(Histogram, name, help, buckets=buckets)
+
+    def register_collector(self, collector: Callable[[], Iterable[Sample]]):
+        """Call ``collector`` on every read; bound methods are held weakly
+        and removed when their object is collected"""
+        if hasattr(collector, "__self__"):
+            reference = weakref.WeakMethod(collector, self._discard_collector)
+        else:
+            reference = lambda: collector
+        with self._lock:
+            self._collectors.append(reference)
+
+    def _discard_collector(self, reference):
+        with self._lock:
+            try:
+                self._collectors.remove(reference)
+            except ValueError:
+                pass
+
+    def collect(self) -> Dict[str, Dict[str, Any]]:
+        """Every metric family: ``name -> {kind, help, samples}``"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+        families: Dict[str, Dict[str, Any]] = {}
+
+        def add(item: Sample):
+            name = _family_name(item.name, item.kind)
+            family = families.setdefault(name, {"kind": item.kind, "help": item.help, "samples": {}})
+            family["samples"][item.labels] = family["samples"].get(item.labels, 0.0) + item.value
+
+        for reference in collectors:
+            collector = reference()
+            if collector is None:
+                continue
+            for item in collector():
+                add(item._replace(name=f"{self.prefix}_{item.name}"))
+        for metric in metrics:
+            if isinstance(metric, Histogram):
+                families[metric.name] = {"kind": "histogram", "help": metric.help, "buckets": metric.buckets,
+                                         "samples": metric.snapshot()}
+            else:
+                for item in metric.samples():
+                    add(item)
+        return families
+
+    def to_openmetrics(self) -> str:
+        """OpenMetrics text exposition, ending with ``# EOF``"""
+        lines = []
+        for name, family in sorted(self.collect().items()):
+            kind = family["kind"]
+            lines.append(f"# TYPE {name} {kind}")
+            if family["help"]:
+                lines.append(f"# HELP {name} {family['help']}")
+            if kind == "histogram":
+                bounds = [_format_value(bound) for bound in family["buckets"]] + ["+Inf"]
+                for labels, (cumulative, total) in sorted(family["samples"].items()):
+                    for bound, count in zip(bounds, cumulative):
+                        lines.append(f"{name}_bucket{_format_labels(labels + (('le', bound),))} {count}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {cumulative[-1]}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(total)}")
+            else:
+                suffix = "_total" if kind == "counter" else ""
+                for labels, value in sorted(family["samples"].items()):
+                    lines.append(f"{name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def to_json(self) -> Dict[str, Any]:
+        """The same families as plain data"""
+        result = {}
+        for name, family in sorted(self.collect().items()):
+            entry = {"type": family["kind"], "help": family["help"]}
+            if family["kind"] == "histogram":
+                entry["buckets"] = list(family["buckets"])
+                entry["samples"] = [{"labels": dict(labels), "cumulative": cumulative, "sum": total,
+                                     "count": cumulative[-1]}
+                                    for labels, (cumulative, total) in family["samples"].items()]
+            else:
+                entry["samples"] = [{"labels": dict(labels), "value": value}
+                                    for labels, value in family["samples"].items()]
+            result[name] = entry
+        return result
+
+    def write(self, path: str, format: Optional[str] = None):
+        """Write to ``path`` atomically; JSON for ``.json`` files, else OpenMetrics"""
+        format = format or ("json" if path.endswith(".json") else "openmetrics")
+        text = json.dumps(self.to_json(), indent=2) if format == "json" else self.to_openmetrics()
+        temporary = f"{path}.tmp{os.getpid()}"
+        with open(temporary, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(temporary, path)
+
+    def serve(self, port: int = 9464, host: str = "127.0.0.1"):
+        """Serve ``/metrics`` (OpenMetrics) and ``/metrics.json`` from a daemon thread"""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        if self._server is not None:
+            return self._server
+        registry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] == "/metrics.json":
+                    body, content_type = json.dumps(registry.to_json()).encode("utf-8"), "application/json"
+                elif self.path.split("?")[0] in ("/", "/metrics"):
+                    body, content_type = registry.to_openmetrics().encode("utf-8"), OPENMETRICS_CONTENT_TYPE
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), MetricsHandler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="nds-metrics", daemon=True).start()
+        return self._server
+
+    def stop_serving(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+registry = MetricsRegistry()
+
+
+def create_metrics_registry(prefix: str = "nds") -> MetricsRegistry:
+    """إنشاء سجل مقاييس مستقل"""
+    return MetricsRegistry(prefix)
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+المراقبون أثناء التطور لـ ND-Script
+Streaming Observers for QuantumFractalUniverse.evolve
+
+Observers are attached with ``universe.add_observer(observer)`` and called
+with ``(step, fields)`` after every ``observer.every``-th step. Each one
+reduces the fields on the spot and keeps only fixed-size results, so
+statistics over a whole run never need the frames themselves.
+"""
+
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+
+class RingBuffer:
+    """Fixed-capacity buffer of equally shaped rows; the oldest rows are overwritten"""
+
+    def __init__(self, capacity: int, shape: Tuple[int, ...] = (), dtype=np.float64):
+        self.capacity = int(capacity)
+        self._data = np.zeros((self.capacity,) + tuple(shape), dtype=dtype)
+        self._next = 0
+        self.total = 0
+
+    def append(self, row):
+        self._data[self._next] = row
+        self._next = (self._next + 1) % self.capacity
+        self.total += 1
+
+    def __len__(self) -> int:
+        return min(self.total, self.capacity)
+
+    def values(self) -> np.ndarray:
+        """Stored rows, oldest first"""
+        if self.total < self.capacity:
+            return self._data[:self.total].copy()
+        return np.concatenate([self._data[self._next:], self._data[:self._next]])
+
+    def last(self) -> Optional[np.ndarray]:
+        """Most recent row"""
+        if not self.total:
+            return None
+        return self._data[(self._next - 1) % self.capacity].copy()
+
+    def clear(self):
+        self._next = 0
+        self.total = 0
+
+
+class Observer(ABC):
+    """Base class: called with ``(step, fields)`` every ``every`` steps"""
+
+    def __init__(self, field: str = "density", every: int = 1, capacity: int = 1024):
+        self.field = field
+        self.every = max(1, int(every))
+        self.capacity = capacity
+        self.steps = RingBuffer(capacity, dtype=np.int64)
+
+    def __call__(self, step: int, fields: Dict[str, np.ndarray]):
+        data = fields.get(self.field)
+        if data is None:
+            return
+        self.steps.append(step)
+        self.observe(step, data)
+
+    @abstractmethod
+    def observe(self, step: int, data: np.ndarray):
+        """Reduce one frame of the observed field"""
+        pass
+
+    @abstractmethod
+    def results(self) -> Dict[str, Any]:
+        """Results accumulated so far"""
+        pass
+
+    def reset(self):
+        self.steps.clear()
+
+
+class RunningStatistics(Observer):
+    """Welford mean/variance of every cell over time, plus a spatial summary per step"""
+
+    def __init__(self, field: str = "density", every: int = 1, capacity: int = 1024):
+        super().__init__(field, every, capacity)
+        # mean, variance, min, max of the field at each observation
+        self.series = RingBuffer(capacity, (4,))
+        self.count = 0
+        self.mean: Optional[np.ndarray] = None
+        self._m2: Optional[np.ndarray] = None
+        self._delta: Optional[np.ndarray] = None
+
+    def observe(self, step: int, data: np.ndarray):
+        if self.mean is None or self.mean.shape != data.shape:
+            self.count = 0
+            self.mean = np.zeros(data.shape)
+            self._m2 = np.zeros(data.shape)
+            self._delta = np.empty(data.shape)
+
+        # Welford, in place: delta = x - mean; mean += delta/n; M2 += delta*(x - mean)
+        self.count += 1
+        delta = self._delta
+        np.subtract(data, self.mean, out=delta)
+        self.mean += delta / self.count
+        delta *= data - self.mean
+        self._m2 += delta
+
+        spatial_mean = float(data.mean())
+        self.series.append((spatial_mean, float(data.var()), float(data.min()), float(data.max())))
+
+    @property
+    def variance(self) -> Optional[np.ndarray]:
+        """Per-cell variance over the observed steps"""
+        if self._m2 is None or self.count < 2:
+            return None
+        return self._m2 / (self.count - 1)
+
+    def results(self) -> Dict[str, Any]:
+        series = self.series.values()
+        variance = self.variance
+        return {
+            "observations": self.count,
+            "steps": self.steps.values(),
+            "mean": series[:, 0],
+            "variance": series[:, 1],
+            "min": series[:, 2],
+            "max": series[:, 3],
+            "temporal_mean": self.mean,
+            "temporal_variance": variance,
+            "mean_temporal_std": float(np.sqrt(variance).mean()) if variance is not None else 0.0,
+        }
+
+    def reset(self):
+        super().reset()
+        self.series.clear()
+        self.count = 0
+        self.mean = self._m2 = self._delta = None
+
+
+class HistogramObserver(Observer):
+    """Fixed-bin histogram of the field at each observation"""
+
+    def __init__(self, field: str = "density", every: int = 1, capacity: int = 1024,
+                 bins: int = 64, value_range: Tuple[float, float] = (0.0, 2.0)):
+        super().__init__(field, every, capacity)
+        self.bins = int(bins)
+        self.edges = np.linspace(value_range[0], value_range[1], self.bins + 1)
+        self.histograms = RingBuffer(capacity, (self.bins,), dtype=np.int64)
+        self.cumulative = np.zeros(self.bins, dtype=np.int64)
+        self._scale = self.bins / (value_range[1] - value_range[0])
+        self._low = value_range[0]
+
+    def observe(self, step: int, data: np.ndarray):
+        # Fixed bins: one multiply and a bincount instead of a search per value
+        index = ((data - self._low) * self._scale).astype(np.int64).ravel()
+        np.clip(index, 0, self.bins - 1, out=index)
+        counts = np.bincount(index, minlength=self.bins)
+        self.histograms.append(counts)
+        self.cumulative += counts
+
+    def results(self) -> Dict[str, Any]:
+        return {
+            "observations": self.histograms.total,
+            "steps": self.steps.values(),
+            "edges": self.edges,
+            "histograms": self.histograms.values(),
+            "cumulative": self.cumulative.copy(),
+        }
+
+    def reset(self):
+        super().reset()
+        self.histograms.clear()
+        self.cumulative[:] = 0
+
+
+class PowerSpectrumObserver(Observer):
+    """Radially averaged power spectrum of the field"""
+
+    def __init__(self, field: str = "density", every: int = 10, capacity: int = 256):
+        super().__init__(field, every, capacity)
+        self.spectra: Optional[RingBuffer] = None
+        self._shape = None
+        self._radius = None
+        self._counts = None
+
+    def _prepare(self, shape: Tuple[int, int]):
+        rows, cols = shape
+        ky = np.fft.fftfreq(rows) * rows
+        kx = np.fft.rfftfreq(cols) * cols
+        radius = np.rint(np.sqrt(ky[:, None] ** 2 + kx[None, :] ** 2)).astype(np.int64)
+        self._radius = radius.ravel()
+        nbins = min(rows, cols) // 2 + 1
+        np.minimum(self._radius, nbins - 1, out=self._radius)
+        self._counts = np.maximum(np.bincount(self._radius, minlength=nbins), 1)
+        self.spectra = RingBuffer(self.capacity, (nbins,))
+        self._shape = shape
+
+    def observe(self, step: int, data: np.ndarray):
+        if self._shape != data.shape:
+            self._prepare(data.shape)
+        transform = np.fft.rfft2(data - data.mean())
+        power = (transform.real ** 2 + transform.imag ** 2).ravel()
+        spectrum = np.bincount(self._radius, weights=power, minlength=len(self._counts)) / self._counts
+        self.spectra.append(spectrum)
+
+    def results(self) -> Dict[str, Any]:
+        spectra = self.spectra.values() if self.spectra is not None else np.empty((0, 0))
+        return {
+            "observations": self.spectra.total if self.spectra is not None else 0,
+            "steps": self.steps.values(),
+            "wavenumbers": np.arange(spectra.shape[1]) if spectra.size else np.empty(0),
+            "spectra": spectra,
+        }
+
+    def reset(self):
+        super().reset()
+        if self.spectra is not None:
+            self.spectra.clear()
+
+
+def read_only_views(fields: Dict[str, np.ndarray], downsample: int = 1) -> Dict[str, np.ndarray]:
+    """Read-only views of ``fields``, decimated by striding (never copied)"""
+    views = {}
+    for name, array in fields.items():
+        if downsample > 1 and array.ndim >= 2:
+            view = array[::downsample, ::downsample]
+        else:
+            view = array.view()
+        view.flags.writeable = False
+        views[name] = view
+    return views
+
+
+class StepSubscription:
+    """Callback registered with ``on_step``; receives ``(step, views)``.
+
+    The views alias the live fields: they are only valid during the call,
+    so callbacks that keep data must copy it.
+    """
+
+    def __init__(self, callback, every: int = 1, downsample: int = 1):
+        self.callback = callback
+        self.every = max(1, int(every))
+        self.downsample = max(1, int(downsample))
+        self.active = True
+        self.calls = 0
+
+    def __call__(self, step: int, fields: Dict[str, np.ndarray]):
+        if not self.active:
+            return
+        self.calls += 1
+        self.callback(step, read_only_views(fields, self.downsample))
+
+    def cancel(self):
+        """Stop receiving steps"""
+        self.active = False
+
+
+def create_standard_observers(every: int = 1, capacity: int = 1024) -> Dict[str, Observer]:
+    """Running statistics and histogram every ``every`` steps, spectra 10x less often"""
+    return {
+        "statistics": RunningStatistics(every=every, capacity=capacity),
+        "histogram": HistogramObserver(every=every, capacity=capacity),
+        "spectrum": PowerSpectrumObserver(every=every * 10, capacity=max(1, capacity // 4)),
+    }
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+محسّن شجرة البنية لـ ND-Script: دمج أوامر التطور
+AST Optimizer for ND-Script: evolve fusion
+
+Scripts step the universe one ``evolve`` at a time and only look at it
+every N-th iteration::
+
+    for i in (0, 1000):
+        evolve 1
+        if i % 100 == 0:
+            save "run.nds"
+
+Each ``evolve`` is a separate interpreter dispatch and universe call. This
+pass merges runs of literal ``evolve`` commands into one, and marks loops
+whose body is only ``evolve`` commands and ``if`` blocks with pure
+conditions. The interpreter runs such loops as a few large
+``universe.evolve(n)`` calls, split only at the iterations where an ``if``
+fires.
+"""
+
+import dataclasses
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from .ast import (
+    Assignment, BinaryOperation, Comment, ComparisonExpression, EvolveCommand,
+    ForStatement, FunctionCall, Identifier, IfStatement, ImportStatement,
+    NamespaceImport, Number, Program, SelectiveImport, String, UnaryOperation,
+)
+
+# العمليات الحسابية التي لا تملك آثاراً جانبية
+PURE_OPERATORS = {'+', '-', '*', '/', '%', '==', '!=', '<', '>', '<=', '>='}
+
+
+@dataclass
+class FusedLoop:
+    """Fusion plan attached to a ForStatement as ``node.fusion``.
+
+    ``items`` follows the loop body: ``("evolve", EvolveCommand, None)``,
+    ``("periodic", IfStatement, modulus)`` for conditions that only depend
+    on ``variable % modulus``, or ``("pure", IfStatement, None)`` for other
+    conditions that are evaluated every iteration.
+    """
+    items: List[Tuple[str, Any, Any]]
+
+
+def _walk(node) -> Iterator[Any]:
+    """All AST nodes under ``node``, including ``node``"""
+    if isinstance(node, (list, tuple)):
+        for child in node:
+            yield from _walk(child)
+    elif dataclasses.is_dataclass(node) and not isinstance(node, type):
+        yield node
+        for field in dataclasses.fields(node):
+            yield from _walk(getattr(node, field.name))
+
+
+def _assigned_names(statements) -> Set[str]:
+    names = set()
+    for node in _walk(statements):
+        if isinstance(node, Assignment):
+            names.add(node.identifier)
+        elif hasattr(node, 'variable') and isinstance(node.variable, str):
+            names.add(node.variable)
+    return names
+
+
+def _has_calls(statements) -> bool:
+    """Function calls and imports may rebind any global"""
+    return any(isinstance(node, (FunctionCall, ImportStatement, NamespaceImport, SelectiveImport))
+               for node in _walk(statements))
+
+
+def _is_pure(expr) -> bool:
+    if isinstance(expr, (Number, String, Identifier)):
+        return True
+    if isinstance(expr, UnaryOperation):
+        return _is_pure(expr.operand)
+    if isinstance(expr, (BinaryOperation, ComparisonExpression)):
+        return expr.operator in PURE_OPERATORS and _is_pure(expr.left) and _is_pure(expr.right)
+    return False
+
+
+class EvolveFusionPass:
+    """Merges consecutive ``evolve`` commands and plans fused loops"""
+
+    def __init__(self):
+        self.stats = {
+            "evolves_merged": 0,
+            "loops_planned": 0,
+            "fused_loops": 0,
+            "fused_iterations": 0,
+            "evolve_calls": 0,
+        }
+
+    def run(self, program):
+        """Optimize ``program`` in place and return it"""
+        if isinstance(program, Program):
+            program.statements = self._optimize_block(program.statements)
+        return program
+
+    def _optimize_block(self, statements):
+        if not isinstance(statements, list):
+            return statements
+
+        optimized = []
+        for stmt in statements:
+            self._optimize_children(stmt)
+
+            steps = self._literal_steps(stmt)
+            previous = self._literal_steps(optimized[-1]) if optimized else None
+            if steps is not None and previous is not None:
+                merged = EvolveCommand(steps=Number(previous + steps))
+                merged.span = optimized[-1].span
+                optimized[-1] = merged
+                self.stats["evolves_merged"] += 1
+                continue
+
+            if isinstance(stmt, ForStatement):
+                stmt.fusion = self._plan_loop(stmt)
+                if stmt.fusion is not None:
+                    self.stats["loops_planned"] += 1
+            optimized.append(stmt)
+        return optimized
+
+    def _optimize_children(self, stmt):
+        for name in ('then_block', 'else_block', 'body'):
+            block = getattr(stmt, name, None)
+            if isinstance(block, list):
+                setattr(stmt, name, self._optimize_block(block))
+        if isinstance(stmt, IfStatement) and stmt.elif_blocks:
+            stmt.elif_blocks = [(condition, self._optimize_block(block))
+                                for condition, block in stmt.elif_blocks]
+
+    @staticmethod
+    def _literal_steps(stmt) -> Optional[int]:
+        """Integral step count of an ``evolve`` without expressions"""
+        if type(stmt) is not EvolveCommand or stmt.speed is not None or stmt.time is not None:
+            return None
+        if stmt.steps is None:
+            return 1
+        if isinstance(stmt.steps, Number) and float(stmt.steps.value).is_integer() and stmt.steps.value > 0:
+            return int(stmt.steps.value)
+        return None
+
+    def _plan_loop(self, node: ForStatement) -> Optional[FusedLoop]:
+        assigned = _assigned_names(node.body) | {node.variable}
+        calls = _has_calls(node.body)
+
+        def invariant(expr) -> bool:
+            if isinstance(expr, (Number, String)):
+                return True
+            if isinstance(expr, Identifier):
+                return not calls and expr.name not in assigned
+            if isinstance(expr, UnaryOperation):
+                return invariant(expr.operand)
+            if isinstance(expr, BinaryOperation):
+                return expr.operator in PURE_OPERATORS and invariant(expr.left) and invariant(expr.right)
+            return False
+
+        items = []
+        for stmt in node.body:
+            if stmt is None or isinstance(stmt, Comment):
+                continue
+            if type(stmt) is EvolveCommand:
+                if stmt.speed is not None or stmt.time is not None:
+                    return None
+                if stmt.steps is not None and not invariant(stmt.steps):
+                    return None
+                items.append(("evolve", stmt, None))
+            elif isinstance(stmt, IfStatement) and not stmt.elif_blocks and not stmt.else_block:
+                kind, modulus = self._condition_kind(stmt.condition, node.variable, invariant)
+                if kind is None:
+                    return None
+                items.append((kind, stmt, modulus))
+            else:
+                return None
+
+        if not any(kind == "evolve" for kind, _, _ in items):
+            return None
+        return FusedLoop(items)
+
+    @staticmethod
+    def _condition_kind(condition, variable: str, invariant) -> Tuple[Optional[str], Any]:
+        # i % K <op> C يتكرر بدورة K / gcd(step, K)
+        if isinstance(condition, (ComparisonExpression, BinaryOperation)) and condition.operator in PURE_OPERATORS:
+            for side, other in ((condition.left, condition.right), (condition.right, condition.left)):
+                if (isinstance(side, BinaryOperation) and side.operator == '%'
+                        and isinstance(side.left, Identifier) and side.left.name == variable
+                        and invariant(side.right) and invariant(other)):
+                    return "periodic", side.right
+        if _is_pure(condition):
+            return "pure", None
+        return None, None
+
+    def get_performance_stats(self) -> Dict[str, Any]:
+        """إحصائيات الدمج"""
+        return dict(self.stats)
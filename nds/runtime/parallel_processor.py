@@ -5,12 +5,15 @@ Parallel Processing Engine for ND-Script
 """
 
 import concurrent.futures
+import copy
 import threading
 import multiprocessing
 import time
 from typing import List, Any, Callable, Dict, Optional
 from dataclasses import dataclass
 
+from .metrics import Sample, sample
+
 @dataclass
 class ParallelConfig:
     """إعدادات المعالجة المتوازية"""
@@ -32,6 +35,7 @@ class ParallelProcessor:
             "threads_used": 0,
             "processes_used": 0
         }
+        self._stats_lock = threading.Lock()
         
         # تحديد عدد العمال الافتراضي
         if self.config.max_workers is None:
@@ -64,17 +68,20 @@ class ParallelProcessor:
 
             if self.config.use_threads:
                 results = self._execute_with_threads(values, body_func)
-                self.stats["threads_used"] += self.config.max_workers
+                with self._stats_lock:
+                    self.stats["threads_used"] += self.config.max_workers
             else:
                 results = self._execute_with_processes(values, body_func)
-                self.stats["processes_used"] += self.config.max_workers
+                with self._stats_lock:
+                    self.stats["processes_used"] += self.config.max_workers
 
             # استعادة الإعدادات الأصلية
             self.config = original_config
 
             end_time = time.perf_counter()
-            self.stats["parallel_executions"] += 1
-            self.stats["total_time_parallel"] += (end_time - start_time)
+            with self._stats_lock:
+                self.stats["parallel_executions"] += 1
+                self.stats["total_time_parallel"] += (end_time - start_time)
 
             return results
 
@@ -142,8 +149,9 @@ class ParallelProcessor:
                 results.append(None)
         
         end_time = time.perf_counter()
-        self.stats["sequential_executions"] += 1
-        self.stats["total_time_sequential"] += (end_time - start_time)
+        with self._stats_lock:
+            self.stats["sequential_executions"] += 1
+            self.stats["total_time_sequential"] += (end_time - start_time)
         
         return results
     
@@ -219,6 +227,23 @@ class ParallelProcessor:
             }
         }
     
+    def metric_samples(self) -> List[Sample]:
+        """عدادات التنفيذ لسجل المقاييس"""
+        with self._stats_lock:
+            stats = dict(self.stats)
+        executions = "Parallel-for loops by how they ran"
+        seconds = "Time spent in parallel-for loops"
+        return [
+            sample("parallel_for_executions_total", "counter", executions, stats["parallel_executions"],
+                   mode="parallel"),
+            sample("parallel_for_executions_total", "counter", executions, stats["sequential_executions"],
+                   mode="sequential"),
+            sample("parallel_for_seconds_total", "counter", seconds, stats["total_time_parallel"], mode="parallel"),
+            sample("parallel_for_seconds_total", "counter", seconds, stats["total_time_sequential"], mode="sequential"),
+            sample("parallel_workers_total", "counter", "Workers started by parallel-for loops",
+                   stats["threads_used"] + stats["processes_used"]),
+        ]
+
     def optimize_config_for_workload(self, workload_size: int, complexity: str = "medium") -> ParallelConfig:
         """تحسين الإعدادات حسب حجم العمل"""
         
@@ -330,43 +355,115 @@ class ParallelProcessor:
             return "minimal"
 
 class ThreadSafeUniverseWrapper:
-    """غلاف آمن للخيوط للكون الكمي"""
+    """غلاف آمن للخيوط للكون الكمي
+
+    Writers (``safe_evolve``, ``safe_set_parameter``) are serialized by a
+    lock and publish an immutable snapshot after each change. Readers take
+    the latest published snapshot without locking: a reference assignment
+    is atomic, and a snapshot never changes once published. Universes
+    without ``snapshot()`` fall back to reading under the lock.
+    """
     
     def __init__(self, universe):
         self.universe = universe
         self._lock = threading.RLock()
         self._local_data = threading.local()
+        self._snapshot = None
+        self._published = 0
+        self._publish_locked()
+    
+    def publish(self):
+        """نشر لقطة جديدة؛ تستدعى أيضاً بعد تعديل الكون مباشرة"""
+        with self._lock:
+            self._publish_locked()
+    
+    def _publish_locked(self):
+        self._published += 1
+        if hasattr(self.universe, 'snapshot') and getattr(self.universe, 'density', None) is not None:
+            self._snapshot = self.universe.snapshot()
+        else:
+            self._snapshot = None
     
     def safe_evolve(self, steps: int = 1):
         """تطور آمن للخيوط"""
         with self._lock:
             if hasattr(self.universe, 'evolve'):
-                return self.universe.evolve(steps)
+                try:
+                    return self.universe.evolve(steps)
+                finally:
+                    self._publish_locked()
             return None
     
     def safe_set_parameter(self, parameter: str, value: Any):
         """ضبط معامل آمن للخيوط"""
         with self._lock:
             if hasattr(self.universe, 'set_parameter'):
-                return self.universe.set_parameter(parameter, value)
+                try:
+                    return self.universe.set_parameter(parameter, value)
+                finally:
+                    self._publish_locked()
             return None
     
+    def snapshot(self):
+        """آخر لقطة منشورة، بدون قفل (None إذا لم يدعم الكون اللقطات)"""
+        return self._snapshot
+    
+    @property
+    def version(self) -> Optional[int]:
+        """إصدار آخر لقطة منشورة"""
+        snapshot = self._snapshot
+        return snapshot.version if snapshot is not None else None
+    
     def safe_get_state(self):
         """الحصول على الحالة بشكل آمن"""
+        snapshot = self._snapshot
+        if snapshot is not None:
+            return snapshot.get_state()
         with self._lock:
             if hasattr(self.universe, 'get_state'):
                 return self.universe.get_state()
             return None
     
-    def create_local_copy(self):
-        """إنشاء نسخة محلية للخيط"""
+    def safe_get_statistics(self) -> Dict[str, Any]:
+        """إحصائيات من آخر لقطة، بدون قفل"""
+        snapshot = self._snapshot
+        if snapshot is not None:
+            return snapshot.get_statistics()
+        with self._lock:
+            if hasattr(self.universe, 'get_statistics'):
+                return self.universe.get_statistics()
+            return {}
+    
+    def create_local_copy(self, stream: Optional[int] = None):
+        """إنشاء نسخة محلية للخيط
+
+        With ``stream`` (the loop iteration or chunk index) the copy draws its
+        noise from the ``stream``-th seed derived from the universe's, so the
+        result does not depend on which thread ran which iteration. The copy
+        is kept for the thread until the stream changes or a new snapshot is
+        published.
+        """
+        key = (stream, self._published)
+        if getattr(self._local_data, 'key', None) != key:
+            self._local_data.__dict__.pop('universe_copy', None)
         if not hasattr(self._local_data, 'universe_copy'):
-            with self._lock:
-                # إنشاء نسخة من الكون للخيط الحالي
-                if hasattr(self.universe, 'copy'):
-                    self._local_data.universe_copy = self.universe.copy()
-                else:
-                    self._local_data.universe_copy = self.universe
+            snapshot = self._snapshot
+            if snapshot is not None:
+                # من اللقطة: لا حاجة للقفل
+                universe_copy = snapshot.copy()
+            else:
+                with self._lock:
+                    if hasattr(self.universe, 'copy'):
+                        universe_copy = self.universe.copy()
+                    else:
+                        universe_copy = copy.deepcopy(self.universe)
+            # تيار ضجيج خاص بكل تكرار
+            if stream is not None and hasattr(universe_copy, 'reseed') \
+                    and getattr(universe_copy, 'seed', None) is not None:
+                from .universe import derive_seed
+                universe_copy.reseed(derive_seed(universe_copy.seed, stream))
+            self._local_data.universe_copy = universe_copy
+            self._local_data.key = key
         
         return self._local_data.universe_copy
 
@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+محلل الأداء لـ ND-Script
+Performance Profiler for ND-Script: nestable operation timers
+
+Operations are timed with ``perf_counter_ns`` and kept per thread: each
+thread has its own stack of open operations and its own statistics, so
+timing never takes a lock. ``get_performance_stats`` merges the threads.
+Durations go into fixed log-linear histograms, which give p50/p99 and
+merge exactly across threads and processes.
+
+Profiling is on unless ``NDS_PROFILE=0``. When it is off at import time,
+``profile_operation`` returns the function unchanged.
+"""
+
+import functools
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+# ثمانية أقسام لكل قوة من 2: خطأ نسبي أقل من 12.5% في المئينات
+SUB_BUCKET_BITS = 3
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+BUCKET_COUNT = 64 * SUB_BUCKETS
+
+
+def bucket_index(value_ns: int) -> int:
+    """Histogram bucket of a duration: exponent and top mantissa bits"""
+    if value_ns < SUB_BUCKETS:
+        return max(value_ns, 0)
+    exponent = value_ns.bit_length() - 1 - SUB_BUCKET_BITS
+    return ((exponent + 1) << SUB_BUCKET_BITS) + ((value_ns >> exponent) - SUB_BUCKETS)
+
+
+def bucket_upper_bound(index: int) -> int:
+    """Largest duration in nanoseconds that falls into bucket ``index``"""
+    if index < SUB_BUCKETS:
+        return index
+    exponent = (index >> SUB_BUCKET_BITS) - 1
+    mantissa = (index & (SUB_BUCKETS - 1)) + SUB_BUCKETS
+    return ((mantissa + 1) << exponent) - 1
+
+
+class OperationStats:
+    """Count, totals, extrema and duration histogram of one operation"""
+
+    __slots__ = ("count", "total_ns", "self_ns", "min_ns", "max_ns", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total_ns = 0
+        self.self_ns = 0
+        self.min_ns = 0
+        self.max_ns = 0
+        self.buckets = [0] * BUCKET_COUNT
+
+    def record(self, elapsed_ns: int, self_ns: int):
+        if not self.count or elapsed_ns < self.min_ns:
+            self.min_ns = elapsed_ns
+        if elapsed_ns > self.max_ns:
+            self.max_ns = elapsed_ns
+        self.count += 1
+        self.total_ns += elapsed_ns
+        self.self_ns += self_ns
+        self.buckets[bucket_index(elapsed_ns)] += 1
+
+    def merge(self, other: 'OperationStats'):
+        if not other.count:
+            return
+        if not self.count or other.min_ns < self.min_ns:
+            self.min_ns = other.min_ns
+        self.max_ns = max(self.max_ns, other.max_ns)
+        self.count += other.count
+        self.total_ns += other.total_ns
+        self.self_ns += other.self_ns
+        buckets = self.buckets
+        for index, count in enumerate(other.buckets):
+            if count:
+                buckets[index] += count
+
+    def percentile(self, q: float) -> int:
+        """Upper bound of the bucket holding the ``q``-th percentile (ns)"""
+        if not self.count:
+            return 0
+        rank = max(1, math.ceil(q / 100.0 * self.count))
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank:
+                return min(bucket_upper_bound(index), self.max_ns)
+        return self.max_ns
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Milliseconds, as reported by ``get_performance_stats``"""
+        count = self.count
+        return {
+            "count": count,
+            "total_ms": self.total_ns / 1e6,
+            "self_ms": self.self_ns / 1e6,
+            "mean_ms": self.total_ns / count / 1e6 if count else 0.0,
+            "min_ms": self.min_ns / 1e6,
+            "max_ms": self.max_ns / 1e6,
+            "p50_ms": self.percentile(50) / 1e6,
+            "p99_ms": self.percentile(99) / 1e6,
+        }
+
+    def export(self) -> Dict[str, Any]:
+        """Picklable raw form, for ``merge_exported`` in another process"""
+        return {
+            "count": self.count, "total_ns": self.total_ns, "self_ns": self.self_ns,
+            "min_ns": self.min_ns, "max_ns": self.max_ns,
+            "buckets": {index: count for index, count in enumerate(self.buckets) if count},
+        }
+
+    @classmethod
+    def from_export(cls, data: Dict[str, Any]) -> 'OperationStats':
+        stats = cls()
+        for name in ("count", "total_ns", "self_ns", "min_ns", "max_ns"):
+            setattr(stats, name, data[name])
+        for index, count in data["buckets"].items():
+            stats.buckets[int(index)] = count
+        return stats
+
+
+class _ThreadState:
+    """Open operations and statistics of one thread"""
+
+    __slots__ = ("thread", "stack", "operations")
+
+    def __init__(self):
+        self.thread = threading.current_thread()
+        # [name, start_ns, children_ns] لكل عملية مفتوحة
+        self.stack: List[list] = []
+        self.operations: Dict[str, OperationStats] = {}
+
+
+class PerformanceProfiler:
+    """Nestable operation timers with per-thread, lock-free recording"""
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._local = threading.local()
+        self._states: List[_ThreadState] = []
+        self._lock = threading.Lock()
+        # عمليات مدمجة من عمليات أخرى أو من خيوط انتهت بعد reset
+        self._merged: Dict[str, OperationStats] = {}
+        self.unbalanced = 0
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _state(self) -> _ThreadState:
+        state = getattr(self._local, "state", None)
+        if state is None:
+            state = _ThreadState()
+            self._local.state = state
+            with self._lock:
+                self._states.append(state)
+        return state
+
+    def start_operation(self, name: str):
+        """Open a timer; operations opened inside it are its children"""
+        if not self.enabled:
+            return
+        self._state().stack.append([name, time.perf_counter_ns(), 0])
+
+    def end_operation(self, name: str) -> int:
+        """Close the innermost open ``name`` and return its duration in ns.
+
+        Operations left open inside it (an exception skipped their end)
+        are closed with it and counted in ``unbalanced``.
+        """
+        if not self.enabled:
+            return 0
+        end_ns = time.perf_counter_ns()
+        state = self._state()
+        stack = state.stack
+        for depth in range(len(stack) - 1, -1, -1):
+            if stack[depth][0] == name:
+                break
+        else:
+            self.unbalanced += 1
+            return 0
+
+        elapsed = 0
+        while len(stack) > depth:
+            frame_name, start_ns, children_ns = stack.pop()
+            elapsed = end_ns - start_ns
+            if len(stack) > depth:
+                self.unbalanced += 1
+            stats = state.operations.get(frame_name)
+            if stats is None:
+                stats = state.operations[frame_name] = OperationStats()
+            stats.record(elapsed, elapsed - children_ns)
+            if stack:
+                stack[-1][2] += elapsed
+        return elapsed
+
+    @contextmanager
+    def operation(self, name: str):
+        """``with profiler.operation(name):`` times the block, even when it raises"""
+        self.start_operation(name)
+        try:
+            yield
+        finally:
+            self.end_operation(name)
+
+    def _collect(self) -> Dict[str, OperationStats]:
+        with self._lock:
+            # خيوط منتهية (مثل خيوط parallel for) تُدمج ثم تُنسى
+            for state in [state for state in self._states if not state.thread.is_alive()]:
+                for name, stats in state.operations.items():
+                    self._merged.setdefault(name, OperationStats()).merge(stats)
+                self._states.remove(state)
+            states = list(self._states)
+            merged = {}
+            for name, stats in self._merged.items():
+                merged.setdefault(name, OperationStats()).merge(stats)
+        for state in states:
+            for name, stats in list(state.operations.items()):
+                merged.setdefault(name, OperationStats()).merge(stats)
+        return merged
+
+    def get_operation_stats(self, name: str) -> Optional[Dict[str, Any]]:
+        """Statistics of one operation, or None if it never ran"""
+        stats = self._collect().get(name)
+        return stats.to_dict() if stats is not None else None
+
+    def export(self) -> Dict[str, Any]:
+        """Raw statistics of every operation, picklable across processes"""
+        return {name: stats.export() for name, stats in self._collect().items()}
+
+    def merge_exported(self, exported: Dict[str, Any]):
+        """Add statistics exported by another profiler (e.g. a worker process)"""
+        with self._lock:
+            for name, data in exported.items():
+                self._merged.setdefault(name, OperationStats()).merge(OperationStats.from_export(data))
+
+    def reset(self):
+        """Forget all statistics; open operations stay open"""
+        with self._lock:
+            self._merged = {}
+            for state in self._states:
+                state.operations = {}
+        self.unbalanced = 0
+
+    def _after_fork(self):
+        # العملية الابنة تبدأ بإحصائيات فارغة: لا تكرار لأرقام الأب عند الدمج
+        self._lock = threading.Lock()
+        self._states = []
+        self._merged = {}
+        self._local = threading.local()
+        self.unbalanced = 0
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def get_performance_stats(self) -> Dict[str, Any]:
+        """إحصائيات العمليات مرتبة حسب الزمن الكلي"""
+        operations = self._collect()
+        ordered = sorted(operations.items(), key=lambda item: item[1].total_ns, reverse=True)
+        return {
+            "enabled": self.enabled,
+            "unbalanced": self.unbalanced,
+            "operations": {name: stats.to_dict() for name, stats in ordered},
+        }
+
+
+global_profiler = PerformanceProfiler(enabled=os.environ.get("NDS_PROFILE", "1") != "0")
+
+
+def profile_operation(name: str, profiler: Optional[PerformanceProfiler] = None) -> Callable:
+    """Decorator timing every call as operation ``name``.
+
+    When the profiler is disabled at decoration time the function is
+    returned unchanged, so disabled profiling costs nothing.
+    """
+    profiler = profiler or global_profiler
+
+    def decorator(function: Callable) -> Callable:
+        if not profiler.enabled:
+            return function
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not profiler.enabled:
+                return function(*args, **kwargs)
+            profiler.start_operation(name)
+            try:
+                return function(*args, **kwargs)
+            finally:
+                profiler.end_operation(name)
+        return wrapper
+    return decorator
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+العرض خارج الشاشة لـ ND-Script
+Off-screen Frame Rendering for show plot / show density
+
+Frames are drawn with Matplotlib's Agg canvas, never through pyplot, so no
+display is needed. The field is pooled down to the output resolution on
+the simulation thread; this small copy is all that is handed over. PNG
+encoding then runs on a thread pool. When the encoder falls behind, the
+renderer either waits for a free slot or drops the frame.
+"""
+
+import os
+import struct
+import threading
+import time
+import zlib
+import concurrent.futures
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from .errors import NDScriptIOError
+
+try:
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    import matplotlib.image
+    HAS_MATPLOTLIB = True
+except ImportError:
+    HAS_MATPLOTLIB = False
+
+# طرق تصغير الحقل إلى دقة الإخراج
+DECIMATION_MODES = ("max", "mean", "stride")
+
+
+def decimate(field: np.ndarray, resolution: int, mode: str = "max") -> np.ndarray:
+    """Pool the last two axes of ``field`` down to at most ``resolution`` cells.
+
+    ``max`` keeps narrow peaks visible, ``mean`` averages blocks and
+    ``stride`` picks every n-th cell. Edge rows that do not fill a whole
+    block are dropped. The result never aliases ``field``.
+    """
+    if mode not in DECIMATION_MODES:
+        raise ValueError(f"Decimation mode must be one of {DECIMATION_MODES}, got {mode!r}")
+    field = np.asarray(field)
+    rows, cols = field.shape[-2:]
+    factor = -(-max(rows, cols) // max(1, int(resolution)))
+    if factor <= 1:
+        return field.copy()
+    if mode == "stride":
+        return field[..., ::factor, ::factor].copy()
+
+    rows, cols = rows - rows % factor, cols - cols % factor
+    blocks = field[..., :rows, :cols].reshape(field.shape[:-2] + (rows // factor, factor, cols // factor, factor))
+    return blocks.max(axis=(-3, -1)) if mode == "max" else blocks.mean(axis=(-3, -1))
+
+
+def tile(fields: np.ndarray) -> np.ndarray:
+    """Lay a stack of 2-D fields out as a near-square mosaic"""
+    count, rows, cols = fields.shape
+    columns = int(np.ceil(np.sqrt(count)))
+    lines = -(-count // columns)
+    mosaic = np.full((lines * rows, columns * cols), np.nan)
+    for index in range(count):
+        line, column = divmod(index, columns)
+        mosaic[line * rows:(line + 1) * rows, column * cols:(column + 1) * cols] = fields[index]
+    return mosaic
+
+
+def encode_png(image: np.ndarray) -> bytes:
+    """8-bit grayscale PNG of a 2-D array scaled to its own range (no Matplotlib)"""
+    image = np.asarray(image, dtype=np.float64)
+    finite = np.isfinite(image)
+    low, high = (image[finite].min(), image[finite].max()) if finite.any() else (0.0, 0.0)
+    scale = 255.0 / (high - low) if high > low else 0.0
+    pixels = np.where(finite, (image - low) * scale, 0).astype(np.uint8)
+
+    rows, cols = pixels.shape
+    # بايت مرشح صفري في بداية كل سطر
+    raw = np.zeros((rows, cols + 1), dtype=np.uint8)
+    raw[:, 1:] = pixels
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    header = struct.pack(">IIBBBBB", cols, rows, 8, 0, 0, 0, 0)
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header)
+            + chunk(b"IDAT", zlib.compress(raw.tobytes(), 6)) + chunk(b"IEND", b""))
+
+
+class FrameRenderer:
+    """Writes fields as numbered PNG frames ``<directory>/<name>_00000.png``.
+
+    ``render`` returns as soon as the pooled frame is queued. At most
+    ``max_pending`` frames are queued; beyond that, ``skip_when_busy``
+    drops the frame, otherwise ``render`` waits. Skipped frames take no
+    number, so a sequence stays contiguous for movie encoders. Encoding
+    errors are kept and raised by the next ``flush``.
+    """
+
+    def __init__(self, directory: str = "frames", resolution: int = 512, workers: int = 2,
+                 max_pending: Optional[int] = None, skip_when_busy: bool = False,
+                 decimation: str = "max", cmap: str = "viridis"):
+        self.directory = directory
+        self.resolution = int(resolution)
+        self.workers = max(1, int(workers))
+        self.max_pending = max_pending or 2 * self.workers
+        self.skip_when_busy = skip_when_busy
+        self.decimation = decimation
+        self.cmap = cmap
+        self.stats = {
+            "frames": 0,
+            "skipped": 0,
+            "decimate_time": 0.0,
+            "encode_time": 0.0,
+            "backpressure_time": 0.0,
+            "bytes_written": 0,
+            "errors": 0,
+        }
+
+        self._counters: Dict[str, int] = {}
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+        self._futures: List[concurrent.futures.Future] = []
+        self._errors: List[NDScriptIOError] = []
+        self._lock = threading.Lock()
+        # شكل Matplotlib لكل خيط: يعاد استخدامه بين الإطارات
+        self._local = threading.local()
+
+    def render(self, field: np.ndarray, name: str = "density", title: Optional[str] = None,
+               annotate: bool = True) -> Optional[str]:
+        """Queue one frame of ``field``; returns its path, or None if skipped.
+
+        With ``annotate`` the frame is a figure with a colorbar and
+        ``title``; otherwise it is the pooled field, one pixel per cell.
+        """
+        start_time = time.perf_counter()
+        if not self._slots.acquire(blocking=not self.skip_when_busy):
+            self.stats["skipped"] += 1
+            return None
+        self.stats["backpressure_time"] += time.perf_counter() - start_time
+
+        try:
+            start_time = time.perf_counter()
+            image = decimate(field, self.resolution, self.decimation)
+            if image.ndim == 3:
+                image = tile(image)  # دفعة أكوان: فسيفساء الأعضاء
+            self.stats["decimate_time"] += time.perf_counter() - start_time
+
+            index = self._counters.get(name, 0)
+            self._counters[name] = index + 1
+            path = os.path.join(self.directory, f"{name}_{index:05d}.png")
+            if self._executor is None:
+                os.makedirs(self.directory, exist_ok=True)
+                self._executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="nds-render")
+            future = self._executor.submit(self._encode, path, image, title, annotate)
+        except BaseException:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._futures = [pending for pending in self._futures if not pending.done()]
+            self._futures.append(future)
+        return path
+
+    def _encode(self, path: str, image: np.ndarray, title: Optional[str], annotate: bool):
+        start_time = time.perf_counter()
+        try:
+            if not HAS_MATPLOTLIB:
+                with open(path, "wb") as f:
+                    f.write(encode_png(image))
+            elif annotate:
+                self._figure(image, title).savefig(path)
+            else:
+                matplotlib.image.imsave(path, image, cmap=self.cmap, origin="upper")
+            written = os.path.getsize(path)
+        except Exception as e:
+            with self._lock:
+                self._errors.append(NDScriptIOError(f"Cannot render frame: {e}", path))
+                self.stats["errors"] += 1
+            return
+        finally:
+            self._slots.release()
+
+        with self._lock:
+            self.stats["frames"] += 1
+            self.stats["bytes_written"] += written
+            self.stats["encode_time"] += time.perf_counter() - start_time
+
+    def _figure(self, image: np.ndarray, title: Optional[str]):
+        # إعادة استخدام الشكل: set_data أرخص بكثير من بناء شكل جديد
+        local = self._local
+        if getattr(local, "shape", None) != image.shape:
+            figure = Figure(figsize=(6, 5), dpi=100)
+            FigureCanvasAgg(figure)
+            axes = figure.add_subplot()
+            local.image = axes.imshow(image, cmap=self.cmap, interpolation="nearest")
+            figure.colorbar(local.image, ax=axes)
+            local.axes = axes
+            local.figure = figure
+            local.shape = image.shape
+        local.image.set_data(image)
+        finite = image[np.isfinite(image)]
+        if finite.size:
+            local.image.set_clim(finite.min(), finite.max())
+        local.axes.set_title(title or "")
+        return local.figure
+
+    def flush(self):
+        """Wait for every queued frame; raises the first encoding error"""
+        with self._lock:
+            futures, self._futures = self._futures, []
+        concurrent.futures.wait(futures)
+        with self._lock:
+            errors, self._errors = self._errors, []
+        if errors:
+            raise errors[0]
+
+    def pending(self) -> int:
+        """Number of frames not yet written"""
+        with self._lock:
+            return sum(1 for future in self._futures if not future.done())
+
+    def close(self):
+        """Flush and stop the encoder threads"""
+        try:
+            self.flush()
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+    def get_performance_stats(self) -> Dict[str, Any]:
+        """إحصائيات العرض"""
+        frames = self.stats["frames"]
+        return {
+            **self.stats,
+            "pending": self.pending(),
+            "max_pending": self.max_pending,
+            "workers": self.workers,
+            "resolution": self.resolution,
+            "backend": "agg" if HAS_MATPLOTLIB else "png",
+            "avg_encode_time": self.stats["encode_time"] / frames if frames else 0.0,
+        }
+
+
+def create_frame_renderer(directory: str = "frames", resolution: int = 512,
+                          skip_when_busy: bool = False) -> FrameRenderer:
+    """إنشاء عارض إطارات"""
+    return FrameRenderer(directory, resolution=resolution, skip_when_busy=skip_when_busy)
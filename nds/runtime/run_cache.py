@@ -0,0 +1,425 @@
+#!/usr/bin/env python3
+"""
+ذاكرة نتائج التشغيل لـ ND-Script
+Run Cache: whole-run results addressed by the content of their inputs
+
+The key of a run hashes everything its outcome depends on: the script
+after macro expansion, the contents of its transitive imports, the
+variables already defined (injected by the host), the pinned parameters
+including the seed, the execution options and the runtime itself (its
+sources, grammar, Python, NumPy and Lark versions). A hit restores the
+final variables and universe from a checkpoint, re-registers the
+script's functions, macros and imports, and replays the captured output
+instead of executing the script.
+
+Only runs that are reproducible from the key are stored:
+
+* scripts marked ``// nds: nondeterministic`` (or ``// nds: غير_حتمي``),
+  in themselves or in an import, are never cached;
+* ``save``, ``load``, ``record`` and rendered ``show`` targets read or
+  write files outside the key, so those scripts always execute;
+* a run that starts with a universe, or ends with one whose initial field
+  was drawn from an entropy seed (neither pinned by the host nor set by
+  ``set seed = N`` before the first step), is executed but not stored.
+
+Entries live in ``<cache directory>/runs/<key>/`` and the least recently
+used are removed once the cache grows over ``max_bytes``.
+"""
+
+import contextlib
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+import sys
+import time
+from collections import Counter
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from .ast import (FunctionDef, ImportStatement, LoadCommand, MacroDef, NamespaceImport, Program,
+                  RecordCommand, SaveCommand, SelectiveImport, ShowCommand, String, ASTNode)
+from .errors import NDScriptError
+from .metrics import registry, sample, Sample
+
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+
+# علامة صريحة: لا تخزن نتائج هذا النص
+NONDETERMINISTIC_MARKER = re.compile(r"^[ \t]*//[ \t]*nds:[ \t]*(nondeterministic|غير_حتمي)", re.MULTILINE)
+
+# أهداف show التي تكتب إطارات على القرص
+RENDERED_TARGETS = ("density", "كثافة", "plot", "رسم")
+
+_IMPORTS = (ImportStatement, NamespaceImport, SelectiveImport)
+_DEFINITIONS = (FunctionDef, MacroDef) + _IMPORTS
+_SCALARS = (bool, int, float, str)
+
+_RUNTIME_DIR = Path(__file__).parent
+
+
+@lru_cache(maxsize=1)
+def runtime_fingerprint() -> str:
+    """Hash of the runtime sources, the grammar and the libraries results depend on"""
+    import lark
+    import numpy
+
+    digest = hashlib.sha256()
+    digest.update(f"{sys.version_info[:2]} numpy {numpy.__version__} lark {lark.__version__}".encode())
+    for path in sorted(_RUNTIME_DIR.glob("*.py")) + sorted((_RUNTIME_DIR.parent / "grammar").glob("*.lark")):
+        digest.update(path.name.encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _walk(node):
+    """Every AST node under ``node``, statements and expressions alike"""
+    stack = [node]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, (list, tuple)):
+            stack.extend(item)
+        elif isinstance(item, ASTNode):
+            yield item
+            stack.extend(vars(item).values())
+
+
+def _side_effect(program: Program) -> Optional[str]:
+    """Why ``program`` touches files outside the key, or None"""
+    for node in _walk(program):
+        if isinstance(node, (SaveCommand, LoadCommand, RecordCommand)):
+            return type(node).__name__.replace("Command", "").lower()
+        if isinstance(node, ShowCommand):
+            # show y / show x + 1: تعبير يطبع قيمته فقط
+            target = node.target.value if isinstance(node.target, String) else node.target
+            if isinstance(target, str) and target.strip('"\'') in RENDERED_TARGETS:
+                return "rendered show"
+    return None
+
+
+def _fingerprint_value(value: Any) -> Any:
+    if value is None or isinstance(value, _SCALARS):
+        return value
+    if isinstance(value, (list, tuple)):
+        return [_fingerprint_value(item) for item in value]
+    if isinstance(value, dict):
+        return {str(name): _fingerprint_value(item) for name, item in value.items()}
+    if hasattr(value, "tobytes") and hasattr(value, "dtype"):
+        return f"array {value.dtype} {getattr(value, 'shape', ())} {hashlib.sha256(value.tobytes()).hexdigest()}"
+    if callable(value):
+        # دوال المضيف تعرف بأسمائها فقط
+        return f"callable {getattr(value, '__module__', '')}.{getattr(value, '__qualname__', type(value).__name__)}"
+    return repr(value)
+
+
+class _Tee(io.StringIO):
+    """Captures what it is written while passing it through to ``stream``"""
+
+    def __init__(self, stream):
+        super().__init__()
+        self.stream = stream
+
+    def write(self, text):
+        self.stream.write(text)
+        return super().write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+
+class RunCache:
+    """On-disk cache of whole runs, keyed by the hash of their inputs.
+
+    ``run(interpreter, source)`` behaves like ``interpreter.interpret``;
+    ``last`` tells whether the run was a ``hit``, a ``miss`` (stored or
+    not, with the ``reason``) or a ``bypass``.
+    """
+
+    def __init__(self, directory: Optional[str] = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        if directory is None:
+            from .interpreter import cache_directory
+            base = cache_directory()
+            directory = base / "runs" if base is not None else None
+        self.directory = Path(directory) if directory is not None else None
+        self.max_bytes = max_bytes
+        self.last: Dict[str, Any] = {}
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "bypassed": 0,
+            "evictions": 0,
+            "errors": 0,
+        }
+        self.skip_reasons: Counter = Counter()
+        registry.register_collector(self.metric_samples)
+
+    def _imports(self, interpreter, program: Program, seen: Dict[str, str]) -> Optional[str]:
+        """Hash the transitive imports of ``program`` into ``seen``; returns why they cannot be cached"""
+        for node in _walk(program):
+            if not isinstance(node, _IMPORTS):
+                continue
+            path = interpreter.import_resolver._resolve_file_path(node.filename)
+            if path in seen:
+                continue
+            with open(path, 'r', encoding='utf-8') as f:
+                content = f.read()
+            seen[path] = _sha256(content)
+            if NONDETERMINISTIC_MARKER.search(content):
+                return "marked nondeterministic"
+            module = interpreter._parse_and_transform(content)
+            reason = _side_effect(module) or self._imports(interpreter, module, seen)
+            if reason:
+                return reason
+        return None
+
+    def key(self, interpreter, source: str) -> Tuple[Optional[str], Optional[str], Optional[Program]]:
+        """``(key, None, program)``, or ``(None, reason, program)`` when the run cannot be cached"""
+        if self.directory is None:
+            return None, "no cache directory", None
+        if NONDETERMINISTIC_MARKER.search(source):
+            return None, "marked nondeterministic", None
+        if interpreter.universe is not None:
+            return None, "universe exists", None
+        try:
+            program = interpreter._cached_parse_and_transform(source)
+        except Exception:
+            return None, "syntax error", None  # يبلغ عنه التنفيذ نفسه
+        reason = _side_effect(program)
+        if reason:
+            return None, reason, program
+
+        imports: Dict[str, str] = {}
+        try:
+            reason = self._imports(interpreter, program, imports)
+        except Exception:
+            return None, "unresolved import", program
+        if reason:
+            return None, reason, program
+
+        macros = interpreter._macro_processor
+        variables = {name: _fingerprint_value(value)
+                     for name, value in interpreter.environment.get_all_variables().items()}
+        host_functions = sorted(_fingerprint_value(info["python_function"])
+                                for info in interpreter.functions.values() if "python_function" in info)
+        inputs = {
+            "runtime": runtime_fingerprint(),
+            "source": _sha256(macros.preprocess(source) if macros is not None else source),
+            "imports": sorted(imports.items()),
+            "variables": variables,
+            "host_functions": host_functions,
+            "pinned": _fingerprint_value(interpreter.pinned_parameters),
+            "batch": interpreter.batch,
+            "options": [interpreter.use_bytecode, interpreter.optimize_ast, interpreter.silent_mode],
+        }
+        document = json.dumps(inputs, sort_keys=True, ensure_ascii=False, default=repr)
+        return hashlib.sha256(document.encode("utf-8")).hexdigest(), None, program
+
+    def run(self, interpreter, source: str, filename: str = "<string>") -> Any:
+        """Restore the cached outcome of this run, or execute it and store it"""
+        key, reason, program = self.key(interpreter, source)
+        if key is None:
+            self.stats["bypassed"] += 1
+            self.skip_reasons[reason] += 1
+            self.last = {"status": "bypass", "key": None, "reason": reason}
+            return interpreter.interpret(source, filename)
+
+        entry = self._read(key)
+        if entry is not None:
+            try:
+                result = self._restore(interpreter, program, *entry)
+            except (OSError, ValueError, KeyError, NDScriptError):
+                self.stats["errors"] += 1
+            else:
+                self.stats["hits"] += 1
+                self.last = {"status": "hit", "key": key, "reason": None}
+                return result
+
+        self.stats["misses"] += 1
+        tee = _Tee(sys.stdout)
+        with contextlib.redirect_stdout(tee):
+            result = interpreter.interpret(source, filename)
+
+        reason = self._unstorable(interpreter, result)
+        if reason is None:
+            try:
+                self._write(key, interpreter, result, tee.getvalue(), filename)
+            except (OSError, NDScriptError, TypeError, ValueError):
+                self.stats["errors"] += 1
+                reason = "write failed"
+        if reason is None:
+            self.stats["stores"] += 1
+        else:
+            self.skip_reasons[reason] += 1
+        self.last = {"status": "miss", "key": key, "reason": reason}
+        return result
+
+    @staticmethod
+    def _unstorable(interpreter, result: Any) -> Optional[str]:
+        """Why the outcome of a finished run must not be stored, or None"""
+        # seeded: بذرة مثبتة من المضيف أو من set seed قبل أول خطوة
+        if interpreter.universe is not None and not getattr(interpreter.universe, "seeded", False):
+            return "unseeded universe"
+        if not (result is None or isinstance(result, _SCALARS) or result is interpreter.universe):
+            return "unstorable result"
+        for value in interpreter.environment.get_all_variables().values():
+            if not (value is None or isinstance(value, _SCALARS) or callable(value)):
+                return "unstorable variables"
+        return None
+
+    def notice(self) -> Optional[str]:
+        """One line saying why the last run was not stored, or None"""
+        reason = self.last.get("reason")
+        if self.last.get("status") == "hit" or not reason:
+            return None
+        return f"Run cache: not cached ({reason})"
+
+    def _entry_path(self, key: str) -> Path:
+        return self.directory / key
+
+    def _read(self, key: str) -> Optional[Tuple[Dict[str, Any], Path]]:
+        path = self._entry_path(key)
+        try:
+            with open(path / "entry.json", 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            # وقت التعديل هو ساعة LRU
+            os.utime(path / "entry.json")
+        except (OSError, ValueError):
+            return None
+        return entry, path / "state.ndc"
+
+    def _write(self, key: str, interpreter, result: Any, output: str, filename: str):
+        from .checkpoint import write_checkpoint
+
+        metadata = interpreter._collect_save_data()
+        fields = {}
+        universe = interpreter.universe
+        if universe is not None:
+            metadata["universe_state"] = universe.get_metadata()
+            fields = universe.get_fields()
+        entry = {
+            "key": key,
+            "script": filename,
+            "created": time.time(),
+            "output": output,
+            "result": None if result is universe else result,
+            "result_is_universe": universe is not None and result is universe,
+            "running": interpreter.running,
+        }
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.directory / f".tmp-{os.getpid()}-{key}"
+        try:
+            tmp_path.mkdir(exist_ok=True)
+            write_checkpoint(str(tmp_path / "state.ndc"), metadata, fields)
+            with open(tmp_path / "entry.json", 'w', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False)
+            try:
+                os.replace(tmp_path, self._entry_path(key))
+            except OSError:
+                pass  # عملية أخرى خزنت النتيجة نفسها
+        finally:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        self.evict()
+
+    def _restore(self, interpreter, program: Program, entry: Dict[str, Any], state_path: Path) -> Any:
+        from .checkpoint import read_checkpoint
+        from .universe import BatchedUniverse, QuantumFractalUniverse
+
+        metadata, fields = read_checkpoint(str(state_path))
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            # الدوال والماكرو والاستيرادات لا تخزن: تعاد تعريفاتها فقط
+            definitions = [statement for statement in program.statements if isinstance(statement, _DEFINITIONS)]
+            if definitions:
+                Program(definitions).accept(interpreter)
+        for name, value in metadata.get("variables", {}).items():
+            interpreter.environment.set(name, value)
+
+        if metadata.get("universe_initialized"):
+            state = metadata["universe_state"]
+            batch = int(state.get("batch", 1))
+            universe = BatchedUniverse(batch) if batch > 1 else QuantumFractalUniverse()
+            universe.set_state(state, fields)
+            # لا يخزن إلا كون مرسوم من بذرة معطاة
+            universe.seeded = True
+            if batch == 1:
+                for subscription in interpreter.step_subscriptions:
+                    if subscription.active:
+                        universe.add_observer(subscription)
+            interpreter.universe = universe
+            interpreter.batch = batch
+        interpreter.running = entry.get("running", True)
+
+        sys.stdout.write(entry["output"])
+        return interpreter.universe if entry.get("result_is_universe") else entry.get("result")
+
+    def _entries(self) -> List[Tuple[float, int, Path]]:
+        """``(last use, bytes, path)`` of every entry"""
+        entries = []
+        if self.directory is None or not self.directory.is_dir():
+            return entries
+        for path in self.directory.iterdir():
+            if path.name.startswith("."):
+                continue
+            try:
+                used = (path / "entry.json").stat().st_mtime
+                size = sum(child.stat().st_size for child in path.iterdir())
+            except OSError:
+                continue
+            entries.append((used, size, path))
+        return entries
+
+    def evict(self) -> int:
+        """Remove least recently used entries until the cache fits ``max_bytes``"""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            removed += 1
+        self.stats["evictions"] += removed
+        return removed
+
+    def clear(self):
+        """Remove every entry"""
+        for _, _, path in self._entries():
+            shutil.rmtree(path, ignore_errors=True)
+
+    def metric_samples(self) -> List[Sample]:
+        """عدادات ذاكرة التشغيل لسجل المقاييس"""
+        stats = self.stats
+        return [
+            sample("run_cache_hits_total", "counter", "Runs restored from the run cache", stats["hits"]),
+            sample("run_cache_misses_total", "counter", "Cacheable runs that were executed", stats["misses"]),
+            sample("run_cache_stores_total", "counter", "Runs stored in the run cache", stats["stores"]),
+            sample("run_cache_bypassed_total", "counter", "Runs that could not be cached", stats["bypassed"]),
+            sample("run_cache_evictions_total", "counter", "Run cache entries evicted", stats["evictions"]),
+        ]
+
+    def get_performance_stats(self) -> Dict[str, Any]:
+        """إحصائيات ذاكرة التشغيل"""
+        entries = self._entries()
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_rate": self.stats["hits"] / lookups * 100 if lookups else 0.0,
+            "skip_reasons": dict(self.skip_reasons),
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+            "directory": str(self.directory) if self.directory is not None else None,
+        }
+
+
+def create_run_cache(directory: Optional[str] = None, max_bytes: int = DEFAULT_MAX_BYTES) -> RunCache:
+    """إنشاء ذاكرة نتائج التشغيل"""
+    return RunCache(directory, max_bytes)
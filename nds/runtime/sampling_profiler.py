@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+محلل العينات لـ ND-Script
+Sampling Profiler for ND-Script call stacks, written as collapsed stacks
+
+A background thread wakes every ``interval`` seconds and reads the Python
+frames of the running threads (``sys._current_frames``). It keeps only the
+frames that mean something to a script: statement visitors, through the
+source span of their node, and user function calls. The interpreter runs
+without any instrumentation. Only the sampler's own time is spent, and
+when that exceeds ``max_overhead`` of the wall time, the interval grows.
+
+``collapsed()`` gives one ``frame;frame;frame count`` line per distinct
+stack, the input format of flamegraph.pl, speedscope and inferno.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from .line_profiler import FUNCTION_EXECUTORS, STATEMENT_VISITORS
+
+_STATEMENTS = frozenset(STATEMENT_VISITORS)
+_FUNCTIONS = frozenset(FUNCTION_EXECUTORS)
+
+
+def _line_label(span) -> str:
+    source = os.path.basename(span.source) if span.source else "<script>"
+    return f"{source}:{span.line}"
+
+
+class SamplingProfiler:
+    """Samples the script-level stacks of ``interpreter`` (or of every interpreter).
+
+    Usable as a context manager or with ``start``/``stop`` around a
+    long-running session; ``collapsed`` may be read while it runs.
+    """
+
+    def __init__(self, interpreter=None, interval: float = 0.005, max_overhead: float = 0.02,
+                 max_interval: float = 0.1):
+        self.interpreter = interpreter
+        self.interval = interval
+        self.max_overhead = max_overhead
+        self.max_interval = max_interval
+        self.samples: Counter = Counter()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._started = 0.0
+        self.stats = {
+            "samples": 0,
+            "empty_samples": 0,
+            "sampling_time": 0.0,
+            "wall_time": 0.0,
+        }
+
+    def start(self):
+        """Start the sampler thread"""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="nds-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop sampling; collected stacks are kept"""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self.stats["wall_time"] += time.perf_counter() - self._started
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.stop()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def _run(self):
+        own = threading.get_ident()
+        interval = self.interval
+        busy = 0.0
+        started = time.perf_counter()
+        while not self._stop.wait(interval):
+            begin = time.perf_counter()
+            stacks = [self._script_stack(frame) for ident, frame in sys._current_frames().items()
+                      if ident != own]
+            with self._lock:
+                sampled = False
+                for stack in stacks:
+                    if stack:
+                        self.samples[stack] += 1
+                        sampled = True
+                self.stats["samples" if sampled else "empty_samples"] += 1
+            end = time.perf_counter()
+            busy += end - begin
+            self.stats["sampling_time"] += end - begin
+            # ميزانية الكلفة: إبطاء العينات بدل إبطاء النص
+            if busy > self.max_overhead * (end - started) and interval < self.max_interval:
+                interval = min(interval * 1.5, self.max_interval)
+        self.interval = interval
+
+    def _script_stack(self, frame) -> Tuple[str, ...]:
+        """Script frames of one Python stack, outermost first"""
+        labels: List[str] = []
+        while frame is not None:
+            code = frame.f_code
+            name = code.co_name
+            if name in _STATEMENTS or name in _FUNCTIONS:
+                local = frame.f_locals
+                if self.interpreter is None or local.get("self") is self.interpreter:
+                    if name in _FUNCTIONS:
+                        labels.append(f"{local.get(code.co_varnames[1])}()")
+                    else:
+                        span = getattr(local.get("node"), "span", None)
+                        if span is not None:
+                            label = _line_label(span)
+                            # عبارات في السطر نفسه إطار واحد
+                            if not labels or labels[-1] != label:
+                                labels.append(label)
+            frame = frame.f_back
+        labels.reverse()
+        return tuple(labels)
+
+    def collapsed(self) -> str:
+        """Collapsed-stack text: ``frame;frame;frame count`` per line"""
+        with self._lock:
+            samples = sorted(self.samples.items())
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in samples)
+
+    def write(self, path: str):
+        """Write ``collapsed()`` to ``path`` for flamegraph tools"""
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.collapsed())
+
+    def top_frames(self, count: int = 10) -> List[Tuple[str, int]]:
+        """Innermost frames with the most samples"""
+        leaves: Counter = Counter()
+        with self._lock:
+            for stack, samples in self.samples.items():
+                leaves[stack[-1]] += samples
+        return leaves.most_common(count)
+
+    def reset(self):
+        with self._lock:
+            self.samples.clear()
+            for key in self.stats:
+                self.stats[key] = 0 if isinstance(self.stats[key], int) else 0.0
+
+    def get_performance_stats(self) -> Dict[str, Any]:
+        """إحصائيات أخذ العينات"""
+        wall_time = self.stats["wall_time"]
+        if self._thread is not None:
+            wall_time += time.perf_counter() - self._started
+        return {
+            **self.stats,
+            "wall_time": wall_time,
+            "interval": self.interval,
+            "stacks": len(self.samples),
+            "overhead": self.stats["sampling_time"] / wall_time if wall_time else 0.0,
+            "top_frames": self.top_frames(5),
+        }
+
+
+def create_sampling_profiler(interpreter=None, interval: float = 0.005) -> SamplingProfiler:
+    """إنشاء محلل عينات"""
+    return SamplingProfiler(interpreter, interval=interval)
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+تتبع مراحل التنفيذ لـ ND-Script
+Phase Tracing for ND-Script: nested spans exported as Chrome trace events
+
+``interpret`` opens a span for each phase: macro expansion, parsing,
+transformation, optimization, bytecode compilation and execution. Each
+imported module and each universe step gets one too. Spans carry
+attributes such as cache hits, byte counts and node counts. The trace is
+written in Chrome's trace-event JSON, which chrome://tracing and Perfetto
+open, so a slow run shows whether it was parse, compile or physics bound.
+
+The tracer is off by default. A span is then a shared no-op object, and
+code that computes costly attributes checks ``span.recording`` first.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, List
+
+
+class _NullSpan:
+    """The span returned while tracing is off"""
+
+    __slots__ = ()
+    recording = False
+
+    def set(self, key: str, value: Any):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Span:
+    """One timed phase; recorded as a complete (``"X"``) event when it closes"""
+
+    __slots__ = ("tracer", "name", "category", "attributes", "start_ns")
+    recording = True
+
+    def __init__(self, tracer: 'Tracer', name: str, category: str, attributes: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.attributes = attributes
+        self.start_ns = 0
+
+    def set(self, key: str, value: Any):
+        """Attach an attribute, shown under ``args`` in the trace viewer"""
+        self.attributes[key] = value
+
+    def __enter__(self):
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        end_ns = time.perf_counter_ns()
+        if exc_type is not None:
+            self.attributes["error"] = exc_type.__name__
+        self.tracer._record(self, end_ns)
+        return False
+
+
+class Tracer:
+    """Collects spans from every thread while started.
+
+    At most ``max_events`` spans are kept; later ones are counted as
+    dropped, so a long run cannot exhaust memory.
+    """
+
+    def __init__(self, max_events: int = 1_000_000):
+        self.max_events = max_events
+        self.enabled = False
+        self.events: List[Dict[str, Any]] = []
+        self.dropped = 0
+        self._origin_ns = time.perf_counter_ns()
+        self._pid = os.getpid()
+        self._threads: Dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    def span(self, name: str, category: str = "phase", **attributes) -> Any:
+        """Context manager timing ``name``; a no-op span while tracing is off"""
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name, category, attributes)
+
+    def _record(self, span: Span, end_ns: int):
+        tid = threading.get_native_id()
+        event = {
+            "name": span.name,
+            "cat": span.category,
+            "ph": "X",
+            "ts": (span.start_ns - self._origin_ns) / 1000.0,
+            "dur": (end_ns - span.start_ns) / 1000.0,
+            "pid": self._pid,
+            "tid": tid,
+            "args": span.attributes,
+        }
+        with self._lock:
+            if len(self.events) >= self.max_events:
+                self.dropped += 1
+                return
+            self.events.append(event)
+            if tid not in self._threads:
+                self._threads[tid] = threading.current_thread().name
+
+    def start(self):
+        """Start recording spans; earlier spans are kept"""
+        self._pid = os.getpid()
+        self.enabled = True
+
+    def stop(self):
+        self.enabled = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.stop()
+
+    def to_chrome_trace(self) -> Dict[str, Any]:
+        """The spans as a Chrome trace-event document"""
+        with self._lock:
+            events = list(self.events)
+            threads = dict(self._threads)
+        pid = self._pid
+        metadata = [{"name": "process_name", "ph": "M", "pid": pid, "args": {"name": "nds"}}]
+        metadata += [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+                     for tid, name in threads.items()]
+        return {
+            "traceEvents": metadata + events,
+            "displayTimeUnit": "ms",
+            "otherData": {"dropped_spans": self.dropped},
+        }
+
+    def write(self, path: str):
+        """Write ``to_chrome_trace()`` to ``path`` as JSON"""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_chrome_trace(), f, default=str)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Count, total and self milliseconds per span name, by total time"""
+        with self._lock:
+            events = list(self.events)
+        totals: Dict[str, List[float]] = defaultdict(lambda: [0, 0.0, 0.0])
+        # الزمن الذاتي: طرح الفترات الأبناء المباشرة في الخيط نفسه
+        by_thread: Dict[int, List[Dict[str, Any]]] = defaultdict(list)
+        for event in events:
+            by_thread[event["tid"]].append(event)
+        for thread_events in by_thread.values():
+            thread_events.sort(key=lambda event: (event["ts"], -event["dur"]))
+            open_spans: List[list] = []
+            for event in thread_events:
+                end = event["ts"] + event["dur"]
+                while open_spans and open_spans[-1][1] <= event["ts"]:
+                    open_spans.pop()
+                if open_spans:
+                    totals[open_spans[-1][0]["name"]][2] -= event["dur"]
+                stats = totals[event["name"]]
+                stats[0] += 1
+                stats[1] += event["dur"]
+                stats[2] += event["dur"]
+                open_spans.append([event, end])
+        rows = sorted(totals.items(), key=lambda item: item[1][1], reverse=True)
+        return {name: {"count": count, "total_ms": total / 1000.0, "self_ms": own / 1000.0}
+                for name, (count, total, own) in rows}
+
+    def format_summary(self, limit: int = 15) -> str:
+        """The ``summary`` as a table of the phases with the most self time"""
+        rows = sorted(self.summary().items(), key=lambda item: item[1]["self_ms"], reverse=True)
+        header = f"{'Span':<24} {'Count':>9} {'Total ms':>11} {'Self ms':>11}"
+        output = [header, "=" * len(header)]
+        for name, stats in rows[:limit]:
+            output.append(f"{name:<24} {stats['count']:>9} {stats['total_ms']:>11.3f} {stats['self_ms']:>11.3f}")
+        return "\n".join(output)
+
+    def reset(self):
+        with self._lock:
+            self.events.clear()
+            self._threads.clear()
+            self.dropped = 0
+        self._origin_ns = time.perf_counter_ns()
+
+    def get_performance_stats(self) -> Dict[str, Any]:
+        """إحصائيات التتبع"""
+        return {
+            "enabled": self.enabled,
+            "spans": len(self.events),
+            "dropped": self.dropped,
+            "phases": self.summary(),
+        }
+
+
+# المتتبع المشترك: تستخدمه المفسرات والأكوان ومحلل الاستيراد
+global_tracer = Tracer()
+
+
+def create_tracer(max_events: int = 1_000_000) -> Tracer:
+    """إنشاء متتبع مستقل"""
+    return Tracer(max_events)
@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+مخزن المسارات الزمنية لـ ND-Script
+Append-Only Trajectory Store for ND-Script time-series frames
+
+A trajectory is two files::
+
+    name.ndt      prefix magic(8) version(u32) flags(u32) header_len(u64),
+                  JSON header (field layout, chunking, compression), then
+                  frames, each aligned to FRAME_ALIGNMENT
+    name.ndt.idx  one (offset, nbytes, step) u64 triple per frame
+
+A frame starts with a FRAME_ALIGNMENT sized prefix (magic, chunk count,
+step, payload bytes). Uncompressed payloads hold every field's raw bytes,
+aligned, so frames are memory-mapped in place. Compressed payloads hold a
+table of chunk lengths followed by zlib chunks of ``chunk_rows`` rows.
+
+Frames are written before their index entry, so the index only ever
+points at complete frames and frame ``i`` is found with a single lookup.
+"""
+
+import json
+import os
+import struct
+import time
+import zlib
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from .errors import NDScriptIOError
+
+TRAJECTORY_MAGIC = b"NDSTRAJ\x00"
+TRAJECTORY_VERSION = 1
+FRAME_MAGIC = b"NDSF"
+FRAME_ALIGNMENT = 64
+
+_PREFIX = struct.Struct("<8sIIQ")
+_FRAME = struct.Struct("<4sIQQ")
+INDEX_DTYPE = np.dtype([("offset", "<u8"), ("nbytes", "<u8"), ("step", "<u8")])
+
+
+def _align(offset: int) -> int:
+    return (offset + FRAME_ALIGNMENT - 1) // FRAME_ALIGNMENT * FRAME_ALIGNMENT
+
+
+def _chunks(array: np.ndarray, chunk_rows: int) -> List[np.ndarray]:
+    """Split ``array`` into blocks of ``chunk_rows`` leading rows"""
+    if array.ndim == 0 or array.shape[0] <= chunk_rows:
+        return [array]
+    return [array[start:start + chunk_rows] for start in range(0, array.shape[0], chunk_rows)]
+
+
+def _field_offsets(fields: Dict[str, Dict[str, Any]]) -> Dict[str, int]:
+    """Offset of each raw field inside an uncompressed frame payload"""
+    offsets = {}
+    offset = 0
+    for name, spec in fields.items():
+        offsets[name] = offset
+        nbytes = int(np.prod(spec["shape"], dtype=np.int64)) * np.dtype(spec["dtype"]).itemsize
+        offset = _align(offset + nbytes)
+    return offsets
+
+
+def _read_header(path: str) -> Tuple[Dict[str, Any], int]:
+    """Trajectory header and the offset of the first frame"""
+    try:
+        with open(path, 'rb') as f:
+            prefix = f.read(_PREFIX.size)
+            if len(prefix) < _PREFIX.size:
+                raise NDScriptIOError("truncated trajectory", path)
+            magic, version, _flags, header_len = _PREFIX.unpack(prefix)
+            if magic != TRAJECTORY_MAGIC:
+                raise NDScriptIOError("not an ND-Script trajectory", path)
+            if version > TRAJECTORY_VERSION:
+                raise NDScriptIOError(f"unsupported trajectory version {version}", path)
+            header = json.loads(f.read(header_len).decode('utf-8'))
+    except OSError as e:
+        raise NDScriptIOError(str(e), path)
+    return header, _align(_PREFIX.size + header_len)
+
+
+def is_trajectory(path: str) -> bool:
+    """Check whether ``path`` starts with the trajectory magic"""
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(TRAJECTORY_MAGIC)) == TRAJECTORY_MAGIC
+    except OSError:
+        return False
+
+
+class TrajectoryWriter:
+    """Appends frames of a fixed set of fields to a trajectory"""
+
+    def __init__(self, path: str, fields: Dict[str, np.ndarray], every: int = 1,
+                 compression: int = 0, chunk_rows: int = 64, append: bool = False):
+        self.path = path
+        self.index_path = f"{path}.idx"
+        self.every = max(1, int(every))
+        self.layout = {
+            name: {"dtype": np.asarray(array).dtype.str, "shape": list(np.shape(array))}
+            for name, array in fields.items()
+        }
+        self.stats = {
+            "frames": 0,
+            "bytes_written": 0,
+            "raw_bytes": 0,
+            "write_time": 0.0,
+        }
+
+        try:
+            if append and is_trajectory(path):
+                header, _ = _read_header(path)
+                if header["fields"] != self.layout:
+                    raise NDScriptIOError("cannot append frames with a different field layout", path)
+                self.compression = header["compression"]
+                self.chunk_rows = header["chunk_rows"]
+                self._open_for_append()
+            else:
+                self.compression = compression
+                self.chunk_rows = max(1, int(chunk_rows))
+                self._create()
+        except OSError as e:
+            raise NDScriptIOError(str(e), path)
+        self._offsets = _field_offsets(self.layout)
+
+    def _create(self):
+        header = json.dumps({
+            "fields": self.layout,
+            "every": self.every,
+            "compression": self.compression,
+            "chunk_rows": self.chunk_rows,
+            "created": time.time(),
+        }, ensure_ascii=False).encode('utf-8')
+        self._data = open(self.path, 'w+b')
+        self._data.write(_PREFIX.pack(TRAJECTORY_MAGIC, TRAJECTORY_VERSION, 0, len(header)))
+        self._data.write(header)
+        self._end = _align(_PREFIX.size + len(header))
+        self._data.truncate(self._end)
+        self._index = open(self.index_path, 'w+b')
+        self._frames = 0
+
+    def _open_for_append(self):
+        _, first_frame = _read_header(self.path)
+        index = np.fromfile(self.index_path, dtype=INDEX_DTYPE) if os.path.exists(self.index_path) \
+            else np.empty(0, dtype=INDEX_DTYPE)
+        self._frames = len(index)
+        self._end = _align(int(index[-1]["offset"] + index[-1]["nbytes"])) if len(index) else first_frame
+        # Drop anything an interrupted append left past the last indexed frame
+        self._data = open(self.path, 'r+b')
+        self._data.truncate(self._end)
+        self._index = open(self.index_path, 'a+b')
+        self._index.truncate(self._frames * INDEX_DTYPE.itemsize)
+
+    def __len__(self) -> int:
+        return self._frames
+
+    def append(self, step: int, fields: Dict[str, np.ndarray]) -> int:
+        """Write one frame; returns its index"""
+        if self._data is None:
+            raise NDScriptIOError("trajectory writer is closed", self.path)
+        start_time = time.perf_counter()
+        arrays = []
+        for name, spec in self.layout.items():
+            array = np.ascontiguousarray(fields[name])
+            if array.dtype.str != spec["dtype"] or list(array.shape) != spec["shape"]:
+                raise NDScriptIOError(f"field '{name}' does not match the trajectory layout", self.path)
+            arrays.append(array)
+
+        if self.compression:
+            chunks = [zlib.compress(memoryview(chunk).cast('B'), self.compression)
+                      for array in arrays for chunk in _chunks(array, self.chunk_rows)]
+            table = np.array([len(chunk) for chunk in chunks], dtype='<u8')
+            payload = [memoryview(table).cast('B')] + chunks
+            positions = None
+        else:
+            chunks = []
+            payload = [memoryview(array).cast('B') for array in arrays]
+            positions = [self._offsets[name] for name in self.layout]
+
+        nbytes = sum(len(part) for part in payload) if positions is None else \
+            (positions[-1] + len(payload[-1]) if payload else 0)
+        offset = self._end
+        try:
+            f = self._data
+            f.seek(offset)
+            f.write(_FRAME.pack(FRAME_MAGIC, len(chunks), int(step), nbytes))
+            base = offset + FRAME_ALIGNMENT
+            if positions is None:
+                f.seek(base)
+                for part in payload:
+                    f.write(part)
+            else:
+                for position, part in zip(positions, payload):
+                    f.seek(base + position)
+                    f.write(part)
+            f.flush()
+
+            self._index.write(np.array([(offset, FRAME_ALIGNMENT + nbytes, int(step))],
+                                       dtype=INDEX_DTYPE).tobytes())
+            self._index.flush()
+        except OSError as e:
+            raise NDScriptIOError(str(e), self.path)
+
+        self._end = _align(offset + FRAME_ALIGNMENT + nbytes)
+        self._frames += 1
+        self.stats["frames"] += 1
+        self.stats["bytes_written"] += FRAME_ALIGNMENT + nbytes
+        self.stats["raw_bytes"] += sum(array.nbytes for array in arrays)
+        self.stats["write_time"] += time.perf_counter() - start_time
+        return self._frames - 1
+
+    def close(self):
+        """Flush and close both files"""
+        if self._data is not None:
+            self._data.close()
+            self._index.close()
+            self._data = self._index = None
+
+    def get_performance_stats(self) -> Dict[str, Any]:
+        """إحصائيات الكتابة"""
+        frames = self.stats["frames"]
+        raw = self.stats["raw_bytes"]
+        return {
+            **self.stats,
+            "path": self.path,
+            "every": self.every,
+            "compression": self.compression,
+            "compression_ratio": raw / self.stats["bytes_written"] if self.stats["bytes_written"] else 0.0,
+            "avg_write_time": self.stats["write_time"] / frames if frames else 0.0,
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class Trajectory:
+    """Random-access, streaming reader of a trajectory"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.index_path = f"{path}.idx"
+        self.header, _ = _read_header(path)
+        self.fields: Dict[str, Dict[str, Any]] = self.header["fields"]
+        self.compressed = bool(self.header["compression"])
+        self._offsets = _field_offsets(self.fields)
+        self.refresh()
+
+    def refresh(self):
+        """Pick up frames appended since the index was last read"""
+        try:
+            size = os.path.getsize(self.index_path)
+        except OSError:
+            size = 0
+        count = size // INDEX_DTYPE.itemsize
+        if count:
+            self.index = np.memmap(self.index_path, dtype=INDEX_DTYPE, mode='r', shape=(count,))
+        else:
+            self.index = np.empty(0, dtype=INDEX_DTYPE)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    @property
+    def steps(self) -> np.ndarray:
+        """Universe step of every frame"""
+        return np.asarray(self.index["step"], dtype=np.int64)
+
+    def frame(self, i: int, fields: Optional[List[str]] = None,
+              mmap: bool = True) -> Dict[str, np.ndarray]:
+        """Fields of frame ``i``; uncompressed frames are read-only memory maps"""
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(f"trajectory has {len(self)} frames, got index {i}")
+        offset = int(self.index[i]["offset"])
+        names = list(self.fields) if fields is None else fields
+        base = offset + FRAME_ALIGNMENT
+
+        if not self.compressed:
+            result = {}
+            for name in names:
+                spec = self.fields[name]
+                dtype = np.dtype(spec["dtype"])
+                shape = tuple(spec["shape"])
+                if mmap:
+                    result[name] = np.memmap(self.path, dtype=dtype, mode='r',
+                                             offset=base + self._offsets[name], shape=shape)
+                else:
+                    with open(self.path, 'rb') as f:
+                        f.seek(base + self._offsets[name])
+                        count = int(np.prod(shape, dtype=np.int64))
+                        result[name] = np.fromfile(f, dtype=dtype, count=count).reshape(shape)
+            return result
+
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            magic, chunk_count, _step, nbytes = _FRAME.unpack(f.read(_FRAME.size))
+            if magic != FRAME_MAGIC:
+                raise NDScriptIOError(f"corrupt frame {i}", self.path)
+            f.seek(base)
+            payload = memoryview(f.read(nbytes))
+
+        lengths = np.frombuffer(payload[:chunk_count * 8], dtype='<u8')
+        position = chunk_count * 8
+        chunk = 0
+        result = {}
+        for name, spec in self.fields.items():
+            array = np.empty(tuple(spec["shape"]), dtype=np.dtype(spec["dtype"]))
+            for target in _chunks(array, self.header["chunk_rows"]):
+                length = int(lengths[chunk])
+                if name in names:
+                    raw = zlib.decompress(payload[position:position + length])
+                    target[...] = np.frombuffer(raw, dtype=array.dtype).reshape(target.shape)
+                position += length
+                chunk += 1
+            if name in names:
+                result[name] = array
+        return result
+
+    def __getitem__(self, i: int) -> Dict[str, np.ndarray]:
+        return self.frame(i)
+
+    def iter_frames(self, start: int = 0, stop: Optional[int] = None, stride: int = 1,
+                    fields: Optional[List[str]] = None) -> Iterator[Tuple[int, Dict[str, np.ndarray]]]:
+        """Stream ``(step, fields)`` pairs, one frame in memory at a time"""
+        stop = len(self) if stop is None else min(stop, len(self))
+        for i in range(start, stop, stride):
+            yield int(self.index[i]["step"]), self.frame(i, fields)
+
+    def __iter__(self):
+        return self.iter_frames()
+
+    def summary(self, field: str = "density") -> List[Dict[str, float]]:
+        """Per-frame sum, mean, min and max of ``field``, computed by streaming"""
+        rows = []
+        for step, frame in self.iter_frames(fields=[field]):
+            data = frame[field]
+            rows.append({
+                "step": step,
+                "total": float(data.sum()),
+                "mean": float(data.mean()),
+                "min": float(data.min()),
+                "max": float(data.max()),
+            })
+        return rows
+
+
+def open_trajectory(path: str) -> Trajectory:
+    """فتح مسار زمني للقراءة"""
+    return Trajectory(path)
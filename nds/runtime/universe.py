@@ -0,0 +1,965 @@
+#!/usr/bin/env python3
+"""
+الكون الكسري الكمي لـ ND-Script
+Quantum Fractal Universe for ND-Script - NumPy field simulation
+"""
+
+import math
+import threading
+import uuid
+from types import MappingProxyType
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .errors import NDScriptUniverseError
+from .tracing import global_tracer
+
+
+# المعاملات الافتراضية للكون
+DEFAULT_PARAMETERS: Dict[str, float] = {
+    "irregularity": 0.1,
+    "gravity": 0.5,
+    "collapse_threshold": 0.8,
+    "mass": 1.0,
+    "quantum_energy": 0.1,
+    "diffusion": 1.0,
+    "time_step": 0.1,
+}
+
+
+# صفوف كل كتلة ضجيج: ضجيج الكتلة في كل خطوة يعتمد على البذرة فقط
+NOISE_BLOCK_ROWS = 16
+
+
+def new_seed() -> int:
+    """Fresh 128-bit seed from OS entropy, recorded so the run can be replayed"""
+    return int(np.random.SeedSequence().entropy)
+
+
+def derive_seed(seed: int, index: int) -> int:
+    """Seed of the ``index``-th stream spawned from ``seed`` (ensemble members, threads)"""
+    return int(np.random.SeedSequence(seed, spawn_key=(index,)).generate_state(1, np.uint64)[0])
+
+
+class NoiseField:
+    """Irregularity noise that depends only on ``(seed, step, row)``.
+
+    Each block of ``NOISE_BLOCK_ROWS`` rows has its own Philox key, spawned
+    from the seed's ``SeedSequence``, and the step number is the Philox
+    counter. Any process can draw any rows of any step without shared
+    state. A run is therefore bit-identical whatever the number of slab
+    workers, and a loaded checkpoint continues the same noise.
+    """
+
+    def __init__(self, seed: int, size: int):
+        self.seed = seed
+        self.size = size
+        blocks = -(-size // NOISE_BLOCK_ROWS)
+        self._keys = [child.generate_state(2, np.uint64)
+                      for child in np.random.SeedSequence(seed).spawn(blocks)]
+        self._local = threading.local()
+
+    def _generator(self, block: int, step: int) -> np.random.Generator:
+        local = self._local
+        if not hasattr(local, "generator"):
+            local.bit_generator = np.random.Philox(key=self._keys[0])
+            local.generator = np.random.Generator(local.bit_generator)
+        # القفز مباشرة إلى عداد الخطوة: لا حالة مشتركة بين العمليات أو الخيوط
+        local.bit_generator.state = {
+            "bit_generator": "Philox",
+            "state": {"counter": np.array([0, step, 0, 0], dtype=np.uint64), "key": self._keys[block]},
+            "buffer": np.zeros(4, dtype=np.uint64),
+            "buffer_pos": 4,
+            "has_uint32": 0,
+            "uinteger": 0,
+        }
+        return local.generator
+
+    def fill(self, step: int, out: np.ndarray, start: int = 0, end: Optional[int] = None):
+        """Write the standard normal noise of rows ``[start, end)`` at ``step`` into ``out``"""
+        end = self.size if end is None else end
+        for block in range(start // NOISE_BLOCK_ROWS, (end - 1) // NOISE_BLOCK_ROWS + 1):
+            first = block * NOISE_BLOCK_ROWS
+            last = min(first + NOISE_BLOCK_ROWS, self.size)
+            generator = self._generator(block, step)
+            if start <= first and last <= end:
+                generator.standard_normal(out=out[first - start:last - start])
+            else:
+                # كتلة على حافة الشريحة: تُسحب كاملة ويُنسخ الجزء المطلوب
+                rows = generator.standard_normal((last - first, self.size))
+                low, high = max(first, start), min(last, end)
+                out[low - start:high - start] = rows[low - first:high - first]
+
+
+def step_kernel(padded: np.ndarray, out: np.ndarray, parameters: Dict[str, float],
+                noise: Optional[np.ndarray] = None) -> None:
+    """Advance a block of rows by one step.
+
+    ``padded`` holds the block plus one halo row above and below it; the
+    result for the interior rows is written into ``out``. The same kernel
+    drives the whole grid and every slab of a decomposed run, so a block
+    only ever needs its two neighbouring rows.
+
+    The grid is the last two axes: a batch of universes is stacked in
+    front, with parameters given as arrays that broadcast over it.
+    """
+    dt = parameters["time_step"]
+    center = padded[..., 1:-1, :]
+
+    laplacian = padded[..., :-2, :] + padded[..., 2:, :] - 4.0 * center
+    laplacian += np.roll(center, 1, axis=-1)
+    laplacian += np.roll(center, -1, axis=-1)
+
+    # انتشار + تكتل جاذبي مشبع عند الكثافة 1
+    clumping = parameters["gravity"] * center * (1.0 - center) * np.tanh(-laplacian)
+    np.multiply(laplacian, parameters["diffusion"], out=out)
+    out += clumping
+    out *= dt
+    out += center
+
+    if noise is not None and np.any(parameters["irregularity"] > 0):
+        out += (parameters["irregularity"] * np.sqrt(dt)) * noise
+
+    np.clip(out, 0.0, None, out=out)
+
+
+def field_reductions(block: np.ndarray, next_row: np.ndarray) -> Dict[str, float]:
+    """Sum, sum of squares, extrema and gradient energy of a block of rows.
+
+    ``next_row`` is the (periodic) row after the block, so slabs of a
+    decomposed grid reduce independently and combine exactly.
+    """
+    grad_x = np.empty_like(block)
+    np.subtract(block[1:], block[:-1], out=grad_x[:-1])
+    np.subtract(next_row, block[-1], out=grad_x[-1])
+    grad_y = np.roll(block, -1, axis=1) - block
+    return {
+        "count": block.size,
+        "sum": float(block.sum()),
+        "sum_sq": float(np.vdot(block, block)),
+        "min": float(block.min()),
+        "max": float(block.max()),
+        "gradient": 0.5 * (float(np.vdot(grad_x, grad_x)) + float(np.vdot(grad_y, grad_y))),
+    }
+
+
+def combine_reductions(parts) -> Dict[str, float]:
+    """Merge ``field_reductions`` of disjoint blocks"""
+    parts = list(parts)
+    return {
+        "count": sum(p["count"] for p in parts),
+        "sum": sum(p["sum"] for p in parts),
+        "sum_sq": sum(p["sum_sq"] for p in parts),
+        "min": min(p["min"] for p in parts),
+        "max": max(p["max"] for p in parts),
+        "gradient": sum(p["gradient"] for p in parts),
+    }
+
+
+def field_energy(reductions: Dict[str, float], parameters: Dict[str, float]) -> float:
+    """Gradient + quantum - gravitational energy from ``field_reductions``"""
+    quantum = parameters["quantum_energy"] * reductions["sum"]
+    gravitational = 0.5 * parameters["gravity"] * reductions["sum_sq"]
+    return reductions["gradient"] + quantum - gravitational
+
+
+def reduction_statistics(reductions: Dict[str, float], parameters: Dict[str, float]) -> Dict[str, float]:
+    """Mass, energy, mean/variance and extrema from ``field_reductions``"""
+    mean = reductions["sum"] / reductions["count"]
+    variance = max(reductions["sum_sq"] / reductions["count"] - mean * mean, 0.0)
+    return {
+        "total_mass": reductions["sum"],
+        "energy": field_energy(reductions, parameters),
+        "mean": mean,
+        "variance": variance,
+        "std": math.sqrt(variance),
+        "min": reductions["min"],
+        "max": reductions["max"],
+    }
+
+
+class UniverseSnapshot:
+    """Immutable state of a universe at one version.
+
+    The fields are read-only arrays shared with the universe, which writes
+    its next step into a fresh array instead (copy-on-write). Taking a
+    snapshot therefore copies nothing, and any number of threads may read
+    one without locking.
+    """
+
+    def __init__(self, version: int, metadata: Dict[str, Any], fields: Dict[str, np.ndarray]):
+        self.version = version
+        self._metadata = metadata
+        views = {}
+        for name, array in fields.items():
+            views[name] = array.view()
+            views[name].flags.writeable = False
+        self.fields = MappingProxyType(views)
+        self.parameters = MappingProxyType(dict(metadata.get("parameters", {})))
+        # يحسب مرة واحدة؛ سباق الخيوط هنا غير ضار (نفس النتيجة)
+        self._statistics: Optional[Dict[str, float]] = None
+
+    @property
+    def size(self) -> int:
+        return self._metadata["size"]
+
+    @property
+    def evolution_steps(self) -> int:
+        return self._metadata["evolution_steps"]
+
+    @property
+    def seed(self) -> Optional[int]:
+        return self._metadata.get("seed")
+
+    @property
+    def state(self) -> str:
+        return self._metadata.get("state", "initialized")
+
+    @property
+    def density(self) -> Optional[np.ndarray]:
+        return self.fields.get("density")
+
+    def get_metadata(self) -> Dict[str, Any]:
+        return {**self._metadata, "parameters": dict(self.parameters)}
+
+    def get_fields(self) -> Dict[str, np.ndarray]:
+        return dict(self.fields)
+
+    def get_statistics(self) -> Dict[str, float]:
+        """Same as ``QuantumFractalUniverse.get_statistics``, computed once per snapshot"""
+        if self._statistics is None and self.density is not None:
+            density = self.density
+            self._statistics = reduction_statistics(field_reductions(density, density[0]), self.parameters)
+        return dict(self._statistics or {})
+
+    def total_mass(self) -> float:
+        return self.get_statistics().get("total_mass", 0.0)
+
+    def get_state(self) -> Dict[str, Any]:
+        state = self.get_metadata()
+        state["density"] = self.density.tolist() if self.density is not None else None
+        return state
+
+    def copy(self) -> 'QuantumFractalUniverse':
+        """Writable single-process universe starting from this snapshot"""
+        universe = QuantumFractalUniverse()
+        fields = {name: np.array(array) for name, array in self.fields.items()}
+        universe.set_state({**self.get_metadata(), "workers": 1}, fields=fields)
+        return universe
+
+    def __repr__(self):
+        return f"UniverseSnapshot(version={self.version}, size={self.size}, steps={self.evolution_steps})"
+
+
+class QuantumFractalUniverse:
+    """Two-dimensional density field evolved by a local stencil kernel"""
+
+    def __init__(self):
+        self.size = 0
+        self.parameters: Dict[str, float] = dict(DEFAULT_PARAMETERS)
+        self.density: Optional[np.ndarray] = None
+        self.evolution_steps = 0
+        self.state = "uninitialized"
+        self.seed: Optional[int] = None
+        self.workers = 1
+        self._noise: Optional[NoiseField] = None
+        self._padded: Optional[np.ndarray] = None
+        self._decomposition = None
+        # عداد التعديل: يتيح لنقاط الحفظ التفاضلية تخطي الحقول غير المتغيرة
+        self._instance = uuid.uuid4().hex
+        self._field_version = 0
+        # seeded: الحقل الابتدائي مرسوم من بذرة معطاة لا من الإنتروبيا
+        self.seeded = False
+        self._initial_version = -1
+        # الحقل الحالي مشترك مع لقطة: الخطوة التالية تكتب في مصفوفة جديدة
+        self._shared = False
+        self._recorder = None
+        self.recording_path: Optional[str] = None
+        self.observers: List[Any] = []
+        self.standard_observers: Dict[str, Any] = {}
+        self.collapse_detector = None
+        # اختزالات مخزنة، صالحة ما دام _field_version لم يتغير
+        self._reductions: Optional[Dict[str, float]] = None
+        self._reductions_version = -1
+        self._track_reductions = False
+        self._snapshot: Optional[UniverseSnapshot] = None
+
+    def initialize(self, size: int = 100, seed: Optional[int] = None, **kwargs):
+        """Create a fresh ``size`` x ``size`` density field"""
+        size = int(size)
+        if size < 3:
+            raise NDScriptUniverseError(f"Universe size must be at least 3, got {size}")
+
+        self._shutdown_workers()
+        self.stop_recording()
+        self.size = size
+        # بذرة محفوظة دائماً، حتى تُعاد أي محاكاة من نقطة حفظ
+        self.seed = new_seed() if seed is None else int(seed)
+        self.evolution_steps = 0
+        for name, value in kwargs.items():
+            self.set_parameter(name, value)
+
+        self.seeded = seed is not None
+        self._draw_field()
+        self.state = "initialized"
+
+        if self.workers > 1:
+            self._configure_workers(self.workers)
+        return self
+
+    def _draw_field(self):
+        """Draw the initial field and noise stream from ``self.seed``"""
+        self._noise = NoiseField(self.seed, self.size)
+        density = 0.5 + 0.1 * np.random.default_rng(self.seed).standard_normal((self.size, self.size))
+        np.clip(density, 0.0, 1.0, out=density)
+        self.density = density * self.parameters["mass"]
+        self._padded = None
+        self._shared = False
+        self._field_version += 1
+        self._initial_version = self._field_version
+
+    def _untouched(self) -> bool:
+        """True while the field is still the one drawn by ``initialize``"""
+        return (self.density is not None and self.evolution_steps == 0
+                and self._field_version == self._initial_version)
+
+    def set_parameter(self, param: str, value: Any):
+        """Set a physics parameter, ``workers`` for the domain decomposition,
+        ``observe`` to attach the standard observers every N steps,
+        ``collapse_events`` to queue collapse events every N steps (0 detaches),
+        or ``seed`` to draw the noise of later steps from a new seed.
+
+        Before the first step ``seed`` also redraws the initial field, so the
+        run matches one initialized with that seed.
+        """
+        if param == "seed":
+            if self._untouched():
+                self._shutdown_workers()
+                self.seed = int(value)
+                self._draw_field()
+                self.seeded = True
+                if self.workers > 1:
+                    self._configure_workers(self.workers)
+            else:
+                self.reseed(int(value))
+            return self.seed
+        if param == "workers":
+            workers = max(1, int(value))
+            if self.density is not None:
+                self._configure_workers(workers)
+            self.workers = workers
+            return workers
+        if param == "observe":
+            return self._configure_observers(int(value))
+        if param == "collapse_events":
+            return self._configure_collapse_detector(int(value))
+
+        try:
+            self.parameters[param] = float(value)
+        except (TypeError, ValueError):
+            raise NDScriptUniverseError(f"Parameter '{param}' must be numeric, got {value!r}")
+        return self.parameters[param]
+
+    def evolve(self, steps: int = 1) -> int:
+        """Advance the universe by ``steps`` kernel steps"""
+        if self.density is None:
+            raise NDScriptUniverseError("Universe not initialized")
+        steps = int(steps)
+        if steps <= 0:
+            return 0
+
+        hooks = self._step_hooks()
+        remaining = steps
+        with global_tracer.span("evolve", category="universe", steps=steps, size=self.size,
+                                workers=self._decomposition.workers if self._decomposition else 1):
+            while remaining:
+                # Stop at every step a hook wants to see
+                chunk = remaining
+                for every, _hook in hooks:
+                    chunk = min(chunk, every - self.evolution_steps % every)
+                self._advance(chunk)
+                remaining -= chunk
+                if hooks:
+                    with global_tracer.span("step_hooks", category="universe", hooks=len(hooks)):
+                        fields = self.get_fields()
+                        for every, hook in hooks:
+                            if self.evolution_steps % every == 0:
+                                hook(self.evolution_steps, fields)
+
+        self.state = "evolving"
+        return steps
+
+    def _step_hooks(self) -> List[Tuple[int, Callable[[int, Dict[str, np.ndarray]], Any]]]:
+        """``(every, hook)`` pairs called with ``(step, fields)`` during evolve"""
+        self.observers = [o for o in self.observers if getattr(o, 'active', True)]
+        hooks = [(observer.every, observer) for observer in self.observers]
+        if self._recorder is not None:
+            hooks.append((self._recorder.every, self._recorder.append))
+        return hooks
+
+    def _advance(self, steps: int):
+        if self._decomposition is not None:
+            # Slab workers reduce their rows right after the last step
+            with global_tracer.span("steps", category="universe", first=self.evolution_steps, steps=steps):
+                self.density = self._decomposition.run(steps, self.parameters,
+                                                       reduce=self._track_reductions,
+                                                       first_step=self.evolution_steps)
+        else:
+            self._evolve_serial(steps)
+        self.evolution_steps += steps
+        self._field_version += 1
+        if self._decomposition is not None and self._decomposition.reductions is not None:
+            self._reductions = self._decomposition.reductions
+            self._reductions_version = self._field_version
+
+    def _evolve_serial(self, steps: int):
+        """Single-process evolution using a periodic halo around the grid"""
+        size = self.size
+        if self._padded is None or self._padded.shape != (size + 2, size):
+            self._padded = np.empty((size + 2, size))
+        padded = self._padded
+        noise = np.empty((size, size)) if self.parameters["irregularity"] > 0 else None
+
+        for step in range(self.evolution_steps, self.evolution_steps + steps):
+            with global_tracer.span("step", category="universe", step=step):
+                padded[1:-1] = self.density
+                padded[0] = self.density[-1]
+                padded[-1] = self.density[0]
+                if noise is not None:
+                    self._noise.fill(step, noise)
+                if self._shared:
+                    # copy-on-write: the snapshot keeps the old array
+                    self.density = np.empty((size, size))
+                    self._shared = False
+                step_kernel(padded, self.density, self.parameters, noise)
+
+    def _configure_workers(self, workers: int):
+        """Attach (or detach) the shared-memory slab decomposition"""
+        self._shutdown_workers()
+        workers = min(workers, self.size)
+        if workers <= 1:
+            return
+
+        from .domain_decomposition import SlabDecomposition
+        self._decomposition = SlabDecomposition(self.size, workers, seed=self.seed)
+        self.density = self._decomposition.load(self.density)
+
+    def _shutdown_workers(self):
+        """Stop worker processes and copy the field back to private memory"""
+        if self._decomposition is not None:
+            if self.density is not None:
+                self.density = np.array(self.density)
+            self._decomposition.close()
+            self._decomposition = None
+
+    def _configure_observers(self, every: int) -> int:
+        from .observers import create_standard_observers
+        for observer in self.standard_observers.values():
+            self.remove_observer(observer)
+        self.standard_observers = {}
+        if every > 0:
+            self.standard_observers = create_standard_observers(every)
+            for observer in self.standard_observers.values():
+                self.add_observer(observer)
+        return max(every, 0)
+
+    def _configure_collapse_detector(self, every: int) -> int:
+        from .events import CollapseDetector
+        if self.collapse_detector is not None:
+            self.remove_observer(self.collapse_detector)
+            self.collapse_detector = None
+        if every > 0:
+            self.collapse_detector = CollapseDetector(self.parameters, every)
+            self.add_observer(self.collapse_detector)
+        return max(every, 0)
+
+    def add_observer(self, observer):
+        """Call ``observer(step, fields)`` after every ``observer.every``-th step"""
+        self.observers.append(observer)
+        return observer
+
+    def on_step(self, callback, every: int = 1, downsample: int = 1):
+        """Call ``callback(step, fields)`` every ``every`` steps with read-only
+        views of the fields, strided by ``downsample``; returns a subscription
+        with ``cancel()``"""
+        from .observers import StepSubscription
+        return self.add_observer(StepSubscription(callback, every, downsample))
+
+    def remove_observer(self, observer):
+        """Detach an observer added with ``add_observer``"""
+        if observer in self.observers:
+            self.observers.remove(observer)
+
+    def record(self, path: str, every: int = 1, compression: int = 0, append: bool = False):
+        """Append a trajectory frame to ``path`` after every ``every``-th step"""
+        if self.density is None:
+            raise NDScriptUniverseError("Universe not initialized")
+        from .trajectory import TrajectoryWriter
+        self.stop_recording()
+        self._recorder = TrajectoryWriter(path, self.get_fields(), every=every,
+                                          compression=compression, append=append)
+        self.recording_path = path
+        return self._recorder
+
+    def stop_recording(self) -> int:
+        """Close the trajectory being recorded; returns its frame count"""
+        if self._recorder is None:
+            return 0
+        frames = len(self._recorder)
+        self._recorder.close()
+        self._recorder = None
+        return frames
+
+    def close(self):
+        """Release worker processes, shared memory and the trajectory"""
+        self.stop_recording()
+        self._shutdown_workers()
+
+    def _get_reductions(self) -> Dict[str, float]:
+        """Field reductions, recomputed only after the field changed"""
+        if self._reductions is None or self._reductions_version != self._field_version:
+            self._reductions = field_reductions(self.density, self.density[0])
+            self._reductions_version = self._field_version
+        return self._reductions
+
+    def _energy(self, reductions: Dict[str, float]) -> float:
+        return field_energy(reductions, self.parameters)
+
+    def total_mass(self) -> float:
+        """Sum of the density field"""
+        return self._get_reductions()["sum"] if self.density is not None else 0.0
+
+    def total_energy(self) -> float:
+        """Gradient + quantum - gravitational energy of the field"""
+        if self.density is None:
+            return 0.0
+        return self._energy(self._get_reductions())
+
+    def get_statistics(self) -> Dict[str, float]:
+        """Mass, energy, mean/variance and extrema of the density field.
+
+        Reductions are cached until the next evolve or load, and energy is
+        derived from them, so repeated calls between steps are O(1). Once
+        statistics are asked for, decomposed runs keep them up to date from
+        the slab workers.
+        """
+        if self.density is None:
+            return {}
+        self._track_reductions = True
+        return reduction_statistics(self._get_reductions(), self.parameters)
+
+    def show_state(self):
+        """Print a short summary of the universe"""
+        print("Universe state:")
+        print(f"  Size: {self.size}x{self.size}")
+        print(f"  Evolution steps: {self.evolution_steps}")
+        print(f"  Workers: {self.workers}")
+        print(f"  Parameters: {self.parameters}")
+        print(f"  Total mass: {self.total_mass():.6f}")
+        print(f"  State: {self.state}")
+
+    def get_metadata(self) -> Dict[str, Any]:
+        """Scalar state of the universe, without field data"""
+        return {
+            "size": self.size,
+            "evolution_steps": self.evolution_steps,
+            "parameters": dict(self.parameters),
+            "state": self.state,
+            "seed": self.seed,
+            "workers": self.workers,
+        }
+
+    def get_fields(self) -> Dict[str, np.ndarray]:
+        """Field arrays of the universe, keyed by name"""
+        if self.density is None:
+            return {}
+        return {"density": self.density}
+
+    def snapshot_fields(self) -> Dict[str, np.ndarray]:
+        """Fields frozen as of now, for a writer that outlives this step.
+
+        Single-process fields are not copied: the next evolve writes into a
+        fresh array instead. Shared-memory fields are double-buffered by the
+        workers, so they are copied.
+        """
+        if self.density is None:
+            return {}
+        if self._decomposition is not None:
+            return {"density": np.array(self.density)}
+        self._shared = True
+        return {"density": self.density}
+
+    def snapshot(self) -> UniverseSnapshot:
+        """Immutable, versioned view of the current state.
+
+        Snapshots are reused until the field, the parameters or the step
+        count change, so publishing one after every write is cheap.
+        """
+        metadata = self.get_metadata()
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == self._field_version and snapshot._metadata == metadata:
+            return snapshot
+        snapshot = UniverseSnapshot(self._field_version, metadata, self.snapshot_fields())
+        if self._reductions is not None and self._reductions_version == self._field_version:
+            snapshot._statistics = reduction_statistics(self._reductions, self.parameters)
+        self._snapshot = snapshot
+        return snapshot
+
+    def get_field_versions(self) -> Dict[str, str]:
+        """Tokens that change whenever the matching field is modified"""
+        token = f"{self._instance}:{self._field_version}"
+        return {name: token for name in self.get_fields()}
+
+    def get_state(self) -> Dict[str, Any]:
+        """JSON-friendly snapshot of the universe"""
+        state = self.get_metadata()
+        state["density"] = self.density.tolist() if self.density is not None else None
+        return state
+
+    def set_state(self, state: Dict[str, Any], fields: Optional[Dict[str, np.ndarray]] = None):
+        """Restore a snapshot from ``get_state``, or ``get_metadata`` plus ``fields``.
+
+        Arrays in ``fields`` are adopted as-is, so a memory-mapped field is
+        only paged in as the simulation touches it.
+        """
+        self._shutdown_workers()
+        self.size = int(state.get("size", self.size))
+        self.evolution_steps = int(state.get("evolution_steps", 0))
+        self.parameters.update(state.get("parameters", {}))
+        self.state = state.get("state", "initialized")
+        seed = state.get("seed")
+        self.seed = new_seed() if seed is None else int(seed)
+        self._noise = NoiseField(self.seed, self.size)
+        self._padded = None
+        self._shared = False
+        if fields and "density" in fields:
+            self.density = fields["density"]
+        elif state.get("density") is not None:
+            self.density = np.asarray(state["density"], dtype=np.float64).reshape(self.size, self.size)
+        self._field_version += 1
+
+        workers = int(state.get("workers", self.workers))
+        self.workers = workers
+        if workers > 1 and self.density is not None:
+            self._configure_workers(workers)
+
+    def copy(self) -> 'QuantumFractalUniverse':
+        """Independent single-process copy of the universe"""
+        clone = QuantumFractalUniverse()
+        clone.size = self.size
+        clone.parameters = dict(self.parameters)
+        clone.density = np.array(self.density) if self.density is not None else None
+        clone.evolution_steps = self.evolution_steps
+        clone.state = self.state
+        clone.seed = self.seed
+        clone.seeded = self.seeded
+        clone._noise = self._noise
+        return clone
+
+    def spawn(self, index: int) -> 'QuantumFractalUniverse':
+        """Copy with its own noise stream, the ``index``-th spawned from this seed"""
+        clone = self.copy()
+        clone.reseed(derive_seed(self.seed, index))
+        return clone
+
+    def reseed(self, seed: int):
+        """Draw future noise from ``seed``; the current field is kept"""
+        self.seed = int(seed)
+        if self.size:
+            self._noise = NoiseField(self.seed, self.size)
+        if self._decomposition is not None:
+            self._configure_workers(self.workers)
+
+    def __del__(self):
+        try:
+            self.stop_recording()
+            self._shutdown_workers()
+        except Exception:
+            pass
+
+    def __repr__(self):
+        return f"QuantumFractalUniverse(size={self.size}, steps={self.evolution_steps}, workers={self.workers})"
+
+
+class BatchedUniverse:
+    """``batch`` independent universes stacked along a leading axis.
+
+    Every member has its own parameter values and noise stream; ``evolve``
+    advances all of them with one vectorized kernel call per step. A member
+    seeded like a ``QuantumFractalUniverse`` with the same parameters
+    evolves identically to it.
+    """
+
+    def __init__(self, batch: int):
+        batch = int(batch)
+        if batch < 1:
+            raise NDScriptUniverseError(f"Batch size must be at least 1, got {batch}")
+        self.batch = batch
+        self.size = 0
+        self.parameters: Dict[str, np.ndarray] = {
+            name: np.full(batch, value) for name, value in DEFAULT_PARAMETERS.items()
+        }
+        self.density: Optional[np.ndarray] = None
+        self.evolution_steps = 0
+        self.state = "uninitialized"
+        self.seeds: List[Optional[int]] = [None] * batch
+        self._noise: List[NoiseField] = []
+        self._padded: Optional[np.ndarray] = None
+        self._instance = uuid.uuid4().hex
+        self._field_version = 0
+        self.seeded = False
+        self._initial_version = -1
+        self._statistics: Optional[Dict[str, np.ndarray]] = None
+        self._statistics_version = -1
+
+    @classmethod
+    def from_universe(cls, universe, batch: int, seeds: Optional[List[Optional[int]]] = None,
+                      streams: Optional[List[int]] = None, **parameters) -> 'BatchedUniverse':
+        """Batch with the size and parameters of ``universe``; keyword
+        arguments override parameters per member.
+
+        With ``seeds``, every member is initialized afresh from its seed.
+        Otherwise every member starts from a copy of ``universe``'s field
+        and draws noise from a stream spawned from its seed: member ``i``
+        uses stream ``streams[i]`` (default ``i``).
+        """
+        batched = cls(batch)
+        for name, value in getattr(universe, "parameters", {}).items():
+            batched.set_parameter(name, value)
+        size = getattr(universe, "size", 100) or 100
+        if seeds is not None or getattr(universe, "density", None) is None:
+            return batched.initialize(size=size, seeds=seeds, **parameters)
+
+        for name, value in parameters.items():
+            batched.set_parameter(name, value)
+        seed = getattr(universe, "seed", None)
+        seed = new_seed() if seed is None else seed
+        streams = list(range(batched.batch)) if streams is None else streams
+        batched.size = size
+        batched.seeds = [derive_seed(seed, stream) for stream in streams]
+        batched._noise = [NoiseField(member_seed, size) for member_seed in batched.seeds]
+        batched.density = np.repeat(np.asarray(universe.density)[None], batched.batch, axis=0)
+        batched.evolution_steps = getattr(universe, "evolution_steps", 0)
+        batched.seeded = getattr(universe, "seeded", False)
+        batched.state = getattr(universe, "state", "initialized")
+        batched._field_version += 1
+        return batched
+
+    def initialize(self, size: int = 100, seeds: Optional[List[Optional[int]]] = None, **kwargs):
+        """Create ``batch`` fresh ``size`` x ``size`` fields, one seed per member"""
+        size = int(size)
+        if size < 3:
+            raise NDScriptUniverseError(f"Universe size must be at least 3, got {size}")
+        if seeds is not None and len(seeds) != self.batch:
+            raise NDScriptUniverseError(f"Expected {self.batch} seeds, got {len(seeds)}")
+
+        self.size = size
+        self.evolution_steps = 0
+        for name, value in kwargs.items():
+            self.set_parameter(name, value)
+        if seeds is not None:
+            self.seeds = [None if seed is None else int(seed) for seed in seeds]
+        self.seeded = all(seed is not None for seed in self.seeds)
+        self.seeds = [new_seed() if seed is None else seed for seed in self.seeds]
+        self._draw_fields()
+        self.state = "initialized"
+        return self
+
+    def _draw_fields(self):
+        """Draw every member's initial field and noise stream from ``self.seeds``"""
+        # نفس تسلسل التهيئة لكل عضو كما في الكون المفرد
+        self._noise = [NoiseField(seed, self.size) for seed in self.seeds]
+        density = np.empty((self.batch, self.size, self.size))
+        for member, seed in enumerate(self.seeds):
+            density[member] = 0.5 + 0.1 * np.random.default_rng(seed).standard_normal((self.size, self.size))
+        np.clip(density, 0.0, 1.0, out=density)
+        density *= self.parameters["mass"][:, None, None]
+        self.density = density
+        self._padded = None
+        self._field_version += 1
+        self._initial_version = self._field_version
+
+    def set_parameter(self, param: str, value: Any):
+        """Set a parameter for every member, or per member from a sequence of ``batch`` values.
+
+        ``seed`` reseeds member ``i`` with the ``i``-th stream spawned from it,
+        redrawing the initial fields before the first step.
+        """
+        if param == "seed":
+            seed = int(value)
+            self.seeds = [derive_seed(seed, member) for member in range(self.batch)]
+            if (self.density is not None and self.evolution_steps == 0
+                    and self._field_version == self._initial_version):
+                self._draw_fields()
+                self.seeded = True
+            elif self.size:
+                self._noise = [NoiseField(member_seed, self.size) for member_seed in self.seeds]
+            return seed
+        if param in ("workers", "observe", "batch", "collapse_events"):
+            raise NDScriptUniverseError(f"Parameter '{param}' is not supported by a batched universe")
+        try:
+            values = np.asarray(value, dtype=np.float64)
+        except (TypeError, ValueError):
+            raise NDScriptUniverseError(f"Parameter '{param}' must be numeric, got {value!r}")
+        if values.ndim == 0:
+            values = np.full(self.batch, float(values))
+        elif values.shape != (self.batch,):
+            raise NDScriptUniverseError(f"Parameter '{param}' needs 1 or {self.batch} values, got {values.size}")
+        self.parameters[param] = values.copy()
+        return values
+
+    def evolve(self, steps: int = 1) -> int:
+        """Advance every member by ``steps`` kernel steps"""
+        if self.density is None:
+            raise NDScriptUniverseError("Universe not initialized")
+        steps = int(steps)
+        if steps <= 0:
+            return 0
+
+        batch, size = self.batch, self.size
+        if self._padded is None or self._padded.shape != (batch, size + 2, size):
+            self._padded = np.empty((batch, size + 2, size))
+        padded = self._padded
+        parameters = {name: values[:, None, None] for name, values in self.parameters.items()}
+        # الضجيج يُسحب فقط للأعضاء غير المنتظمين
+        irregular = np.flatnonzero(self.parameters["irregularity"] > 0)
+        noise = np.zeros((batch, size, size)) if irregular.size else None
+
+        for step in range(self.evolution_steps, self.evolution_steps + steps):
+            with global_tracer.span("step", category="universe", step=step, batch=batch):
+                padded[:, 1:-1] = self.density
+                padded[:, 0] = self.density[:, -1]
+                padded[:, -1] = self.density[:, 0]
+                for member in irregular:
+                    self._noise[member].fill(step, noise[member])
+                step_kernel(padded, self.density, parameters, noise)
+
+        self.evolution_steps += steps
+        self._field_version += 1
+        self.state = "evolving"
+        return steps
+
+    def get_batch_statistics(self) -> Dict[str, np.ndarray]:
+        """Per-member mass, energy, mean/variance and extrema, as arrays of length ``batch``"""
+        if self.density is None:
+            return {}
+        if self._statistics is not None and self._statistics_version == self._field_version:
+            return self._statistics
+
+        density = self.density
+        count = self.size * self.size
+        sums = density.sum(axis=(1, 2))
+        sum_sq = np.einsum("bij,bij->b", density, density)
+        grad_x = np.roll(density, -1, axis=1) - density
+        grad_y = np.roll(density, -1, axis=2) - density
+        gradient = 0.5 * (np.einsum("bij,bij->b", grad_x, grad_x) + np.einsum("bij,bij->b", grad_y, grad_y))
+        mean = sums / count
+        variance = np.maximum(sum_sq / count - mean * mean, 0.0)
+        self._statistics = {
+            "total_mass": sums,
+            "energy": gradient + self.parameters["quantum_energy"] * sums
+                      - 0.5 * self.parameters["gravity"] * sum_sq,
+            "mean": mean,
+            "variance": variance,
+            "std": np.sqrt(variance),
+            "min": density.min(axis=(1, 2)),
+            "max": density.max(axis=(1, 2)),
+        }
+        self._statistics_version = self._field_version
+        return self._statistics
+
+    def get_statistics(self) -> Dict[str, float]:
+        """Statistics averaged over the members; extrema over the whole batch"""
+        statistics = self.get_batch_statistics()
+        if not statistics:
+            return {}
+        summary = {name: float(values.mean()) for name, values in statistics.items()}
+        summary["min"] = float(statistics["min"].min())
+        summary["max"] = float(statistics["max"].max())
+        return summary
+
+    def total_mass(self) -> np.ndarray:
+        """Sum of each member's density field"""
+        return self.get_batch_statistics()["total_mass"] if self.density is not None else np.zeros(self.batch)
+
+    def member(self, index: int) -> QuantumFractalUniverse:
+        """Independent ``QuantumFractalUniverse`` copy of one member"""
+        universe = QuantumFractalUniverse()
+        universe.size = self.size
+        universe.parameters = {name: float(values[index]) for name, values in self.parameters.items()}
+        universe.density = np.array(self.density[index]) if self.density is not None else None
+        universe.evolution_steps = self.evolution_steps
+        universe.state = self.state
+        universe.seed = self.seeds[index]
+        universe._noise = self._noise[index] if self._noise else None
+        return universe
+
+    def show_state(self):
+        """Print a short summary of the batch"""
+        print("Universe state:")
+        print(f"  Batch: {self.batch} x {self.size}x{self.size}")
+        print(f"  Evolution steps: {self.evolution_steps}")
+        print(f"  Parameters: {self._parameter_summary()}")
+        if self.density is not None:
+            masses = self.total_mass()
+            print(f"  Total mass: {masses.min():.6f} .. {masses.max():.6f}")
+        print(f"  State: {self.state}")
+
+    def _parameter_summary(self) -> Dict[str, Any]:
+        # قيمة واحدة إذا تساوى الأعضاء، وإلا القائمة كاملة
+        return {name: float(values[0]) if np.all(values == values[0]) else values.tolist()
+                for name, values in self.parameters.items()}
+
+    def get_metadata(self) -> Dict[str, Any]:
+        """Scalar state of the batch, without field data"""
+        return {
+            "batch": self.batch,
+            "size": self.size,
+            "evolution_steps": self.evolution_steps,
+            "parameters": {name: values.tolist() for name, values in self.parameters.items()},
+            "state": self.state,
+            "seeds": list(self.seeds),
+        }
+
+    def get_fields(self) -> Dict[str, np.ndarray]:
+        """Stacked field arrays, ``(batch, size, size)``"""
+        if self.density is None:
+            return {}
+        return {"density": self.density}
+
+    def get_field_versions(self) -> Dict[str, str]:
+        """Tokens that change whenever the matching field is modified"""
+        token = f"{self._instance}:{self._field_version}"
+        return {name: token for name in self.get_fields()}
+
+    def get_state(self) -> Dict[str, Any]:
+        """JSON-friendly snapshot of the batch"""
+        state = self.get_metadata()
+        state["density"] = self.density.tolist() if self.density is not None else None
+        return state
+
+    def set_state(self, state: Dict[str, Any], fields: Optional[Dict[str, np.ndarray]] = None):
+        """Restore a snapshot from ``get_state``, or ``get_metadata`` plus ``fields``"""
+        if int(state.get("batch", self.batch)) != self.batch:
+            raise NDScriptUniverseError(f"Snapshot holds {state.get('batch')} universes, this batch has {self.batch}")
+        self.size = int(state.get("size", self.size))
+        self.evolution_steps = int(state.get("evolution_steps", 0))
+        for name, values in state.get("parameters", {}).items():
+            self.set_parameter(name, values)
+        self.state = state.get("state", "initialized")
+        self.seeds = [new_seed() if seed is None else int(seed)
+                      for seed in state.get("seeds", [None] * self.batch)]
+        self._noise = [NoiseField(seed, self.size) for seed in self.seeds]
+        self._padded = None
+        if fields and "density" in fields:
+            self.density = fields["density"]
+        elif state.get("density") is not None:
+            self.density = np.asarray(state["density"], dtype=np.float64).reshape(self.batch, self.size, self.size)
+        self._field_version += 1
+
+    def close(self):
+        """Nothing to release: a batch always runs in this process"""
+
+    def __repr__(self):
+        return f"BatchedUniverse(batch={self.batch}, size={self.size}, steps={self.evolution_steps})"
@@ -0,0 +1,434 @@
+#!/usr/bin/env python3
+"""
+مجموعة قياس الأداء لـ ND-Script
+Benchmark Suite for ND-Script: micro and macro benchmarks, baseline comparison
+
+Micro benchmarks time single interpreter mechanisms: parsing,
+transformation, environment access, expressions, calls, loop iterations,
+bytecode against the visitor, and ``parallel for``. Each result is the
+time of one operation. Macro benchmarks run ``docs/examples/*.ndx`` and
+generated large scripts on a warmed interpreter; each result is one whole
+run.
+
+``nds bench`` runs the suite with warmup and repetitions. It can pin
+the process to one CPU. It writes JSON and compares the run with a
+saved baseline. A benchmark is a regression only when the Mann-Whitney U
+test finds the samples differ (``--alpha``) and the median moved by more
+than ``--threshold``. Scripts run with a pinned seed, so every run draws
+the same noise. A comparison whose sample counts cannot reach ``--alpha``
+even for fully separated samples is reported as ``too few`` instead.
+"""
+
+import argparse
+import contextlib
+import gc
+import io
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+# إضافة مسار nds للاستيراد
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from runtime.interpreter import NDScriptInterpreter
+from runtime.environment import GlobalEnvironment
+
+EXAMPLES_DIR = Path(__file__).parent.parent.parent / "docs" / "examples"
+CLI_PATH = Path(__file__).parent.parent / "cli" / "nds.py"
+FORMAT_VERSION = 1
+# بذرة ثابتة: كل تشغيل لنص يسحب نفس الضجيج
+BENCH_SEED = 1
+
+
+@dataclass
+class Benchmark:
+    """One benchmark: ``setup()`` returns the callable that is timed.
+
+    The callable runs ``inner`` operations; results are per operation.
+    ``repetitions`` replaces the suite default (macro runs are long) unless
+    the repetitions are given explicitly.
+    """
+    name: str
+    group: str
+    setup: Callable[[], Callable[[], Any]]
+    inner: int = 1
+    repetitions: Optional[int] = None
+    description: str = ""
+
+
+def _quiet_interpreter() -> NDScriptInterpreter:
+    with contextlib.redirect_stdout(io.StringIO()):
+        return NDScriptInterpreter(silent_mode=True)
+
+
+def _quiet(function: Callable[[], Any]) -> Callable[[], Any]:
+    """The interpreter reports most commands on stdout; discard it while timing"""
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            return function()
+    return run
+
+
+def synthetic_script(blocks: int = 200) -> str:
+    """A large script mixing functions, conditions, loops and arithmetic (11 lines per block)"""
+    lines = ["total = 0"]
+    for k in range(blocks):
+        lines += [
+            f"دالة f{k}(a, b): {{",
+            f"    c = a * b + {k}",
+            "    إرجاع c",
+            "}",
+            f"v{k} = f{k}({k}, 2) - {k} / 4",
+            f"إذا (v{k} > {k}): {{",
+            f"    total = total + v{k}",
+            "}",
+            "كرر i في (0, 3): {",
+            "    total = total + i * 2",
+            "}",
+        ]
+    return "\n".join(lines) + "\n"
+
+
+# --- Micro benchmarks -------------------------------------------------------
+
+def _parse():
+    interpreter = _quiet_interpreter()
+    source = synthetic_script(20)
+    return lambda: interpreter.parser.parse(source)
+
+
+def _transform():
+    interpreter = _quiet_interpreter()
+    tree = interpreter.parser.parse(synthetic_script(20))
+    return lambda: interpreter.transformer.transform(tree)
+
+
+def _interpreter_init():
+    return _quiet_interpreter
+
+
+def _environment_get():
+    environment = GlobalEnvironment()
+    names = [f"v{index}" for index in range(100)]
+    for name in names:
+        environment.define(name, 1.0)
+
+    def run():
+        get = environment.get
+        for name in names:
+            get(name)
+    return run
+
+
+def _environment_set():
+    environment = GlobalEnvironment()
+    names = [f"v{index}" for index in range(100)]
+    for name in names:
+        environment.define(name, 1.0)
+
+    def run():
+        set_value = environment.set
+        for index, name in enumerate(names):
+            set_value(name, float(index))
+    return run
+
+
+def _visit(source: str, prelude: str = ""):
+    """Time the visitor on a pre-transformed AST, without parse or cache lookup"""
+    interpreter = _quiet_interpreter()
+    if prelude:
+        _quiet(lambda: interpreter.interpret(prelude))()
+    ast = interpreter._cached_parse_and_transform(source)
+    return _quiet(lambda: ast.accept(interpreter))
+
+
+def _binary_ops():
+    return _visit("x = 1\ny = (x + 2) * 3 - x / 4 + x % 5\n")
+
+
+def _function_call():
+    return _visit("y = g(2, 3)\n", "دالة g(a, b): {\n    c = a * b + 1\n    إرجاع c\n}\n")
+
+
+def _loop_iteration():
+    return _visit("s = 0\nكرر i في (0, 1000): {\n    s = s + i\n}\n")
+
+
+def _parallel_for():
+    return _visit("موازي كرر i في (0, 200): {\n    x = i * 2\n}\n")
+
+
+def _simple_script(use_bytecode: bool):
+    def setup():
+        interpreter = _quiet_interpreter()
+        interpreter.use_bytecode = use_bytecode
+        source = "x = 2\ny = x * 3 + 1\nz = y - x\n"
+        return _quiet(lambda: interpreter.interpret(source))
+    return setup
+
+
+def micro_benchmarks() -> List[Benchmark]:
+    return [
+        Benchmark("parse", "micro", _parse, description="Lark parse of a 221-line script"),
+        Benchmark("transform", "micro", _transform, description="parse tree to AST, 221 lines"),
+        Benchmark("interpreter_init", "micro", _interpreter_init, repetitions=5,
+                  description="NDScriptInterpreter() construction"),
+        Benchmark("environment_get", "micro", _environment_get, inner=100, description="global lookup"),
+        Benchmark("environment_set", "micro", _environment_set, inner=100, description="global store"),
+        Benchmark("binary_ops", "micro", _binary_ops, description="two assignments, six operators"),
+        Benchmark("function_call", "micro", _function_call, description="user function call"),
+        Benchmark("loop_iteration", "micro", _loop_iteration, inner=1000, description="for body s = s + i"),
+        Benchmark("bytecode_simple", "micro", _simple_script(True), description="three assignments via bytecode"),
+        Benchmark("visitor_simple", "micro", _simple_script(False), description="three assignments via visitor"),
+        Benchmark("parallel_for", "micro", _parallel_for, inner=200, description="parallel for iteration"),
+    ]
+
+
+# --- Macro benchmarks -------------------------------------------------------
+
+def _script_run(source: str, cold: bool = False):
+    def setup():
+        interpreter = _quiet_interpreter()
+        interpreter.pinned_parameters["seed"] = BENCH_SEED
+
+        def run():
+            # exit يوقف المفسر؛ كل تشغيل يبدأ من جديد
+            interpreter.running = True
+            if cold:
+                interpreter._cached_parse_and_transform.cache_clear()
+            interpreter.interpret(source)
+        return _quiet(run)
+    return setup
+
+
+def _cold_start():
+    # عملية جديدة في كل تشغيل: استيراد وإنشاء المفسر وتشغيل نص من سطر واحد
+    script = os.path.abspath("cold_start.ndx")
+    with open(script, "w", encoding="utf-8") as f:
+        f.write("x = 1\n")
+    return lambda: subprocess.run([sys.executable, str(CLI_PATH), script], check=True,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def macro_benchmarks(examples_dir: Path = EXAMPLES_DIR) -> List[Benchmark]:
+    benchmarks = []
+    for path in sorted(examples_dir.glob("*.ndx")):
+        source = path.read_text(encoding="utf-8")
+        benchmarks.append(Benchmark(f"example:{path.stem}", "macro", _script_run(source), repetitions=5,
+                                    description=str(path.name)))
+    large = synthetic_script(200)
+    benchmarks.append(Benchmark("synthetic_2k", "macro", _script_run(large), repetitions=5,
+                                description="2201 generated lines, warm parse cache"))
+    benchmarks.append(Benchmark("synthetic_2k_cold", "macro", _script_run(large, cold=True), repetitions=5,
+                                description="2201 generated lines, parsed every run"))
+    benchmarks.append(Benchmark("cold_start", "macro", _cold_start, repetitions=5,
+                                description="nds on a one-line script in a new process"))
+    return benchmarks
+
+
+# --- Running and statistics -------------------------------------------------
+
+def pin_cpu(cpu: int) -> bool:
+    """Pin this process to ``cpu``; False where affinity is unsupported"""
+    if not hasattr(os, "sched_setaffinity"):
+        return False
+    os.sched_setaffinity(0, {cpu})
+    return True
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    return {
+        "mean": statistics.fmean(samples),
+        "median": statistics.median(samples),
+        "stdev": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        "min": min(samples),
+    }
+
+
+def run_benchmark(benchmark: Benchmark, repetitions: Optional[int] = None, warmup: int = 2) -> Dict[str, Any]:
+    """Samples of one benchmark in seconds per operation, or its error.
+
+    ``repetitions`` applies to every benchmark; None uses each benchmark's
+    own count, or 10.
+    """
+    result: Dict[str, Any] = {"group": benchmark.group, "inner": benchmark.inner,
+                              "description": benchmark.description}
+    try:
+        run = benchmark.setup()
+        for _ in range(warmup):
+            run()
+        samples = []
+        for _ in range(repetitions or benchmark.repetitions or 10):
+            gc.collect()
+            start = time.perf_counter_ns()
+            run()
+            samples.append((time.perf_counter_ns() - start) / 1e9 / benchmark.inner)
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {str(e).splitlines()[0] if str(e) else ''}"
+        return result
+    result["samples"] = samples
+    result.update(summarize(samples))
+    return result
+
+
+def run_suite(benchmarks: List[Benchmark], repetitions: Optional[int] = None, warmup: int = 2,
+              progress: Optional[Callable[[str, Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+    """Run ``benchmarks`` in a scratch directory (examples write files)"""
+    results = {}
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="nds-bench-") as scratch:
+        os.chdir(scratch)
+        try:
+            for benchmark in benchmarks:
+                results[benchmark.name] = run_benchmark(benchmark, repetitions, warmup)
+                if progress:
+                    progress(benchmark.name, results[benchmark.name])
+        finally:
+            os.chdir(cwd)
+
+    affinity = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else None
+    return {
+        "format": FORMAT_VERSION,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "cpus": affinity,
+        "repetitions": repetitions,
+        "warmup": warmup,
+        "benchmarks": results,
+    }
+
+
+def mann_whitney_p(first: List[float], second: List[float]) -> float:
+    """Two-sided Mann-Whitney U p-value (normal approximation, tie-corrected)"""
+    n1, n2 = len(first), len(second)
+    if not n1 or not n2:
+        return 1.0
+    values = sorted([(value, 0) for value in first] + [(value, 1) for value in second])
+    n = n1 + n2
+    rank_sum = 0.0
+    ties = 0.0
+    index = 0
+    while index < n:
+        end = index
+        while end + 1 < n and values[end + 1][0] == values[index][0]:
+            end += 1
+        # رتبة متوسطة للقيم المتساوية
+        rank = (index + end) / 2 + 1
+        count = end - index + 1
+        ties += count ** 3 - count
+        rank_sum += rank * sum(1 for position in range(index, end + 1) if values[position][1] == 0)
+        index = end + 1
+
+    u = rank_sum - n1 * (n1 + 1) / 2
+    sigma = math.sqrt(n1 * n2 / 12 * ((n + 1) - ties / (n * (n - 1))))
+    if sigma == 0:
+        return 1.0
+    z = max(abs(u - n1 * n2 / 2) - 0.5, 0.0) / sigma
+    return math.erfc(z / math.sqrt(2))
+
+
+def min_p_value(n1: int, n2: int) -> float:
+    """Smallest p-value ``mann_whitney_p`` can give for samples of ``n1`` and ``n2``"""
+    return mann_whitney_p(list(range(n1)), list(range(n1, n1 + n2)))
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], alpha: float = 0.05,
+            threshold: float = 0.05) -> List[Dict[str, Any]]:
+    """Per benchmark: median change and verdict ``faster``, ``slower`` or ``same``,
+    or ``too few`` when the sample counts could never reach ``alpha``"""
+    rows = []
+    for name, result in current["benchmarks"].items():
+        before = baseline.get("benchmarks", {}).get(name)
+        if not before or "samples" not in before or "samples" not in result:
+            continue
+        change = result["median"] / before["median"] - 1 if before["median"] else 0.0
+        p_value = mann_whitney_p(before["samples"], result["samples"])
+        verdict = "same"
+        if min_p_value(len(before["samples"]), len(result["samples"])) >= alpha:
+            verdict = "too few"
+        elif p_value < alpha and abs(change) > threshold:
+            verdict = "slower" if change > 0 else "faster"
+        rows.append({"name": name, "baseline": before["median"], "current": result["median"],
+                     "change": change, "p_value": p_value, "verdict": verdict})
+    return rows
+
+
+def _format_time(seconds: float) -> str:
+    for unit, scale in (("s", 1.0), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.3f} {unit}"
+    return f"{seconds / 1e-9:.1f} ns"
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="nds bench", description="Run the ND-Script benchmark suite")
+    parser.add_argument("-o", "--output", metavar="FILE", help="Write results as JSON to FILE")
+    parser.add_argument("--baseline", metavar="FILE", help="Compare with results saved by --output")
+    parser.add_argument("-r", "--repetitions", type=int, default=None,
+                        help="Timed runs of every benchmark (default: 10, 5 for macro benchmarks)")
+    parser.add_argument("-w", "--warmup", type=int, default=2, help="Untimed runs before timing")
+    parser.add_argument("--cpu", type=int, default=None, help="Pin the process to this CPU")
+    parser.add_argument("--group", choices=("micro", "macro", "all"), default="all")
+    parser.add_argument("-k", "--filter", default=None, help="Only benchmarks whose name contains this")
+    parser.add_argument("--alpha", type=float, default=0.05, help="Significance level of the comparison")
+    parser.add_argument("--threshold", type=float, default=0.05,
+                        help="Smallest relative change of the median reported as a regression")
+    args = parser.parse_args(argv)
+
+    if args.cpu is not None and not pin_cpu(args.cpu):
+        print("Warning: CPU pinning is not supported on this platform", file=sys.stderr)
+
+    benchmarks = []
+    if args.group in ("micro", "all"):
+        benchmarks += micro_benchmarks()
+    if args.group in ("macro", "all"):
+        benchmarks += macro_benchmarks()
+    if args.filter:
+        benchmarks = [benchmark for benchmark in benchmarks if args.filter in benchmark.name]
+
+    def progress(name: str, result: Dict[str, Any]):
+        if "error" in result:
+            print(f"{name:<32} error: {result['error']}")
+        else:
+            print(f"{name:<32} {_format_time(result['median']):>12} ± {_format_time(result['stdev'])}")
+
+    results = run_suite(benchmarks, args.repetitions, args.warmup, progress)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if not args.baseline:
+        return 0
+    try:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Error: cannot read baseline: {e}", file=sys.stderr)
+        return 1
+
+    rows = compare(baseline, results, args.alpha, args.threshold)
+    print()
+    print(f"{'Benchmark':<32} {'Baseline':>12} {'Current':>12} {'Change':>8} {'p':>7}  Verdict")
+    for row in rows:
+        print(f"{row['name']:<32} {_format_time(row['baseline']):>12} {_format_time(row['current']):>12} "
+              f"{100 * row['change']:>+7.1f}% {row['p_value']:>7.3f}  {row['verdict']}")
+    too_few = [row["name"] for row in rows if row["verdict"] == "too few"]
+    if too_few:
+        print(f"Warning: too few samples to reach alpha={args.alpha} for {', '.join(too_few)}; "
+              f"raise -r (5 per side reaches 0.05)", file=sys.stderr)
+    return 1 if any(row["verdict"] == "slower" for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+ميزانية زمن الاستيراد لـ ND-Script
+Import-Time Budget for ND-Script, measured with ``python -X importtime``
+
+Importing the interpreter must stay cheap: the bytecode compiler, the
+parallel processor, macros, imports and the type system are loaded on
+first use. This check imports a module in fresh interpreters and fails
+(exit status 1) when:
+
+* the best cumulative import time of the module is over ``--budget-ms``;
+* a lazily loaded module shows up among its imports.
+
+The heaviest imports are listed either way, so a regression shows its cause.
+"""
+
+import argparse
+import re
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+NDS_DIR = Path(__file__).parent.parent
+
+# وحدات تُحمَّل عند أول استخدام، لا عند استيراد المفسر
+LAZY_MODULES = (
+    "runtime.bytecode_compiler",
+    "runtime.parallel_processor",
+    "runtime.macro_processor",
+    "runtime.import_resolver",
+    "runtime.type_system",
+    "runtime.batch_runner",
+    "runtime.run_cache",
+    "multiprocessing",
+    "concurrent.futures",
+    "http.server",
+    "numpy",
+)
+
+_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def measure(module: str = "runtime.interpreter") -> Dict[str, Tuple[int, int]]:
+    """``name -> (self_us, cumulative_us)`` for every module imported by ``module``"""
+    code = f"import sys; sys.path.insert(0, {str(NDS_DIR)!r}); import {module}"
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True)
+    if process.returncode != 0:
+        raise RuntimeError(process.stderr.strip().splitlines()[-1] if process.stderr else "import failed")
+    timings = {}
+    for line in process.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            timings[match.group(4)] = (int(match.group(1)), int(match.group(2)))
+    return timings
+
+
+def check(module: str = "runtime.interpreter", budget_ms: float = 200.0, runs: int = 5,
+          lazy: Tuple[str, ...] = LAZY_MODULES) -> Dict[str, object]:
+    """Import ``module`` ``runs`` times; the fastest run is compared with the budget"""
+    best: Optional[Dict[str, Tuple[int, int]]] = None
+    for _ in range(runs):
+        timings = measure(module)
+        if best is None or timings[module][1] < best[module][1]:
+            best = timings
+    total_ms = best[module][1] / 1000.0
+    eager = sorted(name for name in best
+                   if any(name == lazy_name or name.startswith(lazy_name + ".") for lazy_name in lazy))
+    heaviest = sorted(best.items(), key=lambda item: item[1][0], reverse=True)
+    return {
+        "module": module,
+        "total_ms": total_ms,
+        "budget_ms": budget_ms,
+        "eager": eager,
+        "heaviest": [(name, self_us / 1000.0) for name, (self_us, _) in heaviest[:10]],
+        "ok": total_ms <= budget_ms and not eager,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Check the import time of the ND-Script runtime")
+    parser.add_argument("--module", default="runtime.interpreter", help="Module to import")
+    parser.add_argument("--budget-ms", type=float, default=200.0,
+                        help="Largest allowed cumulative import time in milliseconds")
+    parser.add_argument("-r", "--runs", type=int, default=5, help="Fresh interpreters; the fastest counts")
+    args = parser.parse_args(argv)
+
+    try:
+        result = check(args.module, args.budget_ms, args.runs)
+    except RuntimeError as e:
+        print(f"Error: cannot import {args.module}: {e}", file=sys.stderr)
+        return 1
+
+    print(f"{result['module']}: {result['total_ms']:.1f} ms (budget {result['budget_ms']:.0f} ms)")
+    print("Heaviest imports (self time):")
+    for name, self_ms in result["heaviest"]:
+        print(f"  {self_ms:>8.1f} ms  {name}")
+    if result["eager"]:
+        print(f"Loaded at import but should be lazy: {', '.join(result['eager'])}", file=sys.stderr)
+    if result["total_ms"] > result["budget_ms"]:
+        print("Import time is over budget", file=sys.stderr)
+    return 0 if result["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())